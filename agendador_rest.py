@@ -0,0 +1,272 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger()
+
+# Camada REST com controle de rate limit em volta do Client da Binance.
+# Todas as chamadas passam por uma fila de prioridade (ordens antes de conta,
+# conta antes de dados de mercado) que só libera uma requisição quando há
+# orçamento de peso no minuto corrente. O peso usado é lido dos cabeçalhos
+# X-MBX-USED-WEIGHT-1M de cada resposta; 429/418 bloqueiam a fila até o
+# Retry-After e as chamadas são repetidas com backoff exponencial com jitter.
+
+PRIORIDADE_ORDEM = 0
+PRIORIDADE_CONTA = 1
+PRIORIDADE_DADOS = 2
+
+LIMITE_PESO_MINUTO = 6000  # Limite padrão de REQUEST_WEIGHT por minuto (spot)
+RESERVA_ORDENS = 200  # Peso que dados de mercado e conta não podem consumir
+MAX_REQUISICOES_SIMULTANEAS = 16
+TAMANHO_POOL_CONEXOES = 32
+MAX_TENTATIVAS = 5
+BACKOFF_INICIAL = 0.5  # segundos
+BACKOFF_MAXIMO = 30.0  # segundos
+
+# Peso de cada método do Client (https://binance-docs.github.io/apidocs/spot)
+PESOS = {
+    'get_klines': 2,
+    'get_account': 20,
+    'get_exchange_info': 20,
+    'get_symbol_info': 20,
+    'get_ticker': 2,
+    'get_orderbook_ticker': 2,
+    'get_order_book': 5,
+    'get_system_status': 1,
+    'get_order': 4,
+    'get_open_orders': 6,
+    'create_order': 1,
+    'create_oco_order': 1,
+    'cancel_order': 1,
+    'v3_delete_order_list': 1,
+    'get_open_oco_orders': 6,
+    'stream_get_listen_key': 2,
+    'stream_keepalive': 2,
+}
+PESO_DESCONHECIDO = 20  # Métodos fora da tabela acima: peso conservador
+# Peso do get_order_book por faixa de `limit` (limite máximo da faixa, peso)
+PESOS_LIVRO = ((100, 5), (500, 25), (1000, 50), (5000, 250))
+
+PRIORIDADES = {
+    'create_order': PRIORIDADE_ORDEM,
+    'create_oco_order': PRIORIDADE_ORDEM,
+    'cancel_order': PRIORIDADE_ORDEM,
+    'v3_delete_order_list': PRIORIDADE_ORDEM,
+    'get_order': PRIORIDADE_ORDEM,
+    'get_account': PRIORIDADE_CONTA,
+    'get_open_orders': PRIORIDADE_CONTA,
+    'get_open_oco_orders': PRIORIDADE_CONTA,
+    'stream_get_listen_key': PRIORIDADE_CONTA,
+    'stream_keepalive': PRIORIDADE_CONTA,
+}
+
+# Métodos que enviam ordens: só são repetidos quando a Binance recusou a
+# requisição (429/418), nunca após erros ambíguos como timeout.
+METODOS_ORDEM = {'create_order', 'create_oco_order', 'cancel_order', 'v3_delete_order_list'}
+
+
+def peso_requisicao(nome, parametros):
+    """Peso de uma chamada; o do get_order_book depende do `limit` pedido."""
+    if nome == 'get_order_book':
+        limite = int(parametros.get('limit', 100))
+        for maximo, peso in PESOS_LIVRO:
+            if limite <= maximo:
+                return peso
+        return PESOS_LIVRO[-1][1]
+    return PESOS.get(nome, PESO_DESCONHECIDO)
+
+
+class MetricasEndpoint:
+    def __init__(self):
+        self.chamadas = 0
+        self.erros = 0
+        self.latencia_total = 0.0
+        self.latencia_maxima = 0.0
+
+    def registrar(self, latencia, erro=False):
+        self.chamadas += 1
+        self.erros += erro
+        self.latencia_total += latencia
+        self.latencia_maxima = max(self.latencia_maxima, latencia)
+
+    def resumo(self):
+        return {
+            'chamadas': self.chamadas,
+            'erros': self.erros,
+            'latencia_media': self.latencia_total / self.chamadas if self.chamadas else 0.0,
+            'latencia_maxima': self.latencia_maxima,
+        }
+
+
+def _status_http(erro):
+    return getattr(erro, 'status_code', None) or getattr(getattr(erro, 'response', None), 'status_code', None)
+
+
+def _cabecalhos(erro):
+    resposta = getattr(erro, 'response', None)
+    return getattr(resposta, 'headers', None) or {}
+
+
+class AgendadorRequisicoes:
+    """Fila de prioridade com orçamento de peso por minuto e backoff adaptativo."""
+
+    def __init__(self, limite_peso=LIMITE_PESO_MINUTO, max_simultaneas=MAX_REQUISICOES_SIMULTANEAS, observador=None):
+        self.limite_peso = limite_peso
+        self.observador = observador  # função (endpoint, latência, erro) chamada a cada requisição
+        self.max_simultaneas = max_simultaneas
+        self.condicao = threading.Condition()
+        self.fila = []
+        self.sequencia = itertools.count()
+        self.minuto = int(time.time() // 60)
+        self.peso_usado = 0  # último valor informado pela Binance no minuto corrente
+        self.peso_reservado = 0  # peso das requisições em andamento
+        self.em_andamento = 0
+        self.bloqueado_ate = 0.0
+        self.contagem_ordens = {}
+        self.metricas_endpoints = {}
+        self.bloqueios = 0
+
+    def _virar_minuto(self, agora):
+        minuto = int(agora // 60)
+        if minuto != self.minuto:
+            self.minuto = minuto
+            self.peso_usado = 0
+
+    def _pode_executar(self, bilhete, prioridade, peso, agora):
+        if self.fila[0] != bilhete or self.em_andamento >= self.max_simultaneas:
+            return False
+        if agora < self.bloqueado_ate:
+            return False
+        reserva = 0 if prioridade == PRIORIDADE_ORDEM else RESERVA_ORDENS
+        return self.peso_usado + self.peso_reservado + peso <= self.limite_peso - reserva
+
+    def _espera(self, agora):
+        if agora < self.bloqueado_ate:
+            return self.bloqueado_ate - agora
+        return max((self.minuto + 1) * 60 - agora, 0.01)
+
+    def _adquirir(self, prioridade, peso):
+        with self.condicao:
+            bilhete = (prioridade, next(self.sequencia))
+            heapq.heappush(self.fila, bilhete)
+            while True:
+                agora = time.time()
+                self._virar_minuto(agora)
+                if self._pode_executar(bilhete, prioridade, peso, agora):
+                    break
+                self.condicao.wait(timeout=self._espera(agora))
+            heapq.heappop(self.fila)
+            self.peso_reservado += peso
+            self.em_andamento += 1
+            self.condicao.notify_all()
+
+    def _liberar(self, peso):
+        with self.condicao:
+            self.peso_reservado -= peso
+            self.em_andamento -= 1
+            self.condicao.notify_all()
+
+    def registrar_cabecalhos(self, cabecalhos):
+        """Atualiza o peso usado e a contagem de ordens a partir dos cabeçalhos da resposta."""
+        with self.condicao:
+            self._virar_minuto(time.time())
+            for chave, valor in cabecalhos.items():
+                chave = chave.lower()
+                if chave == 'x-mbx-used-weight-1m':
+                    self.peso_usado = int(valor)
+                elif chave.startswith('x-mbx-order-count-'):
+                    self.contagem_ordens[chave[len('x-mbx-order-count-'):]] = int(valor)
+
+    def _bloquear(self, erro):
+        cabecalhos = _cabecalhos(erro)
+        retry_after = cabecalhos.get('Retry-After') or cabecalhos.get('retry-after')
+        espera = float(retry_after) if retry_after else 60.0
+        with self.condicao:
+            self.bloqueado_ate = max(self.bloqueado_ate, time.time() + espera)
+            self.bloqueios += 1
+        logger.warning(f"Rate limit da Binance (HTTP {_status_http(erro)}): requisições suspensas por {espera:.0f}s")
+
+    def _medir(self, metricas, nome, latencia, erro):
+        metricas.registrar(latencia, erro)
+        if self.observador is not None:
+            self.observador(nome, latencia, erro)
+
+    def executar(self, nome, funcao, *args, prioridade=None, peso=None, **kwargs):
+        """Executa `funcao` respeitando fila de prioridade, orçamento de peso e backoff."""
+        prioridade = PRIORIDADES.get(nome, PRIORIDADE_DADOS) if prioridade is None else prioridade
+        peso = peso_requisicao(nome, kwargs) if peso is None else peso
+        metricas = self.metricas_endpoints.setdefault(nome, MetricasEndpoint())
+
+        for tentativa in range(MAX_TENTATIVAS):
+            self._adquirir(prioridade, peso)
+            inicio = time.perf_counter()
+            try:
+                resultado = funcao(*args, **kwargs)
+                self._medir(metricas, nome, time.perf_counter() - inicio, False)
+                return resultado
+            except Exception as e:
+                self._medir(metricas, nome, time.perf_counter() - inicio, True)
+                status = _status_http(e)
+                if status in (429, 418):
+                    self._bloquear(e)
+                elif nome in METODOS_ORDEM or (status is not None and status < 500):
+                    raise  # erro definitivo ou ordem com resultado incerto
+                if tentativa == MAX_TENTATIVAS - 1:
+                    raise
+                espera = min(BACKOFF_INICIAL * 2 ** tentativa, BACKOFF_MAXIMO) * random.uniform(0.5, 1.5)
+                logger.warning(f"Falha em {nome} ({e}), nova tentativa em {espera:.2f}s")
+            finally:
+                self._liberar(peso)
+            # Fora da reserva: a vaga e o peso ficam com as outras requisições durante a espera
+            time.sleep(espera)
+
+    def metricas(self):
+        """Snapshot das métricas: latência por endpoint e orçamento restante."""
+        with self.condicao:
+            self._virar_minuto(time.time())
+            return {
+                'peso_usado_minuto': self.peso_usado,
+                'peso_restante_minuto': max(self.limite_peso - self.peso_usado - self.peso_reservado, 0),
+                'requisicoes_em_andamento': self.em_andamento,
+                'requisicoes_na_fila': len(self.fila),
+                'bloqueado_por': max(self.bloqueado_ate - time.time(), 0.0),
+                'bloqueios': self.bloqueios,
+                'contagem_ordens': dict(self.contagem_ordens),
+                'endpoints': {nome: m.resumo() for nome, m in self.metricas_endpoints.items()},
+            }
+
+
+class ClienteLimitado:
+    """Proxy do Client da Binance que encaminha os métodos da API pelo AgendadorRequisicoes."""
+
+    def __init__(self, client, agendador=None):
+        self._client = client
+        self.agendador = agendador or AgendadorRequisicoes()
+        sessao = getattr(client, 'session', None)
+        if sessao is not None:
+            self._configurar_sessao(sessao)
+
+    def _configurar_sessao(self, sessao):
+        # Conexões keep-alive suficientes para as requisições simultâneas
+        from requests.adapters import HTTPAdapter
+        adaptador = HTTPAdapter(pool_connections=TAMANHO_POOL_CONEXOES, pool_maxsize=TAMANHO_POOL_CONEXOES)
+        sessao.mount('https://', adaptador)
+        sessao.mount('http://', adaptador)
+        sessao.hooks.setdefault('response', []).append(
+            lambda resposta, *args, **kwargs: self.agendador.registrar_cabecalhos(resposta.headers)
+        )
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._client, nome)
+        if not callable(atributo) or nome.startswith('_'):
+            return atributo
+        if nome not in PESOS:
+            # Nenhuma chamada passa por fora do orçamento: métodos sem peso conhecido usam o conservador
+            logger.debug(f"Método {nome} sem peso cadastrado, usando {PESO_DESCONHECIDO}")
+
+        def chamada(*args, **kwargs):
+            return self.agendador.executar(nome, atributo, *args, **kwargs)
+        return chamada
@@ -0,0 +1,267 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger()
+
+# Alta disponibilidade: várias instâncias do bot rodam ao mesmo tempo e
+# disputam um arrendamento (lease) em uma loja compartilhada — um diretório
+# com trava de arquivo (ex.: montagem NFS comum aos nós) ou um Redis. Só o
+# dono do arrendamento (líder) envia ordens; os seguidores executam o mesmo
+# ciclo (klines, indicadores, livro, saldos) sem operar, de modo que assumem
+# com tudo aquecido assim que o arrendamento do líder expira.
+#
+# O líder renova o arrendamento a cada terço da duração e deixa de se
+# considerar líder antes da expiração se não conseguir renovar, para não
+# operar junto com o sucessor. Como proteção adicional, cada ordem tem um
+# newClientOrderId determinístico (par, lado, candle e motivo) reservado na
+# loja antes do envio: dois nós nunca enviam a mesma ordem, mesmo durante uma
+# troca de líder com a ordem antiga ainda em voo. O motivo separa as saídas de
+# proteção (stop/take) da venda por sinal, e vendas têm algumas tentativas por
+# candle: uma venda de resultado incerto não bloqueia o stop até o fim do candle
+# (vender de novo não passa do saldo; compras continuam com uma única tentativa).
+
+DURACAO_PADRAO = 6.0  # Segundos de validade do arrendamento
+RETENCAO_ORDENS = 24 * 3600  # Segundos que uma reserva de newClientOrderId é lembrada
+PREFIXO_ORDEM = 'ha'
+TENTATIVAS_VENDA = 3  # Reservas de venda por (par, candle, motivo)
+SIGLAS_MOTIVO = {'SINAL': 'sn', 'STOP LOSS': 'sl', 'TAKE PROFIT': 'tp'}
+
+
+def sigla_motivo(motivo):
+    """Sigla do motivo da ordem no newClientOrderId (ex.: 'STOP LOSS (preço abaixo...)' -> 'sl')."""
+    for prefixo, sigla in SIGLAS_MOTIVO.items():
+        if (motivo or 'SINAL').startswith(prefixo):
+            return sigla
+    return 'ou'
+
+
+def id_ordem_cliente(symbol, lado, intervalo_ms, instante=None, motivo=None, tentativa=0):
+    """newClientOrderId igual em todos os nós para a mesma ordem (par, lado, candle corrente, motivo, tentativa)."""
+    instante = time.time() if instante is None else instante
+    candle = int(instante * 1000) // intervalo_ms
+    # até 36 caracteres, como exige a Binance
+    return f"{PREFIXO_ORDEM}-{symbol}-{lado}-{candle}-{sigla_motivo(motivo)}{tentativa}"
+
+
+class LojaArquivo:
+    """Arrendamento e reservas de ordens em arquivos JSON de um diretório compartilhado, sob flock."""
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+        self.caminho_lider = os.path.join(diretorio, 'lider.json')
+        self.caminho_ordens = os.path.join(diretorio, 'ordens_reservadas.json')
+        self.caminho_trava = os.path.join(diretorio, 'lider.trava')
+
+    def _travado(self, funcao):
+        with open(self.caminho_trava, 'a') as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                return funcao()
+            finally:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def _ler(self, caminho, padrao):
+        try:
+            with open(caminho) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return padrao
+
+    def _gravar(self, caminho, dados):
+        temporario = f"{caminho}.tmp"
+        with open(temporario, 'w') as f:
+            json.dump(dados, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, caminho)
+
+    def adquirir(self, no, duracao):
+        """Adquire ou renova o arrendamento; retorna o mandato do líder ou None se outro nó o detém."""
+        def adquirir():
+            agora = time.time()
+            lider = self._ler(self.caminho_lider, {})
+            if lider.get('no') not in (None, no) and lider.get('expira_em', 0) > agora:
+                return None
+            mandato = lider.get('mandato', 0) + (lider.get('no') != no)
+            self._gravar(self.caminho_lider, {'no': no, 'mandato': mandato, 'expira_em': agora + duracao})
+            return mandato
+        return self._travado(adquirir)
+
+    def liberar(self, no):
+        """Entrega o arrendamento (encerramento normal): o seguidor assume sem esperar a expiração."""
+        def liberar():
+            lider = self._ler(self.caminho_lider, {})
+            if lider.get('no') == no:
+                lider['expira_em'] = 0
+                self._gravar(self.caminho_lider, lider)
+        self._travado(liberar)
+
+    def lider(self):
+        """Nó dono do arrendamento vigente (None se expirado)."""
+        lider = self._ler(self.caminho_lider, {})
+        return lider.get('no') if lider.get('expira_em', 0) > time.time() else None
+
+    def reservar_ordem(self, client_order_id, no):
+        """Registra o newClientOrderId antes do envio; False se já foi reservado (por qualquer nó)."""
+        def reservar():
+            agora = time.time()
+            ordens = {cid: r for cid, r in self._ler(self.caminho_ordens, {}).items()
+                      if r['em'] > agora - RETENCAO_ORDENS}
+            if client_order_id in ordens:
+                return False
+            ordens[client_order_id] = {'no': no, 'em': agora}
+            self._gravar(self.caminho_ordens, ordens)
+            return True
+        return self._travado(reservar)
+
+    def cancelar_reserva(self, client_order_id):
+        """Libera a reserva de uma ordem recusada pela Binance, para que possa ser reenviada."""
+        def cancelar():
+            ordens = self._ler(self.caminho_ordens, {})
+            if ordens.pop(client_order_id, None) is not None:
+                self._gravar(self.caminho_ordens, ordens)
+        self._travado(cancelar)
+
+
+class LojaRedis:
+    """Arrendamento e reservas de ordens em um Redis (SET NX com expiração)."""
+
+    # Renova só se o arrendamento ainda for deste nó
+    SCRIPT_RENOVAR = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    SCRIPT_LIBERAR = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url, prefixo='bot'):
+        import redis
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.chave_lider = f"{prefixo}:lider"
+        self.chave_mandato = f"{prefixo}:mandato"
+        self.prefixo_ordens = f"{prefixo}:ordem:"
+        self.renovar = self.redis.register_script(self.SCRIPT_RENOVAR)
+        self.liberar_script = self.redis.register_script(self.SCRIPT_LIBERAR)
+        self.mandato = None
+
+    def adquirir(self, no, duracao):
+        duracao_ms = int(duracao * 1000)
+        if self.mandato is not None and self.renovar(keys=[self.chave_lider], args=[no, duracao_ms]):
+            return self.mandato
+        if self.redis.set(self.chave_lider, no, nx=True, px=duracao_ms):
+            self.mandato = int(self.redis.incr(self.chave_mandato))
+            return self.mandato
+        self.mandato = None
+        return None
+
+    def liberar(self, no):
+        self.liberar_script(keys=[self.chave_lider], args=[no])
+        self.mandato = None
+
+    def lider(self):
+        return self.redis.get(self.chave_lider)
+
+    def reservar_ordem(self, client_order_id, no):
+        return bool(self.redis.set(self.prefixo_ordens + client_order_id, no, nx=True, ex=RETENCAO_ORDENS))
+
+    def cancelar_reserva(self, client_order_id):
+        self.redis.delete(self.prefixo_ordens + client_order_id)
+
+
+def abrir_loja(endereco):
+    """redis://... usa o Redis; qualquer outro valor é o diretório compartilhado com trava de arquivo."""
+    if endereco.startswith(('redis://', 'rediss://', 'unix://')):
+        return LojaRedis(endereco)
+    return LojaArquivo(endereco)
+
+
+class CoordenadorHA:
+    """Disputa e renova o arrendamento em segundo plano e informa se este nó é o líder."""
+
+    def __init__(self, loja, no, duracao=DURACAO_PADRAO, ao_assumir=None, ao_perder=None):
+        self.loja = loja
+        self.no = no
+        self.duracao = duracao
+        self.ao_assumir = ao_assumir  # função (mandato) chamada quando este nó vira líder
+        self.ao_perder = ao_perder  # função () chamada quando deixa de ser líder
+        self.mandato = None
+        self.valido_ate = 0.0  # monotonic: além disso o nó não se considera mais líder
+        self.parado = threading.Event()
+        self.thread = None
+
+    @property
+    def lider(self):
+        return self.mandato is not None and time.monotonic() < self.valido_ate
+
+    def _tentar(self):
+        inicio = time.monotonic()
+        try:
+            mandato = self.loja.adquirir(self.no, self.duracao)
+        except Exception as e:
+            logger.warning(f"Erro ao renovar o arrendamento de liderança: {e}")
+            mandato = self.mandato if self.lider else None
+        else:
+            if mandato is not None:
+                # Margem de um terço da duração para atrasos de relógio e de renovação
+                self.valido_ate = inicio + self.duracao * 2 / 3
+
+        if mandato is not None and self.mandato is None:
+            self.mandato = mandato
+            logger.warning(f"Nó {self.no} assumiu a liderança (mandato {mandato})")
+            if self.ao_assumir is not None:
+                self.ao_assumir(mandato)
+        elif self.mandato is not None and not self.lider:
+            logger.warning(f"Nó {self.no} perdeu a liderança (mandato {self.mandato})")
+            self.mandato = None
+            if self.ao_perder is not None:
+                self.ao_perder()
+
+    def iniciar(self):
+        """Primeira disputa síncrona (o nó já sabe seu papel ao retornar) e renovação em uma thread."""
+        self._tentar()
+        if self.mandato is None:
+            logger.info(f"Nó {self.no} iniciado como seguidor (líder: {self.loja.lider()})")
+        self.thread = threading.Thread(target=self._executar, name='lideranca', daemon=True)
+        self.thread.start()
+        return self
+
+    def _executar(self):
+        while not self.parado.wait(self.duracao / 3):
+            try:
+                self._tentar()
+            except Exception as e:
+                logger.error(f"Erro na coordenação de liderança: {e}")
+
+    def parar(self):
+        """Encerra a renovação e entrega o arrendamento, se for o líder."""
+        self.parado.set()
+        if self.mandato is not None:
+            self.mandato = None
+            try:
+                self.loja.liberar(self.no)
+                logger.info(f"Nó {self.no} entregou a liderança")
+            except Exception as e:
+                logger.warning(f"Erro ao entregar a liderança: {e}")
+
+    def reservar_ordem(self, client_order_id):
+        """True se este nó é o líder e a ordem ainda não foi enviada por nenhum nó."""
+        if not self.lider:
+            return False
+        return self.loja.reservar_ordem(client_order_id, self.no)
+
+    def cancelar_reserva(self, client_order_id):
+        try:
+            self.loja.cancelar_reserva(client_order_id)
+        except Exception as e:
+            logger.warning(f"Erro ao liberar a reserva da ordem {client_order_id}: {e}")
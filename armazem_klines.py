@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger()
+
+# Armazém local de klines por par/intervalo em formato colunar e append-only.
+# Cada coluna é um arquivo binário bruto lido com np.memmap (sem cópia) e
+# `meta.json` registra quantas linhas foram gravadas por completo: linhas
+# além desse total (gravação interrompida) são descartadas ao abrir.
+
+DIRETORIO_PADRAO = 'dados_klines'
+LIMITE_POR_REQUISICAO = 1000  # Máximo de klines por chamada de get_klines
+
+# (nome, índice na resposta de get_klines, dtype)
+COLUNAS = [
+    ('timestamp', 0, np.int64),
+    ('open', 1, np.float64),
+    ('high', 2, np.float64),
+    ('low', 3, np.float64),
+    ('close', 4, np.float64),
+    ('volume', 5, np.float64),
+    ('close_time', 6, np.int64),
+    ('quote_asset_volume', 7, np.float64),
+    ('number_of_trades', 8, np.int64),
+    ('taker_buy_base_asset_volume', 9, np.float64),
+    ('taker_buy_quote_asset_volume', 10, np.float64),
+]
+
+# Colunas usadas pelos indicadores e pela decisão
+COLUNAS_CANDLE = [coluna for coluna in COLUNAS if coluna[0] in
+                  ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'taker_buy_base_asset_volume')]
+
+
+def klines_para_colunas(klines, colunas=COLUNAS):
+    """Converte a lista de klines da API em um dicionário de arrays tipados (só as `colunas` pedidas)."""
+    return {
+        nome: np.array([k[indice] for k in klines], dtype=dtype)
+        for nome, indice, dtype in colunas
+    }
+
+
+class ArmazemKlines:
+    """Histórico persistente de um par/intervalo com leitura por memória mapeada."""
+
+    def __init__(self, caminho, symbol=None, interval=None):
+        self.caminho = caminho
+        self._mapas = {}
+        os.makedirs(caminho, exist_ok=True)
+        meta = self._ler_meta()
+        self.symbol = symbol or meta.get('symbol')
+        self.interval = interval or meta.get('interval')
+        self.total = meta.get('linhas', 0)
+        self._reparar()
+
+    def _arquivo(self, nome):
+        return os.path.join(self.caminho, f"{nome}.bin")
+
+    def _ler_meta(self):
+        try:
+            with open(os.path.join(self.caminho, 'meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _gravar_meta(self):
+        temporario = os.path.join(self.caminho, 'meta.json.tmp')
+        with open(temporario, 'w') as f:
+            json.dump({'symbol': self.symbol, 'interval': self.interval, 'linhas': self.total}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, os.path.join(self.caminho, 'meta.json'))
+
+    def _reparar(self):
+        """Trunca colunas com linhas além do total confirmado em meta.json."""
+        for nome, _, dtype in COLUNAS:
+            arquivo = self._arquivo(nome)
+            tamanho = self.total * np.dtype(dtype).itemsize
+            if os.path.exists(arquivo) and os.path.getsize(arquivo) > tamanho:
+                logger.warning(f"Armazém {self.symbol} {self.interval}: descartando gravação incompleta em {nome}")
+                with open(arquivo, 'r+b') as f:
+                    f.truncate(tamanho)
+
+    def __len__(self):
+        return self.total
+
+    def _coluna(self, nome, dtype):
+        mapa = self._mapas.get(nome)
+        if mapa is None or len(mapa) != self.total:
+            mapa = np.memmap(self._arquivo(nome), dtype=dtype, mode='r', shape=(self.total,))
+            self._mapas[nome] = mapa
+        return mapa
+
+    def colunas(self, inicio=None, fim=None, colunas=COLUNAS):
+        """Fatias (views, sem cópia) das colunas entre as linhas `inicio` e `fim`."""
+        if self.total == 0:
+            return {nome: np.empty(0, dtype=dtype) for nome, _, dtype in colunas}
+        return {nome: self._coluna(nome, dtype)[inicio:fim] for nome, _, dtype in colunas}
+
+    def ultimos(self, n, colunas=COLUNAS):
+        """As últimas `n` linhas do armazém."""
+        return self.colunas(max(self.total - n, 0), None, colunas)
+
+    def intervalo_tempo(self, inicio_ms, fim_ms=None):
+        """Linhas com timestamp entre `inicio_ms` e `fim_ms` (busca binária)."""
+        if self.total == 0:
+            return self.colunas()
+        timestamps = self._coluna('timestamp', np.int64)
+        inicio = np.searchsorted(timestamps, inicio_ms, side='left')
+        fim = np.searchsorted(timestamps, fim_ms, side='right') if fim_ms is not None else None
+        return self.colunas(inicio, fim)
+
+    def ultimo_timestamp(self):
+        return int(self._coluna('timestamp', np.int64)[-1]) if self.total else None
+
+    def ultimo_close_time(self):
+        return int(self._coluna('close_time', np.int64)[-1]) if self.total else None
+
+    def anexar(self, klines):
+        """Acrescenta klines fechadas mais novas que a última gravada; retorna quantas foram gravadas."""
+        ultimo = self.ultimo_timestamp()
+        if ultimo is not None:
+            klines = [k for k in klines if int(k[0]) > ultimo]
+        if not klines:
+            return 0
+
+        arrays = klines_para_colunas(klines)
+        for nome, _, _ in COLUNAS:
+            with open(self._arquivo(nome), 'ab') as f:
+                f.write(arrays[nome].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.total += len(klines)
+        self._gravar_meta()
+        return len(klines)
+
+    def sincronizar(self, client, inicio_ms=None):
+        """Busca apenas os candles posteriores ao último `close_time` gravado, paginando se preciso.
+
+        Retorna o candle ainda em formação (não gravado) ou None.
+        """
+        ultimo_close = self.ultimo_close_time()
+        inicio = ultimo_close + 1 if ultimo_close is not None else inicio_ms
+        agora_ms = int(time.time() * 1000)
+        em_formacao = None
+        gravados = 0
+
+        while True:
+            parametros = {'symbol': self.symbol, 'interval': self.interval, 'limit': LIMITE_POR_REQUISICAO}
+            if inicio is not None:
+                parametros['startTime'] = inicio
+            klines = client.get_klines(**parametros)
+            if not klines:
+                break
+
+            fechados = [k for k in klines if int(k[6]) < agora_ms]
+            if len(fechados) < len(klines):
+                em_formacao = klines[-1]
+            gravados += self.anexar(fechados)
+
+            if len(klines) < LIMITE_POR_REQUISICAO or not fechados or inicio is None:
+                break
+            inicio = int(fechados[-1][6]) + 1
+
+        if gravados:
+            logger.info(f"Armazém {self.symbol} {self.interval}: {gravados} candles novos ({self.total} no total)")
+        return em_formacao
+
+
+def abrir_armazem(symbol, interval, diretorio=DIRETORIO_PADRAO):
+    """Abre (ou cria) o armazém de um par/intervalo."""
+    return ArmazemKlines(os.path.join(diretorio, f"{symbol}_{interval}"), symbol, interval)
@@ -0,0 +1,324 @@
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from armazem_klines import ArmazemKlines
+from estrategias import Estrategia, LIMIARES_PADRAO, carregar_estrategias, estrategia_padrao
+
+logger = logging.getLogger()
+
+# Backtest vetorizado da estratégia de contagem de sinais de binance.py.
+# Os indicadores são calculados sobre o histórico inteiro como arrays NumPy,
+# as contagens de sinais de compra/venda saem de uma única expressão por
+# regra e apenas a simulação da posição percorre os eventos (entradas e
+# saídas), com busca vetorizada em blocos.
+
+PARAMETROS_PADRAO = {
+    **LIMIARES_PADRAO,
+    'stop_loss': 2.5,  # Stop Loss em porcentagem
+    'take_profit': 5.0,  # Take Profit em porcentagem
+}
+
+SALDO_INICIAL = 1000.0  # USDT
+PERCENTUAL_SALDO = 10  # Percentual do saldo USDT usado em cada compra
+TAXA = 0.001  # 0,1% por operação
+SLIPPAGE = 0.0005  # 0,05% contra o preço de fechamento
+MIN_CANDLES = 50  # Mesmo mínimo exigido por analisar_mercado
+BLOCO_BUSCA = 1024  # Tamanho do bloco na busca vetorizada da saída
+
+
+def carregar_klines_csv(caminho):
+    """Carrega um arquivo de klines no formato da Binance (sem cabeçalho) como arrays."""
+    df = pd.read_csv(caminho, header=None, usecols=[0, 2, 3, 4, 5, 9],
+                     names=['timestamp', 'high', 'low', 'close', 'volume', 'taker_buy_base_asset_volume'],
+                     dtype={'timestamp': np.int64, 'high': np.float64, 'low': np.float64, 'close': np.float64,
+                            'volume': np.float64, 'taker_buy_base_asset_volume': np.float64})
+    return {coluna: df[coluna].to_numpy() for coluna in df.columns}
+
+
+def carregar_klines_armazem(caminho):
+    """Lê o histórico de um armazém local de klines (views memory-mapped, sem cópia)."""
+    colunas = ArmazemKlines(caminho).colunas()
+    return {coluna: colunas[coluna] for coluna in ('timestamp', 'high', 'low', 'close', 'volume',
+                                                   'taker_buy_base_asset_volume')}
+
+
+def carregar_klines(caminho):
+    """Carrega klines de um diretório de armazém local ou de um CSV da Binance."""
+    if os.path.isdir(caminho):
+        return carregar_klines_armazem(caminho)
+    return carregar_klines_csv(caminho)
+
+
+def _ema(valores, periodo=None, alpha=None):
+    serie = pd.Series(valores)
+    if alpha is not None:
+        media = serie.ewm(alpha=alpha, min_periods=periodo, adjust=False).mean()
+    else:
+        media = serie.ewm(span=periodo, min_periods=periodo, adjust=False).mean()
+    return media.to_numpy()
+
+
+def _janelas(valores, janela):
+    """Visão (sem cópia) das janelas móveis, alinhada ao final de cada janela."""
+    return sliding_window_view(valores, janela)
+
+
+def _preencher_inicio(valores, janela):
+    resultado = np.full(len(valores) + janela - 1, np.nan)
+    resultado[janela - 1:] = valores
+    return resultado
+
+
+def _sma(valores, janela):
+    if len(valores) < janela:
+        return np.full(len(valores), np.nan)
+    return _preencher_inicio(_janelas(valores, janela).mean(axis=1), janela)
+
+
+def calcular_indicadores_vetorizados(high, low, close, volume=None, volume_compra=None):
+    """Calcula todos os indicadores do bot sobre arrays completos (mesmas convenções do `ta`).
+
+    Com `volume` e `volume_compra` (taker_buy_base_asset_volume), inclui também o fluxo de agressão.
+    """
+    n = len(close)
+    ind = {'close': close}
+
+    # RSI (médias de Wilder; a primeira variação entra como zero)
+    diff = np.diff(close, prepend=close[0])
+    emaup = _ema(np.where(diff > 0, diff, 0.0), 14, alpha=1 / 14)
+    emadn = _ema(np.where(diff < 0, -diff, 0.0), 14, alpha=1 / 14)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ind['rsi'] = np.where(emadn == 0, 100.0, 100.0 - 100.0 / (1.0 + emaup / emadn))
+    ind['rsi'][np.isnan(emadn)] = np.nan
+
+    # MACD
+    macd = _ema(close, 12) - _ema(close, 26)
+    ind['macd'] = macd
+    ind['macd_signal'] = _ema(macd, 9)
+    ind['macd_diff'] = macd - ind['macd_signal']
+
+    # Médias móveis
+    ind['sma_9'] = _sma(close, 9)
+    ind['sma_20'] = _sma(close, 20)
+    ind['sma_50'] = _sma(close, 50)
+    ind['ema_9'] = _ema(close, 9)
+
+    # Bollinger Bands (desvio padrão populacional)
+    if n >= 20:
+        desvio = _preencher_inicio(_janelas(close, 20).std(axis=1), 20)
+    else:
+        desvio = np.full(n, np.nan)
+    ind['bb_mid'] = ind['sma_20']
+    ind['bb_high'] = ind['bb_mid'] + 2 * desvio
+    ind['bb_low'] = ind['bb_mid'] - 2 * desvio
+    amplitude = ind['bb_high'] - ind['bb_low']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ind['bb_pct'] = np.where(amplitude != 0, (close - ind['bb_low']) / amplitude, np.nan)
+
+    # Stochastic Oscillator
+    if n >= 14:
+        maxima = _preencher_inicio(_janelas(high, 14).max(axis=1), 14)
+        minima = _preencher_inicio(_janelas(low, 14).min(axis=1), 14)
+    else:
+        maxima = minima = np.full(n, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ind['stoch_k'] = np.where(maxima != minima, 100 * (close - minima) / (maxima - minima), np.nan)
+    ind['stoch_d'] = _sma(ind['stoch_k'], 3)
+
+    # Fluxo de agressão: fração do volume comprada por takers, no candle e em 14 candles
+    if volume is not None and volume_compra is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ind['taker_compra'] = np.where(volume > 0, volume_compra / volume, np.nan)
+            volume_janela = _sma(volume, 14)
+            ind['taker_compra_14'] = np.where(volume_janela > 0, _sma(volume_compra, 14) / volume_janela, np.nan)
+
+    return ind
+
+
+def indicadores_dos_dados(dados):
+    """Indicadores vetorizados das klines carregadas por carregar_klines."""
+    return calcular_indicadores_vetorizados(dados['high'], dados['low'], dados['close'], dados.get('volume'),
+                                            dados.get('taker_buy_base_asset_volume'))
+
+
+def calcular_sinais(ind, parametros=None, estrategia=None):
+    """Conta os votos de compra e de venda de cada candle.
+
+    Sem `estrategia`, usa a estratégia padrão (mesmas regras de avaliar_sinais)
+    com os limiares de `parametros`.
+    """
+    if estrategia is None:
+        estrategia = Estrategia(estrategia_padrao(parametros))
+    sinais_compra, sinais_venda, _ = estrategia.avaliar_arrays(ind)
+    return sinais_compra, sinais_venda
+
+
+def calcular_decisoes(sinais_compra, sinais_venda, min_sinais=3):
+    """Retorna arrays booleanos de COMPRAR e VENDER para cada candle."""
+    comprar = (sinais_compra >= min_sinais) & (sinais_compra > sinais_venda)
+    vender = (sinais_venda >= min_sinais) & (sinais_venda > sinais_compra)
+    comprar[:MIN_CANDLES - 1] = False
+    vender[:MIN_CANDLES - 1] = False
+    return comprar, vender
+
+
+def _proxima_saida(close, vender, inicio, preco_entrada, stop_loss, take_profit):
+    """Primeiro candle a partir de `inicio` com sinal de venda, stop loss ou take profit."""
+    limite_stop = preco_entrada * (1 - stop_loss / 100)
+    limite_take = preco_entrada * (1 + take_profit / 100)
+    n = len(close)
+    while inicio < n:
+        fim = min(inicio + BLOCO_BUSCA, n)
+        bloco = close[inicio:fim]
+        eventos = vender[inicio:fim] | (bloco <= limite_stop) | (bloco >= limite_take)
+        posicoes = np.flatnonzero(eventos)
+        if len(posicoes):
+            i = inicio + posicoes[0]
+            if vender[i]:
+                return i, 'VENDER'
+            return i, 'STOP LOSS' if close[i] <= limite_stop else 'TAKE PROFIT'
+        inicio = fim
+    return None, None
+
+
+def simular(timestamps, close, comprar, vender, parametros=None, saldo_inicial=SALDO_INICIAL,
+            percentual_saldo=PERCENTUAL_SALDO, taxa=TAXA, slippage=SLIPPAGE):
+    """Simula a posição como o loop de main(): compra, venda por sinal, stop loss e take profit."""
+    p = dict(PARAMETROS_PADRAO, **(parametros or {}))
+    indices_compra = np.flatnonzero(comprar)
+    saldo_usdt = saldo_inicial
+    trades = []
+    # Variações de caixa e de quantidade por candle (acumuladas no fim para a curva de patrimônio)
+    variacao_quantidade = np.zeros(len(close))
+    variacao_caixa = np.zeros(len(close))
+
+    i = 0
+    while True:
+        k = np.searchsorted(indices_compra, i)
+        if k >= len(indices_compra):
+            break
+        entrada = indices_compra[k]
+
+        preco_compra = close[entrada] * (1 + slippage)
+        valor_compra = saldo_usdt * (percentual_saldo / 100)
+        quantidade = valor_compra / preco_compra * (1 - taxa)
+        saldo_usdt -= valor_compra
+
+        saida, motivo = _proxima_saida(close, vender, entrada + 1, close[entrada], p['stop_loss'], p['take_profit'])
+        variacao_quantidade[entrada] += quantidade
+        variacao_caixa[entrada] -= valor_compra
+
+        if saida is None:
+            trades.append({
+                'entrada': int(timestamps[entrada]), 'saida': None, 'preco_entrada': preco_compra,
+                'preco_saida': None, 'quantidade': quantidade, 'motivo': 'ABERTA', 'pnl': None,
+            })
+            break
+
+        preco_venda = close[saida] * (1 - slippage)
+        valor_venda = quantidade * preco_venda * (1 - taxa)
+        saldo_usdt += valor_venda
+        variacao_quantidade[saida] -= quantidade
+        variacao_caixa[saida] += valor_venda
+        trades.append({
+            'entrada': int(timestamps[entrada]), 'saida': int(timestamps[saida]), 'preco_entrada': preco_compra,
+            'preco_saida': preco_venda, 'quantidade': quantidade, 'motivo': motivo,
+            'pnl': valor_venda - valor_compra,
+        })
+        i = saida + 1
+
+    quantidade_por_candle = np.cumsum(variacao_quantidade)
+    patrimonio = saldo_inicial + np.cumsum(variacao_caixa) + quantidade_por_candle * close
+    return trades, patrimonio
+
+
+def max_drawdown(patrimonio):
+    """Maior queda percentual do patrimônio em relação ao pico anterior."""
+    picos = np.maximum.accumulate(patrimonio)
+    return float(np.max((picos - patrimonio) / picos) * 100) if len(patrimonio) else 0.0
+
+
+def executar_backtest(dados, parametros=None, ind=None, inicio=0, fim=None, estrategia=None, **opcoes):
+    """Executa o backtest completo e retorna um relatório com PnL, drawdown, trades e throughput.
+
+    `ind` permite reaproveitar indicadores já calculados (eles não dependem dos
+    parâmetros); `inicio`/`fim` restringem a simulação a um trecho do histórico;
+    `estrategia` substitui a estratégia padrão (os limiares de `parametros` não se aplicam a ela).
+    """
+    momento_inicial = time.perf_counter()
+    p = dict(PARAMETROS_PADRAO, **(parametros or {}))
+    if ind is None:
+        ind = indicadores_dos_dados(dados)
+    sinais_compra, sinais_venda = calcular_sinais(ind, p, estrategia)
+    min_sinais = p['min_sinais'] if estrategia is None else estrategia.min_votos
+    comprar, vender = calcular_decisoes(sinais_compra, sinais_venda, min_sinais)
+    trecho = slice(inicio, fim)
+    close = dados['close'][trecho]
+    trades, patrimonio = simular(dados['timestamp'][trecho], close, comprar[trecho], vender[trecho], p, **opcoes)
+    duracao = time.perf_counter() - momento_inicial
+
+    saldo_inicial = opcoes.get('saldo_inicial', SALDO_INICIAL)
+    fechados = [t for t in trades if t['pnl'] is not None]
+    return {
+        'candles': len(close),
+        'trades': trades,
+        'total_trades': len(fechados),
+        'vencedores': sum(1 for t in fechados if t['pnl'] > 0),
+        'pnl': float(patrimonio[-1] - saldo_inicial) if len(patrimonio) else 0.0,
+        'retorno_percentual': float((patrimonio[-1] / saldo_inicial - 1) * 100) if len(patrimonio) else 0.0,
+        'max_drawdown_percentual': max_drawdown(patrimonio),
+        'patrimonio': patrimonio,
+        'duracao': duracao,
+        'candles_por_segundo': len(close) / duracao if duracao > 0 else float('inf'),
+    }
+
+
+def logar_relatorio(relatorio):
+    logger.info(f"Candles: {relatorio['candles']}, Trades: {relatorio['total_trades']} "
+                f"({relatorio['vencedores']} vencedores)")
+    logger.info(f"PnL: {relatorio['pnl']:.2f} USDT ({relatorio['retorno_percentual']:.2f}%), "
+                f"Drawdown máximo: {relatorio['max_drawdown_percentual']:.2f}%")
+    logger.info(f"Tempo: {relatorio['duracao']:.3f}s ({relatorio['candles_por_segundo']:,.0f} candles/segundo)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest vetorizado da estratégia do bot")
+    parser.add_argument('arquivo', help="CSV de klines no formato da Binance ou diretório do armazém local")
+    parser.add_argument('--taxa', type=float, default=TAXA)
+    parser.add_argument('--slippage', type=float, default=SLIPPAGE)
+    parser.add_argument('--saldo', type=float, default=SALDO_INICIAL)
+    parser.add_argument('--stop-loss', type=float, default=PARAMETROS_PADRAO['stop_loss'])
+    parser.add_argument('--take-profit', type=float, default=PARAMETROS_PADRAO['take_profit'])
+    parser.add_argument('--trades', action='store_true', help="Lista todos os trades")
+    parser.add_argument('--estrategias', help="JSON com as estratégias (padrão: contagem de sinais do bot)")
+    parser.add_argument('--diagnostico', action='store_true', help="Quantas vezes cada regra disparou")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    dados = carregar_klines(args.arquivo)
+    parametros = {'stop_loss': args.stop_loss, 'take_profit': args.take_profit}
+    estrategias = carregar_estrategias(args.estrategias).estrategias if args.estrategias else [None]
+    # Indicadores calculados uma vez e compartilhados por todas as estratégias
+    ind = indicadores_dos_dados(dados)
+    for estrategia in estrategias:
+        if estrategia is not None:
+            logger.info(f"Estratégia {estrategia.nome}")
+        relatorio = executar_backtest(dados, parametros, ind=ind, estrategia=estrategia,
+                                      saldo_inicial=args.saldo, taxa=args.taxa, slippage=args.slippage)
+        if args.trades:
+            for trade in relatorio['trades']:
+                logger.info(f"{trade['motivo']}: {trade}")
+        if args.diagnostico:
+            regras = (estrategia or Estrategia(estrategia_padrao(parametros))).diagnostico(ind)
+            logger.info("Disparos por regra: " + ", ".join(f"{nome} {total}" for nome, total in regras.items()))
+        logar_relatorio(relatorio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+import argparse
+import contextlib
+import gc
+import importlib.util
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import backtest
+from cache_exchange import FiltrosSimbolo
+from cache_saldos import CacheSaldos
+from execucao_ordens import ExecutorOrdens
+from indicadores_incrementais import MotorIndicadores
+from inicio_rapido import para_estado, de_estado
+from livro_ofertas import LivroOfertas
+
+logger = logging.getLogger()
+
+# Benchmarks dos laços quentes do bot (indicadores, decisão e caminho de ordens).
+# Roda offline: binance.py é importado com o Client trocado por um cliente em
+# memória, e os dados são klines sintéticos (semente fixa) ou gravados (CSV ou
+# armazém local). Cada caso é repetido até um tempo mínimo; funções muito
+# rápidas são medidas em lotes. O resultado traz a distribuição de latência,
+# candles/segundo, memória alocada (tracemalloc) e a comparação com um
+# baseline salvo em JSON, com código de saída 1 quando há regressão.
+
+TAMANHOS_PADRAO = (100, 10_000, 1_000_000)
+TEMPO_MINIMO = 1.0  # segundos de medição por caso
+MIN_AMOSTRAS = 3
+MAX_AMOSTRAS = 2000
+DURACAO_MINIMA_AMOSTRA = 0.001  # segundos; chamadas mais rápidas são agrupadas em lotes
+ARQUIVO_BASELINE = 'benchmark_baseline.json'
+TOLERANCIA = 0.25  # p50 acima de (1 + TOLERANCIA) x baseline é regressão
+SEMENTE = 42
+INTERVALO_MS = 300_000  # candles de 5 minutos
+JANELA_BOT = 100  # candles analisados por ciclo (LIMIT de binance.py)
+
+# (descrição, caso mais lento, caso mais rápido) impressos como fator de aceleração
+COMPARACOES = [
+    ("Indicadores incrementais por candle novo vs recálculo da janela",
+     f"calcular_indicadores[{JANELA_BOT}]", "motor_incremental_atualizar"),
+    ("Decisão incremental vs DataFrame", "analisar_mercado", "analisar_mercado_incremental"),
+    ("Klines em arrays tipados vs DataFrame", "obter_dados_historicos", "obter_candles"),
+    ("Indicadores vetorizados (backtest) vs ta", "calcular_indicadores[{n}]", "calcular_indicadores_vetorizados[{n}]"),
+]
+
+
+def gerar_klines(n, semente=SEMENTE):
+    """Klines sintéticos (passeio aleatório geométrico) no layout de colunas do armazém."""
+    rng = np.random.default_rng(semente)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    abertura = np.concatenate((close[:1], close[:-1]))
+    amplitude = np.abs(rng.normal(0, 0.002, n)) * close
+    volume = rng.gamma(2.0, 50.0, n)
+    return {
+        'timestamp': 1_600_000_000_000 + np.arange(n, dtype=np.int64) * INTERVALO_MS,
+        'open': abertura,
+        'high': np.maximum(abertura, close) + amplitude,
+        'low': np.minimum(abertura, close) - amplitude,
+        'close': close,
+        'volume': volume,
+        'taker_buy_base_asset_volume': volume * rng.uniform(0.2, 0.8, n),
+    }
+
+
+def carregar_gravados(caminho, n):
+    """Últimos `n` candles de um CSV da Binance ou de um armazém local."""
+    dados = {coluna: np.asarray(valores)[-n:] for coluna, valores in backtest.carregar_klines(caminho).items()}
+    close = dados['close']
+    dados['open'] = np.concatenate((close[:1], close[:-1]))
+    return dados
+
+
+def para_dataframe(dados):
+    """DataFrame no formato produzido por obter_dados_historicos."""
+    df = pd.DataFrame({coluna: dados[coluna] for coluna in ('timestamp', 'open', 'high', 'low', 'close', 'volume',
+                                                            'taker_buy_base_asset_volume')})
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
+
+def klines_binance(dados):
+    """Converte colunas em klines no formato da API REST (listas de strings)."""
+    return [
+        [int(t), str(o), str(h), str(l), str(c), str(v), int(t) + INTERVALO_MS - 1, '0', 0, str(vc), '0', '0']
+        for t, o, h, l, c, v, vc in zip(dados['timestamp'], dados['open'], dados['high'], dados['low'],
+                                        dados['close'], dados['volume'], dados['taker_buy_base_asset_volume'])
+    ]
+
+
+class ClienteFalso:
+    """Client da Binance em memória: klines fixos, saldos fixos e ordens preenchidas na hora."""
+
+    SYMBOL_INFO = {
+        'symbol': 'SOLUSDT', 'baseAsset': 'SOL', 'quoteAsset': 'USDT',
+        'filters': [
+            {'filterType': 'LOT_SIZE', 'stepSize': '0.001', 'minQty': '0.001', 'maxQty': '9000000'},
+            {'filterType': 'PRICE_FILTER', 'tickSize': '0.01', 'minPrice': '0.01', 'maxPrice': '1000000'},
+            {'filterType': 'NOTIONAL', 'minNotional': '5'},
+        ],
+    }
+
+    def __init__(self, *args, **kwargs):
+        self.klines = klines_binance(gerar_klines(JANELA_BOT))
+        self.saldos = {'USDT': 1_000_000.0, 'SOL': 10_000.0}
+        self.ordens = 0
+        self.session = None  # lido por ClienteLimitado e por Client.__del__
+
+    def get_system_status(self):
+        return {'status': 0, 'msg': 'normal'}
+
+    def get_klines(self, symbol, interval, limit=500, **kwargs):
+        return self.klines[-limit:]
+
+    def get_ticker(self, symbol):
+        return {'lastPrice': self.klines[-1][4]}
+
+    def get_account(self):
+        return {'balances': [{'asset': a, 'free': str(v), 'locked': '0'} for a, v in self.saldos.items()]}
+
+    def get_exchange_info(self):
+        return {'symbols': [self.SYMBOL_INFO]}
+
+    def get_symbol_info(self, symbol):
+        return self.SYMBOL_INFO if symbol == self.SYMBOL_INFO['symbol'] else None
+
+    def create_order(self, symbol, side, type, quantity, **kwargs):
+        self.ordens += 1
+        preco = self.klines[-1][4]
+        return {
+            'symbol': symbol, 'orderId': self.ordens, 'clientOrderId': kwargs.get('newClientOrderId'),
+            'status': 'FILLED', 'side': side, 'type': type, 'executedQty': quantity,
+            'cummulativeQuoteQty': str(float(quantity) * float(preco)),
+            'fills': [{'price': preco, 'qty': quantity, 'commission': '0', 'commissionAsset': 'BNB'}],
+        }
+
+
+def carregar_bot():
+    """Importa binance.py como o módulo `bot`, com o ClienteFalso no lugar do Client."""
+    diretorio = os.path.dirname(os.path.abspath(__file__))
+    # binance.py tem o nome do pacote python-binance: o pacote precisa vir antes no sys.path
+    sys.path[:] = [p for p in sys.path if os.path.abspath(p or '.') != diretorio] + [diretorio]
+    import binance.client
+    from log_assincrono import encerrar_logging
+
+    original = binance.client.Client
+    binance.client.Client = type('ClienteFalso', (ClienteFalso, original), {})
+    cwd = os.getcwd()
+    # Arquivos criados na importação (logs, caches) ficam em um diretório temporário
+    with tempfile.TemporaryDirectory() as temporario:
+        os.chdir(temporario)
+        try:
+            spec = importlib.util.spec_from_file_location('bot', os.path.join(diretorio, 'binance.py'))
+            bot = importlib.util.module_from_spec(spec)
+            sys.modules['bot'] = bot
+            spec.loader.exec_module(bot)
+        finally:
+            encerrar_logging()
+            binance.client.Client = original
+            os.chdir(cwd)
+
+    bot.USAR_ARMAZEM_KLINES = False
+    bot.diario = None
+    bot.cache_saldos = CacheSaldos(bot.client)
+    bot.cache_saldos.carregar()
+    bot.cache_saldos.ultima_reconciliacao = float('inf')  # sem reconciliações durante a medição
+    bot.executor_ordens = ExecutorOrdens(bot.client, bot.cache_saldos)
+    return bot
+
+
+def casos_por_tamanho(dados):
+    """Casos que processam o conjunto de dados inteiro: nome -> (função, candles por chamada)."""
+    bot = sys.modules['bot']
+    n = len(dados['close'])
+    df = para_dataframe(dados)
+    ind = backtest.indicadores_dos_dados(dados)
+    return {
+        f"calcular_indicadores[{n}]": (lambda: bot.calcular_indicadores(df), n),
+        f"calcular_indicadores_vetorizados[{n}]":
+            (lambda: backtest.calcular_indicadores_vetorizados(dados['high'], dados['low'], dados['close']), n),
+        f"motor_incremental_semear[{n}]": (lambda: MotorIndicadores().semear(df), n),
+        f"estrategia_vetorizada[{n}]": (lambda: bot.estrategias.principal.avaliar_arrays(ind), n),
+    }
+
+
+def gerar_livro(niveis=1000, eventos=1000, semente=SEMENTE):
+    """Livro sincronizado com `niveis` por lado e uma sequência de alterações (bids, asks) perto do topo."""
+    rng = np.random.default_rng(semente)
+    livro = LivroOfertas('SOLUSDT')
+    precos = np.round(100 + 0.01 * np.arange(1, niveis + 1), 2)
+    livro.aplicar_snapshot({
+        'lastUpdateId': 1,
+        'bids': [[f"{200 - p:.2f}", f"{q:.3f}"] for p, q in zip(precos, rng.uniform(1, 50, niveis))],
+        'asks': [[f"{p:.2f}", f"{q:.3f}"] for p, q in zip(precos, rng.uniform(1, 50, niveis))],
+    })
+    alteracoes = []
+    for _ in range(eventos):
+        # ~20 níveis por evento, metade removida ou recriada a cada vez
+        distancias = rng.integers(1, 50, 20) * 0.01
+        quantidades = np.where(rng.random(20) < 0.3, 0.0, rng.uniform(1, 50, 20))
+        alteracoes.append(([[f"{100 - d:.2f}", f"{q:.3f}"] for d, q in zip(distancias[:10], quantidades[:10])],
+                           [[f"{100 + d:.2f}", f"{q:.3f}"] for d, q in zip(distancias[10:], quantidades[10:])]))
+    return livro, alteracoes
+
+
+def casos_unitarios():
+    """Casos de um ciclo ou de um candle, independentes do tamanho do histórico."""
+    bot = sys.modules['bot']
+    dados = gerar_klines(JANELA_BOT)
+    df = bot.calcular_indicadores(para_dataframe(dados))
+    motor = MotorIndicadores().semear({nome: coluna[:-1] for nome, coluna in dados.items()})
+    linha_atual = motor.espiar(df['high'].iloc[-1], df['low'].iloc[-1], df['close'].iloc[-1])
+    symbol_info = FiltrosSimbolo(ClienteFalso.SYMBOL_INFO).como_symbol_info()
+    preco = float(dados['close'][-1])
+    candles = list(zip(dados['timestamp'].tolist(), dados['high'].tolist(), dados['low'].tolist(),
+                       dados['close'].tolist()))
+    proximo = iter(range(10 ** 12))
+
+    def atualizar_motor():
+        t, h, l, c = candles[next(proximo) % len(candles)]
+        motor.atualizar(t, h, l, c)
+
+    livro, alteracoes = gerar_livro()
+    estado_motor = json.dumps(para_estado(motor))
+
+    def aplicar_evento_livro():
+        bids, asks = alteracoes[next(proximo) % len(alteracoes)]
+        sequencia = livro.ultimo_id + 1
+        livro.receber({'U': sequencia, 'u': sequencia, 'b': bids, 'a': asks})
+
+    return {
+        "obter_dados_historicos": (lambda: bot.obter_dados_historicos(bot.SYMBOL), JANELA_BOT),
+        "obter_candles": (lambda: bot.obter_candles(bot.SYMBOL), JANELA_BOT),
+        "inicio_rapido_salvar_motor": (lambda: json.dumps(para_estado(motor)), None),
+        "inicio_rapido_restaurar_motor": (lambda: de_estado(json.loads(estado_motor)), None),
+        "analisar_mercado": (lambda: bot.analisar_mercado(df), 1),
+        "analisar_mercado_incremental": (lambda: bot.analisar_mercado_incremental(motor, linha_atual), 1),
+        "motor_incremental_atualizar": (atualizar_motor, 1),
+        "livro_aplicar_evento": (aplicar_evento_livro, None),
+        "livro_caracteristicas": (livro.caracteristicas, None),
+        "livro_estimar_execucao": (lambda: livro.estimar_execucao(True, quantidade=200.0), None),
+        "formatar_numero": (lambda: bot.formatar_numero(1234.567891234, 8), None),
+        "calcular_quantidade_compra": (lambda: bot.calcular_quantidade_compra(preco, symbol_info), None),
+        "validar_ordem": (lambda: bot.executor_ordens.validar('BUY', 1.2345, preco, symbol_info['filtros'],
+                                                             'SOL', 'USDT'), None),
+        "executar_ordem_rapida": (lambda: bot.executar_ordem_rapida(bot.SIDE_BUY, 1.2345, preco, symbol_info,
+                                                                   bot.SYMBOL), None),
+    }
+
+
+def _percentil(ordenados, fracao):
+    return ordenados[min(int(fracao * len(ordenados)), len(ordenados) - 1)]
+
+
+def medir(funcao, tempo_minimo=TEMPO_MINIMO):
+    """Latência por chamada (segundos) em amostras repetidas até `tempo_minimo`."""
+    # A chamada de aquecimento (caches, imports tardios) também calibra o tamanho do lote
+    inicio = time.perf_counter()
+    funcao()
+    duracao = time.perf_counter() - inicio
+    lote = max(1, math.ceil(DURACAO_MINIMA_AMOSTRA / duracao)) if duracao > 0 else 1000
+
+    amostras = []
+    gc.collect()
+    limite = time.perf_counter() + tempo_minimo
+    while len(amostras) < MIN_AMOSTRAS or (time.perf_counter() < limite and len(amostras) < MAX_AMOSTRAS):
+        inicio = time.perf_counter()
+        for _ in range(lote):
+            funcao()
+        amostras.append((time.perf_counter() - inicio) / lote)
+    return amostras, lote
+
+
+def medir_memoria(funcao):
+    """Pico e saldo de memória alocada (bytes) em uma chamada, segundo o tracemalloc."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        funcao()
+        atual, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return pico - base, atual - base
+
+
+def resumir(amostras, lote, memoria, candles):
+    ordenados = sorted(amostras)
+    p50 = _percentil(ordenados, 0.5)
+    return {
+        'amostras': len(amostras),
+        'lote': lote,
+        'min': ordenados[0],
+        'p50': p50,
+        'p90': _percentil(ordenados, 0.9),
+        'p99': _percentil(ordenados, 0.99),
+        'media': sum(ordenados) / len(ordenados),
+        'candles_por_segundo': candles / p50 if candles and p50 > 0 else None,
+        'memoria_pico': memoria[0],
+        'memoria_liquida': memoria[1],
+    }
+
+
+@contextlib.contextmanager
+def _logs_silenciados(ativo=True):
+    # Os logs INFO das funções medidas iriam para o console a cada chamada
+    raiz = logging.getLogger()
+    nivel = raiz.level
+    if ativo:
+        raiz.setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        raiz.setLevel(nivel)
+
+
+def executar_casos(casos, tempo_minimo=TEMPO_MINIMO, filtro=None, silenciar=True):
+    resultados = {}
+    for nome, (funcao, candles) in casos.items():
+        if filtro and not any(parte in nome for parte in filtro):
+            continue
+        with _logs_silenciados(silenciar):
+            amostras, lote = medir(funcao, tempo_minimo)
+            memoria = medir_memoria(funcao)
+        resultados[nome] = resumir(amostras, lote, memoria, candles)
+        logar_resultado(nome, resultados[nome])
+    return resultados
+
+
+def _tempo(segundos):
+    if segundos >= 1:
+        return f"{segundos:.2f}s"
+    if segundos >= 1e-3:
+        return f"{segundos * 1e3:.2f}ms"
+    return f"{segundos * 1e6:.2f}µs"
+
+
+def _bytes(valor):
+    return f"{valor / 1024:,.1f}KiB" if abs(valor) < 1024 ** 2 else f"{valor / 1024 ** 2:,.1f}MiB"
+
+
+def logar_resultado(nome, r):
+    vazao = f", {r['candles_por_segundo']:,.0f} candles/s" if r['candles_por_segundo'] else ""
+    logger.info(f"{nome}: p50 {_tempo(r['p50'])}, p90 {_tempo(r['p90'])}, p99 {_tempo(r['p99'])}, "
+                f"min {_tempo(r['min'])} ({r['amostras']}x{r['lote']}){vazao}; "
+                f"memória pico {_bytes(r['memoria_pico'])}, líquida {_bytes(r['memoria_liquida'])}")
+
+
+def ambiente():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'processador': platform.processor() or platform.machine(),
+    }
+
+
+def comparar_baseline(resultados, baseline, tolerancia=TOLERANCIA):
+    """Compara o p50 de cada caso com o baseline; retorna a lista de regressões."""
+    if baseline.get('ambiente') != ambiente():
+        logger.warning(f"Baseline gerado em outro ambiente ({baseline.get('ambiente')}); compare com cautela")
+    regressoes = []
+    for nome, atual in resultados.items():
+        anterior = baseline.get('resultados', {}).get(nome)
+        if anterior is None:
+            continue
+        razao = atual['p50'] / anterior['p50'] if anterior['p50'] > 0 else float('inf')
+        if razao > 1 + tolerancia:
+            regressoes.append(nome)
+            logger.warning(f"REGRESSÃO {nome}: p50 {_tempo(atual['p50'])} vs {_tempo(anterior['p50'])} ({razao:.2f}x)")
+        elif razao < 1 / (1 + tolerancia):
+            logger.info(f"Melhora {nome}: p50 {_tempo(atual['p50'])} vs {_tempo(anterior['p50'])} ({1 / razao:.2f}x)")
+    return regressoes
+
+
+def logar_comparacoes(resultados, tamanhos):
+    for descricao, lento, rapido in COMPARACOES:
+        for n in tamanhos if '{n}' in lento else [None]:
+            chave_lento, chave_rapido = lento.format(n=n), rapido.format(n=n)
+            if chave_lento in resultados and chave_rapido in resultados:
+                fator = resultados[chave_lento]['p50'] / resultados[chave_rapido]['p50']
+                sufixo = f" [{n} candles]" if n is not None else ""
+                logger.info(f"{descricao}{sufixo}: {fator:,.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline dos laços quentes do bot")
+    parser.add_argument('--tamanhos', default=','.join(map(str, TAMANHOS_PADRAO)),
+                        help="Quantidades de candles separadas por vírgula")
+    parser.add_argument('--dados', help="CSV de klines da Binance ou diretório do armazém local (padrão: sintéticos)")
+    parser.add_argument('--casos', help="Mede apenas os casos cujo nome contém um destes trechos (vírgulas)")
+    parser.add_argument('--tempo', type=float, default=TEMPO_MINIMO, help="Segundos de medição por caso")
+    parser.add_argument('--baseline', default=ARQUIVO_BASELINE)
+    parser.add_argument('--salvar-baseline', action='store_true', help="Grava os resultados como novo baseline")
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA)
+    parser.add_argument('--com-logs', action='store_true', help="Mantém os logs INFO das funções medidas")
+    parser.add_argument('--saida', help="Grava os resultados completos em JSON")
+    args = parser.parse_args()
+
+    carregar_bot()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+    tamanhos = [int(t) for t in args.tamanhos.split(',') if t.strip()]
+    filtro = [c.strip() for c in args.casos.split(',')] if args.casos else None
+    logger.info(f"Ambiente: {ambiente()}")
+
+    resultados = {}
+    silenciar = not args.com_logs
+    with _logs_silenciados(silenciar):
+        casos = casos_unitarios()
+    resultados.update(executar_casos(casos, args.tempo, filtro, silenciar))
+    for n in tamanhos:
+        dados = carregar_gravados(args.dados, n) if args.dados else gerar_klines(n)
+        with _logs_silenciados(silenciar):
+            casos = casos_por_tamanho(dados)
+        resultados.update(executar_casos(casos, args.tempo, filtro, silenciar))
+    logar_comparacoes(resultados, tamanhos)
+
+    relatorio = {'ambiente': ambiente(), 'resultados': resultados}
+    if args.saida:
+        with open(args.saida, 'w') as f:
+            json.dump(relatorio, f, indent=2)
+
+    regressoes = []
+    if os.path.exists(args.baseline) and not args.salvar_baseline:
+        with open(args.baseline) as f:
+            regressoes = comparar_baseline(resultados, json.load(f), args.tolerancia)
+    if args.salvar_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(relatorio, f, indent=2)
+        logger.info(f"Baseline salvo em {args.baseline}")
+    if regressoes:
+        logger.error(f"{len(regressoes)} caso(s) com regressão acima de {args.tolerancia:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
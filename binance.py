@@ -1,25 +1,45 @@
 import time
+import socket
+import threading
+import uuid
 import numpy as np
-import pandas as pd
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
 from binance.enums import *
-import ta
+from binance.helpers import interval_to_milliseconds
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 import logging
+from indicadores_incrementais import MotorIndicadores
+from multiplos_tempos import MotorMultiTempo
+from livro_ofertas import FluxoLivros, CHAVES_LIVRO
+from streaming import FluxoMercado, TransporteWebSocket, VigiaPrecos, URL_STREAM_BINANCE
+from armazem_klines import abrir_armazem, klines_para_colunas, COLUNAS_CANDLE
+from cache_saldos import CacheSaldos, StreamDadosUsuario
+from cache_exchange import CacheExchangeInfo
+from inicio_rapido import SnapshotInicio
+from alta_disponibilidade import CoordenadorHA, abrir_loja, id_ordem_cliente, TENTATIVAS_VENDA
+from agendador_rest import AgendadorRequisicoes, ClienteLimitado
+from execucao_ordens import ExecutorOrdens, ClienteOrdensWS, ErroOrdem, URL_WS_API_BINANCE, CODIGO_STATUS_DESCONHECIDO
+from protecao_posicao import GerenciadorProtecao
+from diario import DiarioNegociacao, ordem_de_execucao
+from instrumentacao import REGISTRO, PORTA_PADRAO, servir as servir_metricas
+from log_assincrono import configurar_logging, registrar_duravel, LOGGER_ORDENS
+from portfolio import EstadoSimbolo, ColetorKlines, atualizar_motor_klines, calcular_exposicao, alocar_compras
+from corretora_simulada import CorretoraSimulada, StreamUsuarioSimulado, localizar_dados
+from estrategias import Estrategia, GrupoEstrategias, carregar_estrategias, estrategia_padrao
+import asyncio
 
 # Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("solana_bot.log"),
-        logging.StreamHandler()
-    ]
-)
+USAR_LOG_ASSINCRONO = True  # Se True, os logs são gravados por uma thread própria, fora do caminho quente
+LOG_JSON = True  # Se True, os arquivos de log têm um registro JSON por linha
+LOG_TAMANHO_MAXIMO = 50 * 1024 * 1024  # Bytes por arquivo antes da rotação
+LOG_ROTACAO_SEGUNDOS = 24 * 3600  # Rotação por tempo (0 para rotacionar só por tamanho)
+configurar_logging("solana_bot.log", "ordens_executadas.log", USAR_LOG_ASSINCRONO, LOG_JSON,
+                   tamanho_maximo=LOG_TAMANHO_MAXIMO, intervalo_rotacao=LOG_ROTACAO_SEGUNDOS)
 logger = logging.getLogger()
+log_ordens = logging.getLogger(LOGGER_ORDENS)
 
 load_dotenv()
 
@@ -27,6 +47,7 @@ API_KEY = os.getenv('BINANCE_API_KEY', 'insert your API_KEY ')
 API_SECRET = os.getenv('BINANCE_API_SECRET', 'insert your API_SECRET')
 
 SYMBOL = 'SOLUSDT'  
+ATIVO_COTACAO = 'USDT'
 INTERVAL = Client.KLINE_INTERVAL_5MINUTE 
 LIMIT = 100  
 CHECK_INTERVAL = 300  # Verificar a cada 5 minutos (300 segundos)
@@ -37,10 +58,193 @@ USAR_PERCENTUAL_SALDO = True  # Se True, usa porcentagem do saldo disponível
 PERCENTUAL_SALDO = 10  # Percentual do saldo USDT a usar em cada operação (10%)
 STOP_LOSS_PERCENT = 2.5  # Stop Loss em porcentagem
 TAKE_PROFIT_PERCENT = 5.0  # Take Profit em porcentagem
+USAR_OCO = True  # Se True, coloca stop loss e take profit como OCO na Binance logo após a compra
+USAR_VIGIA_TICKS = True  # Se True, avalia stop loss e take profit a cada tick do bookTicker
+FOLGA_STOP_LIMITE_PERCENT = 0.5  # Distância entre o stopPrice e o preço limite da perna de stop da OCO
+ARQUIVO_PROTECOES = 'protecoes.json'  # Proteções abertas, restauradas ao reiniciar
+
+# Diário de ordens, posições e decisões
+USAR_DIARIO = True  # Se True, grava tudo em SQLite (WAL) em vez de ordens_executadas.log
+ARQUIVO_DIARIO = 'diario.db'
+USAR_INDICADORES_INCREMENTAIS = True  # Se True, atualiza indicadores candle a candle em vez de recalcular tudo
+ARQUIVO_ESTRATEGIAS = os.getenv('BOT_ESTRATEGIAS')  # JSON com as regras de decisão; a primeira estratégia envia ordens
+# Timeframes maiores montados localmente a partir de INTERVAL (ex.: BOT_TIMEFRAMES=1h,4h); nas regras: rsi_1h, sma_50_4h
+TIMEFRAMES_CONFIRMACAO = [t.strip() for t in os.getenv('BOT_TIMEFRAMES', '').split(',') if t.strip()]
+CANDLES_AQUECIMENTO = 1000  # Candles base buscados na inicialização para aquecer os timeframes maiores (máx. 1000 via REST)
+if TIMEFRAMES_CONFIRMACAO:
+    USAR_INDICADORES_INCREMENTAIS = True  # Os timeframes maiores só existem no motor incremental
+LIMITE_INICIAL = max(LIMIT, CANDLES_AQUECIMENTO) if TIMEFRAMES_CONFIRMACAO else LIMIT
+MODO_STREAMING = False  # Se True, usa WebSocket (kline + bookTicker) em vez do loop REST
+STREAM_URL = os.getenv('BINANCE_STREAM_URL', URL_STREAM_BINANCE)  # Pode apontar para um servidor local de replay
+
+# Modo portfólio (vários pares em um único processo)
+MODO_PORTFOLIO = False  # Se True, negocia todos os pares de WATCHLIST
+WATCHLIST = [s.strip() for s in os.getenv('BOT_WATCHLIST', 'SOLUSDT,BTCUSDT,ETHUSDT').split(',') if s.strip()]
+MAX_EXPOSICAO_PERCENT = 50  # Percentual máximo do patrimônio alocado em posições abertas
+MAX_THREADS_DADOS = 16  # Requisições simultâneas de klines
+
+# Livro de ofertas local (diff depth) para sinais e estimativa de slippage
+USAR_LIVRO_OFERTAS = True  # Se True, mantém o livro L2 de cada par sincronizado pelo stream de diff depth
+NIVEIS_LIVRO_SNAPSHOT = 1000  # Níveis do snapshot REST usado na (re)sincronização
+MAX_SLIPPAGE_PERCENT = 0.5  # Compras com slippage estimado no livro acima disso não são enviadas
+
+# Armazém local de klines
+USAR_ARMAZEM_KLINES = True  # Se True, mantém o histórico em disco e baixa apenas candles novos
+DIRETORIO_KLINES = 'dados_klines'
+BACKFILL_INICIAL_DIAS = 7  # Histórico baixado na primeira sincronização de um par
+
+# Cache de saldos alimentado pelo user-data stream
+USAR_CACHE_SALDOS = True  # Se True, consultas de saldo são respondidas da memória
+
+# Cache das regras de negociação (exchange_info)
+CACHE_EXCHANGE_ARQUIVO = 'exchange_info.json'
+CACHE_EXCHANGE_TTL = 6 * 3600  # Segundos até baixar as regras novamente
+
+# Configurações do início rápido
+USAR_INICIO_RAPIDO = True  # Se True, retoma indicadores e regras do último snapshot ao reiniciar
+ARQUIVO_INICIO_RAPIDO = 'inicio_rapido.json'
+
+# Configurações de alta disponibilidade (várias instâncias; só o líder envia ordens)
+DIRETORIO_HA = os.getenv('BOT_HA_DIRETORIO')  # Diretório compartilhado entre os nós; vazio desliga o modo HA
+LOJA_HA = os.getenv('BOT_HA_LOJA', DIRETORIO_HA)  # Arrendamento: o diretório (trava de arquivo) ou redis://host:6379/0
+# Mesmo com o arrendamento no Redis, as proteções do líder ficam em DIRETORIO_HA (obrigatório no modo HA)
+NO_HA = os.getenv('BOT_HA_NO', f"{socket.gethostname()}-{os.getpid()}")  # Identificação deste nó
+DURACAO_LIDERANCA = 6  # Segundos de validade do arrendamento; o seguidor assume em até ~1,3x isso
+if DIRETORIO_HA:
+    # As proteções abertas pelo líder ficam onde o sucessor as encontra
+    ARQUIVO_PROTECOES = os.path.join(DIRETORIO_HA, 'protecoes.json')
+
+# Camada REST com controle de rate limit
+USAR_AGENDADOR_REST = True  # Se True, todas as chamadas REST passam pela fila com orçamento de peso
+LIMITE_PESO_MINUTO = 6000  # REQUEST_WEIGHT por minuto permitido pela Binance
+API_URL = os.getenv('BINANCE_API_URL')  # Pode apontar para um servidor REST local de testes
+
+# Caminho rápido de ordens
+USAR_EXECUCAO_RAPIDA = True  # Se True, valida ordens em memória e envia pela WebSocket API
+WS_API_URL = os.getenv('BINANCE_WS_API_URL', URL_WS_API_BINANCE)
+TENTATIVAS_CONSULTA_ORDEM = 3  # Consultas de uma ordem enviada sem resposta antes de desistir
+ESPERA_CONSULTA_ORDEM = 1.0  # Segundos entre essas consultas
+
+# Métricas de latência e throughput
+USAR_METRICAS = True  # Se True, expõe as métricas em http://127.0.0.1:PORTA_METRICAS/metrics
+PORTA_METRICAS = int(os.getenv('BOT_METRICS_PORT', PORTA_PADRAO))
+
+# Paper trading: corretora simulada sobre klines gravados, com relógio virtual
+ARQUIVO_SIMULACAO = os.getenv('BOT_SIMULACAO')  # CSV de klines ou armazém (diretório com um por par no portfólio)
+SALDO_SIMULACAO = float(os.getenv('BOT_SIMULACAO_SALDO', 1000))  # USDT inicial da conta simulada
+TAXA_SIMULACAO = 0.001  # 0,1% por execução
+LATENCIA_SIMULACAO = float(os.getenv('BOT_SIMULACAO_LATENCIA', 0))  # Segundos por chamada à corretora simulada
+if ARQUIVO_SIMULACAO:
+    # Sem conexões com a Binance e sem tocar nos arquivos da conta real
+    MODO_STREAMING = False
+    USAR_VIGIA_TICKS = False
+    USAR_ARMAZEM_KLINES = False
+    ARQUIVO_DIARIO = 'simulacao_diario.db'
+    ARQUIVO_PROTECOES = 'simulacao_protecoes.json'
+    CACHE_EXCHANGE_ARQUIVO = 'simulacao_exchange_info.json'
+    CACHE_EXCHANGE_TTL = 0  # As regras vêm dos dados simulados, nunca de um arquivo antigo
+    USAR_INICIO_RAPIDO = False  # Cada simulação começa do início dos dados
+    DIRETORIO_HA = None
+    LOJA_HA = None
+
+# Armazéns de klines abertos (um por par)
+armazens_klines = {}
+
+# Cache de saldos (inicializado em main quando USAR_CACHE_SALDOS)
+cache_saldos = None
+stream_usuario = None
+
+# Cache de regras de negociação (criado na primeira consulta)
+cache_exchange = None
+
+# Snapshot de início rápido (aberto em main quando USAR_INICIO_RAPIDO) e os motores restaurados dele
+snapshot_inicio = None
+motores_salvos = {}
+
+# Coordenação de liderança (modo HA) e o aviso para o novo líder decidir sem esperar o próximo ciclo
+coordenador_ha = None
+despertar_ciclo = threading.Event()
+
+# Executor do caminho rápido de ordens (inicializado em main quando USAR_EXECUCAO_RAPIDA)
+executor_ordens = None
+
+# Proteções de saída (OCO + vigia de ticks) das posições abertas
+gerenciador_protecao = None
+
+# Diário de negociação (inicializado em main quando USAR_DIARIO)
+diario = None
+vigia_precos = None
+
+# Corretora simulada (quando BOT_SIMULACAO aponta para klines gravados)
+corretora_simulada = None
+
+# Livros de ofertas locais (inicializados em main quando USAR_LIVRO_OFERTAS)
+fluxo_livros = None
+
+# Métricas do processo (sempre coletadas; o endpoint HTTP só sobe com USAR_METRICAS)
+metrica_etapas = REGISTRO.histograma('bot_etapa_segundos', "Duração de cada etapa do ciclo de decisão", ('etapa',))
+metrica_rest = REGISTRO.histograma('bot_rest_latencia_segundos', "Latência das chamadas REST por endpoint", ('endpoint',))
+metrica_rest_erros = REGISTRO.contador('bot_rest_erros_total', "Chamadas REST que falharam", ('endpoint',))
+metrica_ordens = REGISTRO.histograma('bot_ordem_etapa_segundos', "Latência entre as etapas de uma ordem", ('etapa',))
+metrica_decisoes = REGISTRO.contador('bot_decisoes_total', "Decisões tomadas por par", ('symbol', 'decisao'))
+metrica_sinais = REGISTRO.contador('bot_sinais_total', "Sinais de compra e venda avaliados por par", ('symbol', 'lado'))
+metrica_atraso = REGISTRO.medidor('bot_atraso_loop_segundos', "Atraso do ciclo em relação ao horário previsto", ('loop',))
+metrica_estrategias = REGISTRO.contador('bot_decisoes_estrategia_total', "Decisões de cada estratégia configurada",
+                                        ('estrategia', 'decisao'))
+
+def observar_rest(endpoint, latencia, erro):
+    metrica_rest.observar(latencia, endpoint=endpoint)
+    if erro:
+        metrica_rest_erros.inc(endpoint=endpoint)
+
+def criar_motor():
+    """Motor de indicadores do bot: só o INTERVAL ou também os timeframes de confirmação."""
+    if TIMEFRAMES_CONFIRMACAO:
+        return MotorMultiTempo(INTERVAL, TIMEFRAMES_CONFIRMACAO)
+    return MotorIndicadores()
+
+# Compila as estratégias (padrão: a contagem de sinais original do bot)
+try:
+    if ARQUIVO_ESTRATEGIAS:
+        estrategias = carregar_estrategias(ARQUIVO_ESTRATEGIAS)
+    else:
+        estrategias = GrupoEstrategias([Estrategia(estrategia_padrao())])
+    disponiveis = set(criar_motor().espiar(0.0, 0.0, 0.0))
+    if USAR_LIVRO_OFERTAS and USAR_INDICADORES_INCREMENTAIS:
+        disponiveis.update(CHAVES_LIVRO)
+    indisponiveis = set(estrategias.indicadores) - disponiveis
+    if indisponiveis:
+        raise ValueError(f"indicadores não calculados pelo bot: {', '.join(sorted(indisponiveis))}")
+    # O livro só existe no instante da decisão: não há valor do candle anterior
+    anteriores_livro = {nome for e in estrategias.estrategias for nome in e.anteriores} & set(CHAVES_LIVRO)
+    if anteriores_livro:
+        raise ValueError(f"indicadores do livro não têm valor anterior: {', '.join(sorted(anteriores_livro))}")
+    SINAIS_LIVRO = bool(set(estrategias.indicadores) & set(CHAVES_LIVRO))
+    logger.info(f"Estratégias: {', '.join(e.nome for e in estrategias.estrategias)}")
+except (OSError, ValueError) as e:
+    logger.error(f"Erro ao carregar as estratégias de {ARQUIVO_ESTRATEGIAS}: {e}")
+    exit(1)
 
 # Inicializa o cliente da Binance
 try:
-    client = Client(API_KEY, API_SECRET)
+    if ARQUIVO_SIMULACAO:
+        arquivos = localizar_dados(ARQUIVO_SIMULACAO, WATCHLIST if MODO_PORTFOLIO else [SYMBOL], INTERVAL)
+        client = corretora_simulada = CorretoraSimulada.de_arquivos(
+            arquivos, saldos={ATIVO_COTACAO: SALDO_SIMULACAO}, taxa=TAXA_SIMULACAO, latencia=LATENCIA_SIMULACAO)
+        logger.info(f"Corretora simulada sobre {ARQUIVO_SIMULACAO}: {', '.join(arquivos)}")
+    else:
+        # No início rápido o ping é dispensado: a primeira chamada já confirma a conexão
+        client = Client(API_KEY, API_SECRET, ping=API_URL is None and not USAR_INICIO_RAPIDO)
+        if API_URL:
+            client.API_URL = API_URL
+    if USAR_AGENDADOR_REST:
+        client = ClienteLimitado(client, AgendadorRequisicoes(LIMITE_PESO_MINUTO, MAX_THREADS_DADOS, observar_rest))
+        REGISTRO.medidor('bot_api_peso_usado', "REQUEST_WEIGHT usado no minuto corrente",
+                         funcao=lambda: client.agendador.metricas()['peso_usado_minuto'])
+        REGISTRO.medidor('bot_api_peso_restante', "REQUEST_WEIGHT ainda disponível no minuto corrente",
+                         funcao=lambda: client.agendador.metricas()['peso_restante_minuto'])
+        REGISTRO.medidor('bot_api_bloqueios', "Vezes em que a Binance respondeu 429/418",
+                         funcao=lambda: client.agendador.metricas()['bloqueios'])
     logger.info("Cliente Binance inicializado com sucesso")
 except Exception as e:
     logger.error(f"Erro ao inicializar cliente Binance: {e}")
@@ -52,48 +256,32 @@ def formatar_numero(valor, precisao=8):
     resultado = formato.format(valor).rstrip('0').rstrip('.')
     return resultado if resultado else '0'
 
-def obter_informacoes_simbolo():
+def ativo_base(symbol):
+    """Retorna o ativo negociado de um par cotado em USDT (ex.: SOLUSDT -> SOL)."""
+    return symbol[:-len(ATIVO_COTACAO)] if symbol.endswith(ATIVO_COTACAO) else symbol
+
+def obter_informacoes_simbolo(symbol=SYMBOL):
     """Obtém informações de trading para o símbolo."""
+    global cache_exchange
     try:
-        info = client.get_symbol_info(SYMBOL)
-        exchange_info = client.get_exchange_info()
+        if cache_exchange is None:
+            # Carregado do disco (ou da API) uma vez e atualizado em segundo plano
+            cache_exchange = CacheExchangeInfo(client, CACHE_EXCHANGE_ARQUIVO, CACHE_EXCHANGE_TTL)
+            cache_exchange.carregar()
+            cache_exchange.iniciar_atualizacao()
+        filtros = cache_exchange.simbolo(symbol)
         
-        symbol_info = None
-        for s in exchange_info['symbols']:
-            if s['symbol'] == SYMBOL:
-                symbol_info = s
-                break
-        
-        if symbol_info:
-            # Encontrar a precisão de quantidade e preço
-            lot_size_filter = next((f for f in symbol_info['filters'] if f['filterType'] == 'LOT_SIZE'), None)
-            price_filter = next((f for f in symbol_info['filters'] if f['filterType'] == 'PRICE_FILTER'), None)
-            
-            quantidade_precision = 0
-            preco_precision = 0
-            
-            if lot_size_filter:
-                step_size = float(lot_size_filter['stepSize'])
-                quantidade_precision = len(str(step_size).rstrip('0').split('.')[-1]) if '.' in str(step_size) else 0
-            
-            if price_filter:
-                tick_size = float(price_filter['tickSize'])
-                preco_precision = len(str(tick_size).rstrip('0').split('.')[-1]) if '.' in str(tick_size) else 0
-            
-            logger.info(f"Precisão de quantidade: {quantidade_precision}, Precisão de preço: {preco_precision}")
-            return {
-                'quantidade_precision': quantidade_precision,
-                'preco_precision': preco_precision,
-                'min_qty': float(lot_size_filter['minQty']) if lot_size_filter else 0.001,
-                'min_notional': float(next((f for f in symbol_info['filters'] if f['filterType'] == 'MIN_NOTIONAL'), {'minNotional': '10'})['minNotional'])
-            }
+        if filtros:
+            logger.info(f"Precisão de quantidade: {filtros.quantidade_precision}, Precisão de preço: {filtros.preco_precision}")
+            return filtros.como_symbol_info()
         else:
-            logger.error(f"Não foi possível encontrar informações para o símbolo {SYMBOL}")
+            logger.error(f"Não foi possível encontrar informações para o símbolo {symbol}")
             return {
                 'quantidade_precision': 3,  # Valor padrão
                 'preco_precision': 2,      # Valor padrão
                 'min_qty': 0.001,          # Valor padrão
-                'min_notional': 10         # Valor padrão
+                'min_notional': 10,        # Valor padrão
+                'base_asset': ativo_base(symbol)
             }
     except Exception as e:
         logger.error(f"Erro ao obter informações do símbolo: {e}")
@@ -101,12 +289,379 @@ def obter_informacoes_simbolo():
             'quantidade_precision': 3,  # Valor padrão
             'preco_precision': 2,      # Valor padrão
             'min_qty': 0.001,          # Valor padrão
-            'min_notional': 10         # Valor padrão
+            'min_notional': 10,        # Valor padrão
+            'base_asset': ativo_base(symbol)
         }
 
+def iniciar_inicio_rapido(simbolos):
+    """Abre o snapshot de início rápido e restaura dele os motores e as regras ainda válidos."""
+    global snapshot_inicio, motores_salvos, cache_exchange
+    try:
+        snapshot_inicio = SnapshotInicio(ARQUIVO_INICIO_RAPIDO, {'interval': INTERVAL, 'timeframes': TIMEFRAMES_CONFIRMACAO},
+                                         criar_motor)
+        salvo = snapshot_inicio.carregar()
+        if salvo is None:
+            return
+        
+        # Motores parados há mais candles do que uma busca normal traz seriam semeados de novo de qualquer forma
+        idade = time.time() - salvo['salvo_em']
+        if USAR_INDICADORES_INCREMENTAIS and idade * 1000 < (LIMIT - 2) * interval_to_milliseconds(INTERVAL):
+            motores_salvos = {symbol: motor for symbol, motor in salvo['motores'].items() if symbol in simbolos}
+            logger.info(f"Indicadores retomados do snapshot de {idade:.0f}s atrás: {', '.join(motores_salvos) or 'nenhum'}")
+        
+        regras, carregadas_em = salvo['regras'], salvo['regras_carregadas_em']
+        if cache_exchange is None and set(simbolos) <= set(regras) and time.time() - carregadas_em < CACHE_EXCHANGE_TTL:
+            # Regras só dos pares negociados; o exchange_info completo vem depois, em segundo plano
+            cache_exchange = CacheExchangeInfo(client, CACHE_EXCHANGE_ARQUIVO, CACHE_EXCHANGE_TTL)
+            cache_exchange.semear(regras, carregadas_em)
+            cache_exchange.iniciar_atualizacao()
+            logger.info(f"Regras de negociação retomadas do snapshot ({len(regras)} pares)")
+    except Exception as e:
+        logger.warning(f"Erro ao ler o snapshot de início rápido: {e}")
+
+def salvar_inicio_rapido(motores):
+    """Grava os motores ({symbol: motor}) e as regras dos pares para o próximo início."""
+    if snapshot_inicio is None:
+        return
+    try:
+        regras, carregadas_em = cache_exchange.exportar(motores) if cache_exchange is not None else ({}, None)
+        snapshot_inicio.salvar(motores, regras, carregadas_em)
+    except Exception as e:
+        logger.warning(f"Erro ao gravar o snapshot de início rápido: {e}")
+
+def formatar_quantidade(quantidade, symbol_info):
+    """Formata a quantidade no stepSize do par (Decimal exato quando os filtros estão em cache)."""
+    filtros = symbol_info.get('filtros')
+    if filtros is not None:
+        return filtros.formatar_quantidade(quantidade)
+    return formatar_numero(quantidade, symbol_info['quantidade_precision'])
+
+def iniciar_cache_saldos(simbolos):
+    """Carrega os saldos via REST e inicia o user-data stream que mantém o cache atualizado."""
+    global cache_saldos, stream_usuario
+    try:
+        cache = CacheSaldos(client)
+        cache.carregar()
+        ativos_par = {symbol: (ativo_base(symbol), ATIVO_COTACAO) for symbol in simbolos}
+        if corretora_simulada is not None:
+            stream_usuario = StreamUsuarioSimulado(corretora_simulada, cache, ativos_par)
+        else:
+            stream_usuario = StreamDadosUsuario(client, cache, ativos_par, url_base=STREAM_URL)
+        stream_usuario.iniciar()
+        cache_saldos = cache
+    except Exception as e:
+        logger.error(f"Erro ao iniciar cache de saldos, usando REST: {e}")
+        cache_saldos = None
+
+def iniciar_executor_ordens():
+    """Abre a conexão com a WebSocket API de ordens e liga a confirmação de fills ao user-data stream."""
+    global executor_ordens
+    try:
+        cliente_ws = None
+        if corretora_simulada is None:
+            cliente_ws = ClienteOrdensWS(API_KEY, API_SECRET, WS_API_URL)
+            cliente_ws.iniciar()
+        executor_ordens = ExecutorOrdens(client, cache_saldos, cliente_ws)
+        if stream_usuario is not None:
+            stream_usuario.ouvintes.append(executor_ordens.ao_evento_usuario)
+    except Exception as e:
+        logger.error(f"Erro ao iniciar execução rápida de ordens, usando REST: {e}")
+        executor_ordens = None
+
+def saldo_total_ativo(ativo):
+    """Saldo livre + bloqueado de um ativo."""
+    if cache_saldos is not None:
+        return sum(cache_saldos.saldo_completo(ativo))
+    return sum(float(b['free']) + float(b['locked']) for b in client.get_account()['balances'] if b['asset'] == ativo)
+
+def iniciar_livros(simbolos):
+    """Sincroniza os livros de ofertas locais dos pares pelo stream de diff depth."""
+    global fluxo_livros
+    try:
+        fluxo_livros = FluxoLivros(client, simbolos, TransporteWebSocket(STREAM_URL), NIVEIS_LIVRO_SNAPSHOT)
+        if corretora_simulada is None:
+            fluxo_livros.iniciar()
+    except Exception as e:
+        logger.error(f"Erro ao iniciar os livros de ofertas: {e}")
+        fluxo_livros = None
+
+def obter_livro(symbol=SYMBOL):
+    """Livro local do par (pode estar fora de sincronia), ou None sem livros."""
+    if fluxo_livros is None:
+        return None
+    livro = fluxo_livros.livros.get(symbol)
+    if livro is not None and corretora_simulada is not None:
+        # Sem stream na simulação: o livro sintético é relido a cada consulta
+        fluxo_livros.sincronizar(livro)
+    return livro
+
+def caracteristicas_livro(symbol=SYMBOL):
+    """Spread, desequilíbrio e microprice do livro local (NaN sem livro sincronizado)."""
+    livro = obter_livro(symbol)
+    if livro is None:
+        return dict.fromkeys(CHAVES_LIVRO, float('nan'))
+    return livro.caracteristicas()
+
+def slippage_aceitavel(symbol, quantidade):
+    """Estima no livro local o slippage de uma compra a mercado; False se passar de MAX_SLIPPAGE_PERCENT."""
+    try:
+        livro = obter_livro(symbol)
+        estimativa = livro.estimar_execucao(True, quantidade=quantidade) if livro is not None else None
+    except Exception as e:
+        logger.error(f"Erro ao estimar slippage de {symbol}: {e}")
+        return True
+    if estimativa is None:
+        return True  # sem livro sincronizado, a compra segue como antes
+    logger.info("Slippage estimado da compra de %s: %.3f%% (preço médio %g)",
+                symbol, estimativa['slippage_percent'], estimativa['preco_medio'])
+    if not estimativa['suficiente'] or estimativa['slippage_percent'] > MAX_SLIPPAGE_PERCENT:
+        logger.warning("Compra de %s cancelada: slippage estimado de %.3f%% (máximo %.3f%%, livro cobre %g de %g)",
+                       symbol, estimativa['slippage_percent'], MAX_SLIPPAGE_PERCENT,
+                       estimativa['quantidade'], quantidade)
+        return False
+    return True
+
+def iniciar_diario(simbolos):
+    """Abre o diário e reconcilia as posições gravadas com os saldos da conta."""
+    global diario
+    try:
+        diario = DiarioNegociacao(ARQUIVO_DIARIO)
+        for symbol in simbolos:
+            symbol_info = obter_informacoes_simbolo(symbol)
+            ativo = symbol_info.get('base_asset', ativo_base(symbol))
+            posicao = diario.reconciliar(symbol, saldo_total_ativo(ativo), symbol_info['min_qty'],
+                                         symbol_info['min_notional'])
+            if posicao is not None:
+                logger.info(f"Posição recuperada do diário: {posicao.quantidade} {ativo} a {posicao.preco_entrada}")
+        if stream_usuario is not None:
+            stream_usuario.ouvintes.append(registrar_execucao_oco)
+    except Exception as e:
+        logger.error(f"Erro ao abrir o diário, usando ordens_executadas.log: {e}")
+        diario = None
+
+def registrar_ordem(ordem, lado, symbol, ativo, motivo, symbol_info=None):
+    """Registra a ordem executada no diário (ou em ordens_executadas.log sem diário)."""
+    if diario is not None:
+        symbol_info = symbol_info or obter_informacoes_simbolo(symbol)
+        if diario.registrar_ordem(ordem, symbol, ativo, ATIVO_COTACAO, motivo, lado,
+                                  symbol_info['min_qty'], symbol_info['min_notional']):
+            return
+        logger.error(f"Ordem {ordem.get('orderId')} não gravada no diário, registrando em ordens_executadas.log")
+    tipo = "COMPRA" if lado == SIDE_BUY else "VENDA"
+    if not registrar_duravel(log_ordens, logging.INFO, "%s - %s", tipo, symbol, tipo=tipo, symbol=symbol,
+                             motivo=motivo, ordem=ordem):
+        logger.warning(f"Gravação da ordem {ordem.get('orderId')} em ordens_executadas.log não confirmada")
+
+def registrar_execucao_oco(evento):
+    """Ouvinte do user-data stream: fills das OCOs não passam por executar_ordem_venda."""
+    if evento.get('e') == 'executionReport' and evento.get('x') == 'TRADE' and evento.get('g', -1) != -1:
+        registrar_ordem(ordem_de_execucao(evento), evento['S'], evento['s'], ativo_base(evento['s']), "OCO")
+
+def registrar_decisao(symbol, decisao, preco, metricas):
+    metrica_decisoes.inc(symbol=symbol, decisao=decisao)
+    metrica_sinais.inc(metricas.get('sinais_compra', 0), symbol=symbol, lado='compra')
+    metrica_sinais.inc(metricas.get('sinais_venda', 0), symbol=symbol, lado='venda')
+    if diario is not None:
+        diario.registrar_decisao(symbol, decisao, preco, metricas)
+
+def preco_entrada_salvo(symbol):
+    """Preço de entrada da posição aberta segundo a proteção ativa ou o diário (None se desconhecido)."""
+    if gerenciador_protecao is not None and gerenciador_protecao.ativa(symbol):
+        return gerenciador_protecao.preco_entrada(symbol)
+    if diario is not None and diario.posicao(symbol) is not None:
+        return diario.posicao(symbol).preco_entrada
+    return None
+
+def saida_vigiada(symbol):
+    """True se a saída da posição não depende do ciclo: OCO aberta ou vigia de ticks em funcionamento."""
+    if gerenciador_protecao is None or not gerenciador_protecao.ativa(symbol):
+        return False
+    if gerenciador_protecao.oco_ativa(symbol):
+        return True
+    # No modo streaming os ticks chegam pelo FluxoMercado; fora dele, pelo VigiaPrecos
+    return USAR_VIGIA_TICKS and (MODO_STREAMING or (vigia_precos is not None and vigia_precos.ativo))
+
+def disparar_saida_protecao(symbol, preco, motivo):
+    """Venda a mercado disparada pelo vigia de ticks; retorna a ordem (False se não vendeu)."""
+    symbol_info = obter_informacoes_simbolo(symbol)
+    ordem = executar_ordem_venda(symbol_info, symbol, preco, time.perf_counter(), motivo)
+    if ordem:
+        logger.info(f"VENDA POR {motivo}: {float(ordem.get('executedQty', 0))} {symbol} a ~{preco} USDT")
+    return ordem
+
+def iniciar_protecao(simbolos, vigiar_ticks=True):
+    """Restaura as proteções salvas e liga as OCOs e o vigia de ticks aos streams."""
+    global gerenciador_protecao, vigia_precos
+    try:
+        gerenciador = GerenciadorProtecao(client, STOP_LOSS_PERCENT, TAKE_PROFIT_PERCENT, disparar_saida_protecao,
+                                          ARQUIVO_PROTECOES, USAR_OCO, FOLGA_STOP_LIMITE_PERCENT)
+        for symbol in simbolos:
+            if not gerenciador.ativa(symbol):
+                continue
+            symbol_info = obter_informacoes_simbolo(symbol)
+            if symbol_info.get('filtros') is None:
+                continue
+            ativo = symbol_info.get('base_asset', ativo_base(symbol))
+            gerenciador.restaurar(symbol, symbol_info['filtros'], saldo_total_ativo(ativo))
+        if stream_usuario is not None:
+            stream_usuario.ouvintes.append(gerenciador.ao_evento_usuario)
+        if vigiar_ticks:
+            vigia_precos = VigiaPrecos(simbolos, gerenciador.ao_preco, TransporteWebSocket(STREAM_URL))
+            vigia_precos.iniciar()
+        gerenciador_protecao = gerenciador
+    except Exception as e:
+        logger.error(f"Erro ao iniciar proteção das posições: {e}")
+        gerenciador_protecao = None
+
+def retomar_diario(simbolos):
+    """Ao assumir a liderança, alinha o diário local às posições que o líder anterior deixou.
+
+    O diário é local a cada nó: posições fechadas pelo outro nó são encerradas
+    pelo saldo, e as abertas por ele entram a partir das proteções repassadas.
+    """
+    for symbol in simbolos:
+        try:
+            if (diario.posicao(symbol) is None and gerenciador_protecao is not None
+                    and gerenciador_protecao.ativa(symbol)):
+                protecao = gerenciador_protecao.protecoes[symbol]
+                if diario.adotar_posicao(symbol, protecao.quantidade, protecao.preco_entrada):
+                    logger.info(f"Posição de {symbol} do líder anterior adotada no diário: "
+                                f"{protecao.quantidade} a {protecao.preco_entrada}")
+                else:
+                    logger.error(f"Posição de {symbol} do líder anterior não gravada no diário")
+            symbol_info = obter_informacoes_simbolo(symbol)
+            ativo = symbol_info.get('base_asset', ativo_base(symbol))
+            diario.reconciliar(symbol, saldo_total_ativo(ativo), symbol_info['min_qty'], symbol_info['min_notional'])
+        except Exception as e:
+            logger.error(f"Erro ao retomar a posição de {symbol} no diário: {e}")
+
+def iniciar_alta_disponibilidade(simbolos):
+    """Entra na disputa pela liderança; as proteções (OCOs e vigia de ticks) ficam só com o líder."""
+    global coordenador_ha
+    
+    def assumir(mandato):
+        if USAR_OCO or USAR_VIGIA_TICKS:
+            # Relê as proteções gravadas pelo líder anterior e reconcilia com saldos e OCOs abertas
+            iniciar_protecao(simbolos, USAR_VIGIA_TICKS and not MODO_STREAMING)
+        if diario is not None:
+            # Sem isso o PnL das posições abertas pelo líder anterior se perderia neste nó
+            retomar_diario(simbolos)
+        despertar_ciclo.set()
+    
+    def perder():
+        global gerenciador_protecao, vigia_precos
+        if gerenciador_protecao is not None and stream_usuario is not None:
+            # Nova lista em vez de remover no lugar: a thread do stream pode estar percorrendo a atual
+            stream_usuario.ouvintes = [o for o in stream_usuario.ouvintes if o != gerenciador_protecao.ao_evento_usuario]
+        gerenciador_protecao = None
+        if vigia_precos is not None:
+            vigia_precos.parar()
+            vigia_precos = None
+    
+    try:
+        coordenador_ha = CoordenadorHA(abrir_loja(LOJA_HA), NO_HA, DURACAO_LIDERANCA, assumir, perder)
+        REGISTRO.medidor('bot_lider', "1 se este nó é o líder (modo HA)", funcao=lambda: float(coordenador_ha.lider))
+        coordenador_ha.iniciar()
+    except Exception as e:
+        logger.error(f"Erro ao iniciar a alta disponibilidade em {LOJA_HA}: {e}")
+        exit(1)
+
+def autorizar_ordem(symbol, lado, motivo="SINAL"):
+    """Retorna (autorizada, newClientOrderId); fora do modo HA toda ordem é autorizada com um id aleatório."""
+    if coordenador_ha is None:
+        # Id conhecido antes do envio: permite consultar a ordem se a resposta não chegar
+        return True, f"bot-{uuid.uuid4().hex[:24]}"
+    if not coordenador_ha.lider:
+        logger.info(f"Ordem {lado} de {symbol} não enviada: este nó não é o líder")
+        return False, None
+    instante = time.time()
+    # Vendas podem ser repetidas no candle (não vendem além do saldo); compras, não
+    for tentativa in range(TENTATIVAS_VENDA if lado == SIDE_SELL else 1):
+        client_order_id = id_ordem_cliente(symbol, lado, interval_to_milliseconds(INTERVAL), instante, motivo, tentativa)
+        if coordenador_ha.reservar_ordem(client_order_id):
+            return True, client_order_id
+    logger.warning(f"Ordem {client_order_id} já enviada neste candle (por este ou outro nó), ignorando")
+    return False, None
+
+def cancelar_reserva_ordem(client_order_id):
+    """Libera o newClientOrderId de uma ordem que com certeza não foi executada."""
+    if coordenador_ha is not None and client_order_id is not None:
+        coordenador_ha.cancelar_reserva(client_order_id)
+
+def reconciliar_ordem_incerta(symbol, client_order_id, erro):
+    """Resolve uma ordem cujo envio falhou sem resposta (timeout do ack, conexão perdida).
+    
+    Retorna a ordem se a Binance a executou (mesmo que em parte) e None caso contrário. A reserva
+    do newClientOrderId só é liberada quando a Binance confirma que a ordem não existe.
+    """
+    codigo = getattr(erro, 'code', None)
+    if codigo not in (None, CODIGO_STATUS_DESCONHECIDO) and (getattr(erro, 'status_code', None) or 400) < 500:
+        # A Binance respondeu com uma recusa (4xx): a ordem não foi aceita
+        cancelar_reserva_ordem(client_order_id)
+        return None
+    inexistente = False
+    for tentativa in range(TENTATIVAS_CONSULTA_ORDEM):
+        if tentativa:
+            time.sleep(ESPERA_CONSULTA_ORDEM)
+        try:
+            ordem = client.get_order(symbol=symbol, origClientOrderId=client_order_id)
+        except Exception as e:
+            # -2013: ordem inexistente; consulta de novo caso a ordem ainda esteja sendo registrada
+            inexistente = getattr(e, 'code', None) == -2013
+            if not inexistente:
+                logger.warning(f"Erro ao consultar a ordem {client_order_id} de {symbol}: {e}")
+            continue
+        if float(ordem.get('executedQty', 0)) > 0:
+            logger.warning(f"Ordem {client_order_id} de {symbol} executada apesar do erro no envio "
+                           f"(status {ordem.get('status')})")
+            return ordem
+        inexistente = False
+        if ordem.get('status') not in ('NEW', 'PARTIALLY_FILLED', 'PENDING_NEW'):
+            logger.warning(f"Ordem {client_order_id} de {symbol} encerrada sem execução ({ordem.get('status')})")
+            cancelar_reserva_ordem(client_order_id)
+            return None
+    if inexistente:
+        logger.warning(f"Ordem {client_order_id} de {symbol} não chegou à Binance")
+        cancelar_reserva_ordem(client_order_id)
+    else:
+        logger.error(f"Situação da ordem {client_order_id} de {symbol} desconhecida; verifique a conta")
+    return None
+
+def posicao_aberta(symbol, saldos, symbol_info, preco=None):
+    """Há posição aberta se houver saldo livre do ativo ou uma proteção (OCO) segurando o saldo.
+    
+    Com o preço informado, sobras que não formam uma ordem válida (abaixo do valor mínimo,
+    como a poeira deixada pela quantidade arredondada da OCO) contam como sem posição.
+    """
+    ativo = symbol_info.get('base_asset', ativo_base(symbol))
+    if gerenciador_protecao is not None and gerenciador_protecao.ativa(symbol):
+        return True
+    saldo = saldos.get(ativo, 0)
+    if saldo <= symbol_info['min_qty']:
+        return False
+    return preco is None or saldo * preco >= symbol_info['min_notional']
+
+def sincronizar_posicao(posicao, symbol, symbol_info, saldos, preco_atual):
+    """Atualiza saldos, posição aberta e preço de entrada no início de cada ciclo.
+    
+    A posição pode ter sido encerrada fora do ciclo (OCO executada na Binance) ou aberta
+    por outro nó no modo HA: o preço de entrada vem da proteção ou do diário.
+    """
+    posicao['saldos'] = saldos
+    posicao['em_posicao'] = posicao_aberta(symbol, saldos, symbol_info, preco_atual)
+    if not posicao['em_posicao']:
+        posicao['preco_entrada'] = None
+        return
+    preco_entrada = preco_entrada_salvo(symbol)
+    if preco_entrada is not None:
+        posicao['preco_entrada'] = preco_entrada
+
 def obter_saldo(asset):
     """Obtém o saldo disponível de um ativo específico."""
     try:
+        if cache_saldos is not None:
+            return cache_saldos.saldo(asset)
+        
         account = client.get_account()
         for balance in account['balances']:
             if balance['asset'] == asset:
@@ -116,13 +671,18 @@ def obter_saldo(asset):
         logger.error(f"Erro ao obter saldo de {asset}: {e}")
         return 0.0
 
-def calcular_quantidade_compra(preco_atual, symbol_info):
-    """Calcula a quantidade a ser comprada com base no saldo USDT e regras do par."""
+def calcular_quantidade_compra(preco_atual, symbol_info, valor_compra=None):
+    """Calcula a quantidade a ser comprada com base no saldo USDT e regras do par.
+    
+    Se `valor_compra` for informado (alocação do modo portfólio), ele substitui o percentual do saldo.
+    """
     try:
-        saldo_usdt = obter_saldo('USDT')
-        logger.info(f"Saldo USDT disponível: {saldo_usdt}")
-        
-        if USAR_PERCENTUAL_SALDO:
+        if valor_compra is not None:
+            logger.info(f"Valor alocado para compra: {valor_compra} USDT")
+        elif USAR_PERCENTUAL_SALDO:
+            saldo_usdt = obter_saldo('USDT')
+            logger.info(f"Saldo USDT disponível: {saldo_usdt}")
+            
             # Usar percentual do saldo USDT
             valor_compra = saldo_usdt * (PERCENTUAL_SALDO / 100)
         else:
@@ -143,41 +703,67 @@ def calcular_quantidade_compra(preco_atual, symbol_info):
             quantidade = symbol_info['min_qty']
         
         # Arredondar para a precisão correta
-        quantidade = round(quantidade, symbol_info['quantidade_precision'])
+        if symbol_info.get('filtros') is not None:
+            quantidade = float(symbol_info['filtros'].quantizar_quantidade(quantidade))
+        else:
+            quantidade = round(quantidade, symbol_info['quantidade_precision'])
         
-        logger.info(f"Quantidade calculada para compra: {quantidade} SOL")
+        logger.info(f"Quantidade calculada para compra: {quantidade} {symbol_info.get('base_asset', ativo_base(SYMBOL))}")
         return quantidade
     except Exception as e:
         logger.error(f"Erro ao calcular quantidade de compra: {e}")
         return MIN_QUANTIDADE  # Retorna quantidade mínima em caso de erro
 
-def obter_dados_historicos():
-    """Obtém dados históricos do par selecionado."""
+@metrica_etapas.cronometrar(etapa='obter_dados_historicos')
+def obter_candles(symbol=SYMBOL, limite=LIMIT):
+    """Obtém os últimos candles do par como arrays tipados, só com as colunas usadas pelo bot."""
     try:
-        logger.info(f"Obtendo dados históricos para {SYMBOL} no intervalo {INTERVAL}...")
-        candles = client.get_klines(symbol=SYMBOL, interval=INTERVAL, limit=LIMIT)
-        df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 
-                                         'close_time', 'quote_asset_volume', 'number_of_trades',
-                                         'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])
-        
-        # Converter colunas para valores numéricos
-        df['open'] = pd.to_numeric(df['open'])
-        df['high'] = pd.to_numeric(df['high'])
-        df['low'] = pd.to_numeric(df['low'])
-        df['close'] = pd.to_numeric(df['close'])
-        df['volume'] = pd.to_numeric(df['volume'])
+        logger.info("Obtendo dados históricos para %s no intervalo %s...", symbol, INTERVAL)
+        if USAR_ARMAZEM_KLINES:
+            return obter_candles_armazem(symbol, limite)
         
-        # Converter timestamp para datetime
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-        
-        logger.info(f"Dados obtidos com sucesso: {len(df)} candles")
-        return df
+        candles = klines_para_colunas(client.get_klines(symbol=symbol, interval=INTERVAL, limit=limite),
+                                      COLUNAS_CANDLE)
+        logger.info("Dados obtidos com sucesso: %d candles", len(candles['timestamp']))
+        return candles
     except Exception as e:
         logger.error(f"Erro ao obter dados históricos: {e}")
         return None
 
+def obter_candles_armazem(symbol=SYMBOL, limite=LIMIT):
+    """Sincroniza o armazém local do par e retorna os últimos candles a partir dele."""
+    armazem = armazens_klines.get(symbol)
+    if armazem is None:
+        armazem = armazens_klines[symbol] = abrir_armazem(symbol, INTERVAL, DIRETORIO_KLINES)
+    
+    # Baixa apenas os candles posteriores ao último gravado
+    inicio_ms = int((time.time() - BACKFILL_INICIAL_DIAS * 86400) * 1000)
+    em_formacao = armazem.sincronizar(client, inicio_ms)
+    
+    colunas = armazem.ultimos(limite - 1 if em_formacao is not None else limite, COLUNAS_CANDLE)
+    if em_formacao is not None:
+        candle_atual = klines_para_colunas([em_formacao], COLUNAS_CANDLE)
+        colunas = {nome: np.concatenate((colunas[nome], candle_atual[nome])) for nome, _, _ in COLUNAS_CANDLE}
+    
+    logger.info("Dados obtidos com sucesso: %d candles (%d no armazém local)", len(colunas['timestamp']), len(armazem))
+    return colunas
+
+def obter_dados_historicos(symbol=SYMBOL, limite=LIMIT):
+    """Obtém dados históricos do par selecionado como DataFrame (caminho sem indicadores incrementais)."""
+    import pandas as pd
+    
+    candles = obter_candles(symbol, limite)
+    if candles is None:
+        return None
+    df = pd.DataFrame(candles)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
+@metrica_etapas.cronometrar(etapa='calcular_indicadores')
 def calcular_indicadores(df):
     """Calcula indicadores técnicos no DataFrame."""
+    import ta
+    
     try:
         # RSI (Índice de Força Relativa)
         df['rsi'] = ta.momentum.RSIIndicator(df['close'], window=14).rsi()
@@ -206,12 +792,49 @@ def calcular_indicadores(df):
         df['stoch_k'] = stoch.stoch()
         df['stoch_d'] = stoch.stoch_signal()
         
+        # Fluxo de agressão (fração do volume comprada por takers)
+        volume_compra = df['taker_buy_base_asset_volume']
+        df['taker_compra'] = volume_compra / df['volume'].where(df['volume'] > 0)
+        volume_janela = df['volume'].rolling(14).sum()
+        df['taker_compra_14'] = volume_compra.rolling(14).sum() / volume_janela.where(volume_janela > 0)
+        
         logger.info("Indicadores calculados com sucesso")
         return df
     except Exception as e:
         logger.error(f"Erro ao calcular indicadores: {e}")
         return df
 
+@metrica_etapas.cronometrar(etapa='atualizar_motor_indicadores')
+def atualizar_motor_indicadores(motor, candles):
+    """Alimenta o motor incremental com os candles fechados novos e calcula o candle em formação."""
+    # O último candle retornado pela API ainda está em formação
+    fechados = len(candles['timestamp']) - 1
+    timestamps = candles['timestamp']
+    inicio = 0
+    
+    if motor is not None and motor.ultimo_timestamp is not None:
+        inicio = int(np.searchsorted(timestamps[:fechados], motor.ultimo_timestamp, side='right'))
+        if inicio == 0:
+            # Lacuna entre o estado do motor e o histórico recebido
+            logger.warning("Lacuna nos candles recebidos, reinicializando indicadores incrementais")
+            motor = None
+    
+    if motor is None:
+        motor = criar_motor().semear({nome: coluna[:fechados] for nome, coluna in candles.items()})
+        logger.info(f"Indicadores incrementais inicializados com {len(motor)} candles")
+    else:
+        novos = zip(timestamps[inicio:fechados].tolist(), candles['high'][inicio:fechados].tolist(),
+                    candles['low'][inicio:fechados].tolist(), candles['close'][inicio:fechados].tolist(),
+                    candles['volume'][inicio:fechados].tolist(),
+                    candles['taker_buy_base_asset_volume'][inicio:fechados].tolist())
+        for candle in novos:
+            motor.atualizar(*candle)
+    
+    linha_atual = motor.espiar(candles['high'][-1].item(), candles['low'][-1].item(), candles['close'][-1].item(),
+                               candles['volume'][-1].item(), candles['taker_buy_base_asset_volume'][-1].item())
+    return motor, linha_atual
+
+@metrica_etapas.cronometrar(etapa='analisar_mercado')
 def analisar_mercado(df):
     """Analisa o mercado e retorna uma decisão de trading."""
     try:
@@ -220,191 +843,235 @@ def analisar_mercado(df):
             return "AGUARDAR", {}
             
         # Últimos dois candles para comparação
-        penultima_linha = df.iloc[-2]
-        ultima_linha = df.iloc[-1]
-        
-        # Coletar métricas para logging
-        metricas = {
-            'preco': ultima_linha['close'],
-            'rsi': ultima_linha['rsi'],
-            'sma_9': ultima_linha['sma_9'],
-            'sma_20': ultima_linha['sma_20'],
-            'macd': ultima_linha['macd'],
-            'macd_signal': ultima_linha['macd_signal'],
-            'stoch_k': ultima_linha['stoch_k'],
-            'stoch_d': ultima_linha['stoch_d'],
-            'bb_pct': ultima_linha['bb_pct']
-        }
-        
-        # 1. Verificar RSI (sobrecomprado/sobrevendido)
-        rsi = ultima_linha['rsi']
-        rsi_anterior = penultima_linha['rsi']
-        sobrevendido = rsi < 30
-        sobrecomprado = rsi > 70
-        rsi_subindo = rsi > rsi_anterior
-        
-        # 2. Verificar cruzamento de MACD
-        macd = ultima_linha['macd']
-        macd_signal = ultima_linha['macd_signal']
-        macd_anterior = penultima_linha['macd']
-        macd_signal_anterior = penultima_linha['macd_signal']
-        
-        # Verificar cruzamento para cima do MACD
-        cruzamento_macd_cima = (macd > macd_signal) and (macd_anterior <= macd_signal_anterior)
-        # Verificar cruzamento para baixo do MACD
-        cruzamento_macd_baixo = (macd < macd_signal) and (macd_anterior >= macd_signal_anterior)
-        
-        # 3. Verificar médias móveis
-        preco_atual = ultima_linha['close']
-        sma_9 = ultima_linha['sma_9']
-        sma_20 = ultima_linha['sma_20']
-        sma_50 = ultima_linha['sma_50'] if 'sma_50' in ultima_linha else 0
-        
-        acima_sma9 = preco_atual > sma_9
-        acima_sma20 = preco_atual > sma_20
-        tendencia_alta = sma_9 > sma_20 and sma_20 > sma_50 if sma_50 > 0 else sma_9 > sma_20
-        tendencia_baixa = sma_9 < sma_20 and sma_20 < sma_50 if sma_50 > 0 else sma_9 < sma_20
-        
-        # 4. Verificar Bollinger Bands
-        bb_high = ultima_linha['bb_high']
-        bb_low = ultima_linha['bb_low']
-        bb_mid = ultima_linha['bb_mid']
-        bb_pct = ultima_linha['bb_pct']
-        proxim_banda_inferior = bb_pct < 0.2
-        proxim_banda_superior = bb_pct > 0.8
-        
-        # 5. Verificar Stochastic
-        stoch_k = ultima_linha['stoch_k']
-        stoch_d = ultima_linha['stoch_d']
-        stoch_k_anterior = penultima_linha['stoch_k']
-        stoch_d_anterior = penultima_linha['stoch_d']
-        
-        stoch_sobrevendido = stoch_k < 20 and stoch_d < 20
-        stoch_sobrecomprado = stoch_k > 80 and stoch_d > 80
-        cruzamento_stoch_cima = (stoch_k > stoch_d) and (stoch_k_anterior <= stoch_d_anterior)
-        cruzamento_stoch_baixo = (stoch_k < stoch_d) and (stoch_k_anterior >= stoch_d_anterior)
-        
-        # Lógica de decisão combinando indicadores
-        sinais_compra = 0
-        sinais_venda = 0
-        
-        # Sinais de compra
-        if sobrevendido: sinais_compra += 1
-        if cruzamento_macd_cima: sinais_compra += 1
-        if proxim_banda_inferior: sinais_compra += 1
-        if stoch_sobrevendido: sinais_compra += 1
-        if cruzamento_stoch_cima and stoch_k < 50: sinais_compra += 1
-        if tendencia_alta: sinais_compra += 1
-        
-        # Sinais de venda
-        if sobrecomprado: sinais_venda += 1
-        if cruzamento_macd_baixo: sinais_venda += 1
-        if proxim_banda_superior: sinais_venda += 1
-        if stoch_sobrecomprado: sinais_venda += 1
-        if cruzamento_stoch_baixo and stoch_k > 50: sinais_venda += 1
-        if tendencia_baixa: sinais_venda += 1
+        return avaliar_sinais(df.iloc[-1], df.iloc[-2])
+            
+    except Exception as e:
+        logger.error(f"Erro ao analisar mercado: {e}")
+        return "AGUARDAR", {'erro': str(e)}
+
+@metrica_etapas.cronometrar(etapa='analisar_mercado_incremental')
+def analisar_mercado_incremental(motor, linha_atual=None, symbol=SYMBOL):
+    """Analisa o mercado a partir do estado do motor incremental, sem DataFrame."""
+    try:
+        if motor is None or motor.penultima_linha is None or len(motor) + (linha_atual is not None) < 50:
+            logger.warning("Dados insuficientes para análise")
+            return "AGUARDAR", {}
         
-        # Decisão final (precisamos de pelo menos 3 sinais concordantes)
-        if sinais_compra >= 3 and sinais_compra > sinais_venda:
-            logger.info(f"Decisão: COMPRAR - {sinais_compra} sinais de compra vs {sinais_venda} de venda")
-            return "COMPRAR", metricas
-        elif sinais_venda >= 3 and sinais_venda > sinais_compra:
-            logger.info(f"Decisão: VENDER - {sinais_venda} sinais de venda vs {sinais_compra} de compra")
-            return "VENDER", metricas
+        # Sem candle em formação, analisa o último candle fechado
+        if linha_atual is None:
+            atual, anterior = motor.ultima_linha, motor.penultima_linha
         else:
-            logger.info(f"Decisão: AGUARDAR - {sinais_compra} sinais de compra vs {sinais_venda} de venda")
-            return "AGUARDAR", metricas
+            atual, anterior = linha_atual, motor.ultima_linha
+        if SINAIS_LIVRO:
+            atual = {**atual, **caracteristicas_livro(symbol)}
+        return avaliar_sinais(atual, anterior)
             
     except Exception as e:
         logger.error(f"Erro ao analisar mercado: {e}")
         return "AGUARDAR", {'erro': str(e)}
 
-def executar_ordem_compra(quantidade, symbol_info):
-    """Executa uma ordem de compra."""
+def avaliar_sinais(ultima_linha, penultima_linha):
+    """Avalia as estratégias configuradas nos dois últimos candles; a principal decide."""
     try:
-        # Verificar saldo antes de comprar
-        saldo_usdt = obter_saldo('USDT')
+        resultados = estrategias.avaliar(ultima_linha, penultima_linha)
+        decisao, metricas = resultados[estrategias.principal.nome]
+        if len(resultados) > 1:
+            # Estratégias secundárias só são registradas, para comparação
+            metricas['estrategias'] = {nome: d for nome, (d, _) in resultados.items()}
+            for nome, (decisao_estrategia, _) in resultados.items():
+                metrica_estrategias.inc(estrategia=nome, decisao=decisao_estrategia)
+            logger.info("Estratégias: %s", ", ".join(f"{nome} {d}" for nome, (d, _) in resultados.items()))
         
-        if saldo_usdt < quantidade * float(client.get_ticker(symbol=SYMBOL)['lastPrice']):
-            logger.warning(f"Saldo USDT insuficiente: {saldo_usdt}")
-            return False
+        sinais_compra = metricas['sinais_compra']
+        sinais_venda = metricas['sinais_venda']
+        if decisao == "COMPRAR":
+            logger.info("Decisão: COMPRAR - %g sinais de compra vs %g de venda", sinais_compra, sinais_venda)
+        elif decisao == "VENDER":
+            logger.info("Decisão: VENDER - %g sinais de venda vs %g de compra", sinais_venda, sinais_compra)
+        else:
+            logger.info("Decisão: AGUARDAR - %g sinais de compra vs %g de venda", sinais_compra, sinais_venda)
+        return decisao, metricas
             
-        # Formatar quantidade com precisão correta
-        quantidade_formatada = formatar_numero(quantidade, symbol_info['quantidade_precision'])
-        
-        logger.info(f"Executando ordem de COMPRA para {SYMBOL}, quantidade: {quantidade_formatada}")
-        
-        ordem = client.create_order(
-            symbol=SYMBOL,
-            side=SIDE_BUY,
-            type=ORDER_TYPE_MARKET,
-            quantity=quantidade_formatada
-        )
-        
-        logger.info(f"Ordem de COMPRA executada: {ordem['orderId']}")
-        # Registrar dados completos em um arquivo separado para análise
-        with open("ordens_executadas.log", "a") as f:
-            f.write(f"{datetime.now()} - COMPRA - {ordem}\n")
+    except Exception as e:
+        logger.error(f"Erro ao analisar mercado: {e}")
+        return "AGUARDAR", {'erro': str(e)}
+
+def executar_ordem_rapida(lado, quantidade, preco_referencia, symbol_info, symbol, instante_sinal=None,
+                          client_order_id=None):
+    """Envia a ordem pelo caminho rápido (validação em memória + WebSocket API)."""
+    ativo = symbol_info.get('base_asset', ativo_base(symbol))
+    logger.info(f"Executando ordem de {'COMPRA' if lado == SIDE_BUY else 'VENDA'} para {symbol} pelo caminho rápido")
+    ordem = executor_ordens.executar_mercado(symbol, lado, quantidade, preco_referencia, symbol_info['filtros'],
+                                             ativo, ATIVO_COTACAO, instante_sinal, client_order_id)
+    for etapa, ms in executor_ordens.historico_latencias[-1].items():
+        metrica_ordens.observar(ms / 1000, etapa=etapa)
+    return ordem
+
+def concluir_ordem(ordem, lado, symbol, symbol_info, motivo):
+    """Aplica uma ordem executada ao cache de saldos, à proteção e ao diário."""
+    ativo = symbol_info.get('base_asset', ativo_base(symbol))
+    logger.info(f"Ordem de {'COMPRA' if lado == SIDE_BUY else 'VENDA'} executada: {ordem['orderId']}")
+    try:
+        if cache_saldos is not None:
+            cache_saldos.aplicar_ordem(ordem, ativo, ATIVO_COTACAO)
+        if lado == SIDE_SELL and gerenciador_protecao is not None:
+            gerenciador_protecao.encerrar(symbol)
+        # Registrar dados completos para análise
+        registrar_ordem(ordem, lado, symbol, ativo, motivo, symbol_info)
+    except Exception as e:
+        logger.error(f"Erro ao registrar a ordem {ordem.get('orderId')} de {symbol}: {e}")
+
+def executar_ordem_compra(quantidade, symbol_info, symbol=SYMBOL, preco_referencia=None, instante_sinal=None):
+    """Executa uma ordem de compra e retorna a resposta da Binance (False em caso de erro).
+    
+    `preco_referencia` é o preço que gerou o sinal; quando informado, evita a consulta ao ticker.
+    """
+    autorizada, client_order_id = autorizar_ordem(symbol, SIDE_BUY)
+    if not autorizada:
+        return False
+    try:
+        if executor_ordens is not None and preco_referencia is not None and symbol_info.get('filtros') is not None:
+            ordem = executar_ordem_rapida(SIDE_BUY, quantidade, preco_referencia, symbol_info, symbol, instante_sinal,
+                                          client_order_id)
+        else:
+            # Verificar saldo antes de comprar
+            saldo_usdt = obter_saldo('USDT')
+            if preco_referencia is None:
+                preco_referencia = float(client.get_ticker(symbol=symbol)['lastPrice'])
             
-        return True
-        
+            if saldo_usdt < quantidade * preco_referencia:
+                logger.warning(f"Saldo USDT insuficiente: {saldo_usdt}")
+                cancelar_reserva_ordem(client_order_id)
+                return False
+                
+            # Formatar quantidade com precisão correta
+            quantidade_formatada = formatar_quantidade(quantidade, symbol_info)
+            
+            logger.info(f"Executando ordem de COMPRA para {symbol}, quantidade: {quantidade_formatada}")
+            
+            ordem = client.create_order(
+                symbol=symbol,
+                side=SIDE_BUY,
+                type=ORDER_TYPE_MARKET,
+                quantity=quantidade_formatada,
+                newClientOrderId=client_order_id
+            )
+
     except BinanceAPIException as e:
         logger.error(f"Erro da API Binance ao executar compra: {e}")
+        # Recusa definitiva ou erro do servidor (5xx, -1007) com a ordem possivelmente executada
+        ordem = reconciliar_ordem_incerta(symbol, client_order_id, e)
+        if ordem is None:
+            return False
+    except ErroOrdem as e:
+        logger.error(f"Ordem de compra recusada: {e}")
+        cancelar_reserva_ordem(client_order_id)
         return False
     except Exception as e:
         logger.error(f"Erro ao executar ordem de compra: {e}")
+        # Pode ter sido enviada sem que a resposta chegasse: a Binance diz se foi executada
+        ordem = reconciliar_ordem_incerta(symbol, client_order_id, e)
+        if ordem is None:
+            return False
+    
+    concluir_ordem(ordem, SIDE_BUY, symbol, symbol_info, "SINAL")
+    return ordem
+
+def executar_ordem_venda(symbol_info, symbol=SYMBOL, preco_referencia=None, instante_sinal=None, motivo="SINAL"):
+    """Executa uma ordem de venda e retorna a resposta da Binance (False em caso de erro)."""
+    autorizada, client_order_id = autorizar_ordem(symbol, SIDE_SELL, motivo)
+    if not autorizada:
         return False
+    oco_ativa = gerenciador_protecao is not None and gerenciador_protecao.oco_ativa(symbol)
+    ordem = enviar_ordem_venda(symbol_info, symbol, preco_referencia, instante_sinal, motivo, client_order_id)
+    if not ordem and oco_ativa and gerenciador_protecao is not None and symbol_info.get('filtros') is not None:
+        # A OCO foi cancelada para esta venda, que não saiu: a posição não pode ficar sem proteção
+        gerenciador_protecao.rearmar(symbol, symbol_info['filtros'])
+    return ordem
 
-def executar_ordem_venda(symbol_info):
-    """Executa uma ordem de venda."""
+def enviar_ordem_venda(symbol_info, symbol, preco_referencia, instante_sinal, motivo, client_order_id):
+    """Cancela a OCO da posição, se houver, e envia a venda a mercado de todo o saldo."""
     try:
-        # Obter saldo de SOL
-        saldo_sol = obter_saldo('SOL')
+        # Obter saldo do ativo base
+        ativo = symbol_info.get('base_asset', ativo_base(symbol))
+        if gerenciador_protecao is not None and gerenciador_protecao.ativa(symbol):
+            # O saldo está bloqueado na OCO: cancela e vende a quantidade protegida
+            saldo_ativo = gerenciador_protecao.cancelar(symbol)
+            if saldo_ativo is None:
+                logger.warning(f"Venda de {symbol} não enviada: a OCO da posição continua aberta")
+                cancelar_reserva_ordem(client_order_id)
+                return False
+            if cache_saldos is not None:
+                cache_saldos.desbloquear(ativo, saldo_ativo)
+        else:
+            saldo_ativo = obter_saldo(ativo)
         
-        if saldo_sol <= 0:
-            logger.warning(f"Sem saldo de SOL para vender: {saldo_sol}")
+        if saldo_ativo <= 0:
+            logger.warning(f"Sem saldo de {ativo} para vender: {saldo_ativo}")
+            cancelar_reserva_ordem(client_order_id)
             return False
             
         # Garantir que respeita a quantidade mínima
-        if saldo_sol < symbol_info['min_qty']:
-            logger.warning(f"Saldo SOL abaixo do mínimo permitido: {saldo_sol} < {symbol_info['min_qty']}")
+        if saldo_ativo < symbol_info['min_qty']:
+            logger.warning(f"Saldo {ativo} abaixo do mínimo permitido: {saldo_ativo} < {symbol_info['min_qty']}")
+            cancelar_reserva_ordem(client_order_id)
             return False
             
-        # Formatar quantidade com precisão correta
-        quantidade_formatada = formatar_numero(saldo_sol, symbol_info['quantidade_precision'])
-        
-        logger.info(f"Executando ordem de VENDA para {SYMBOL}, quantidade: {quantidade_formatada}")
-        
-        ordem = client.create_order(
-            symbol=SYMBOL,
-            side=SIDE_SELL,
-            type=ORDER_TYPE_MARKET,
-            quantity=quantidade_formatada
-        )
-        
-        logger.info(f"Ordem de VENDA executada: {ordem['orderId']}")
-        # Registrar dados completos em um arquivo separado para análise
-        with open("ordens_executadas.log", "a") as f:
-            f.write(f"{datetime.now()} - VENDA - {ordem}\n")
+        if executor_ordens is not None and preco_referencia is not None and symbol_info.get('filtros') is not None:
+            ordem = executar_ordem_rapida(SIDE_SELL, saldo_ativo, preco_referencia, symbol_info, symbol, instante_sinal,
+                                          client_order_id)
+        else:
+            # Formatar quantidade com precisão correta
+            quantidade_formatada = formatar_quantidade(saldo_ativo, symbol_info)
             
-        return True
-        
+            logger.info(f"Executando ordem de VENDA para {symbol}, quantidade: {quantidade_formatada}")
+            
+            ordem = client.create_order(
+                symbol=symbol,
+                side=SIDE_SELL,
+                type=ORDER_TYPE_MARKET,
+                quantity=quantidade_formatada,
+                newClientOrderId=client_order_id
+            )
+
     except BinanceAPIException as e:
         logger.error(f"Erro da API Binance ao executar venda: {e}")
+        # Recusa definitiva ou erro do servidor (5xx, -1007) com a ordem possivelmente executada
+        ordem = reconciliar_ordem_incerta(symbol, client_order_id, e)
+        if ordem is None:
+            return False
+    except ErroOrdem as e:
+        logger.error(f"Ordem de venda recusada: {e}")
+        cancelar_reserva_ordem(client_order_id)
         return False
     except Exception as e:
         logger.error(f"Erro ao executar ordem de venda: {e}")
-        return False
+        # Pode ter sido enviada sem que a resposta chegasse: a Binance diz se foi executada
+        ordem = reconciliar_ordem_incerta(symbol, client_order_id, e)
+        if ordem is None:
+            return False
+    
+    concluir_ordem(ordem, SIDE_SELL, symbol, symbol_info, motivo)
+    return ordem
 
-def verificar_saldo():
+@metrica_etapas.cronometrar(etapa='verificar_saldo')
+def verificar_saldo(moedas_interesse=None):
     """Verifica o saldo disponível na conta."""
     try:
+        if moedas_interesse is None:
+            moedas_interesse = [ativo_base(SYMBOL), 'USDT']
+        saldos = {}
+        
+        if cache_saldos is not None:
+            for ativo in moedas_interesse:
+                saldo_livre, saldo_bloqueado = cache_saldos.saldo_completo(ativo)
+                logger.info(f"Saldo {ativo}: {saldo_livre} (livre) + {saldo_bloqueado} (bloqueado)")
+                saldos[ativo] = saldo_livre
+            return saldos
+        
         account = client.get_account()
         balances = account['balances']
         
-        moedas_interesse = ['SOL', 'USDT']
-        saldos = {}
-        
         for balance in balances:
             if balance['asset'] in moedas_interesse:
                 saldo_livre = float(balance['free'])
@@ -417,6 +1084,244 @@ def verificar_saldo():
         logger.error(f"Erro ao verificar saldo: {e}")
         return {}
 
+def variacao_posicao(preco_atual, posicao):
+    """Retorna a variação percentual do preço em relação à entrada da posição."""
+    return ((preco_atual - posicao['preco_entrada']) / posicao['preco_entrada']) * 100
+
+def verificar_stop_take(preco_atual, posicao, symbol_info, symbol=SYMBOL):
+    """Vende a posição se o stop loss ou o take profit forem atingidos."""
+    instante_sinal = time.perf_counter()
+    ativo = symbol_info.get('base_asset', ativo_base(symbol))
+    variacao_percentual = variacao_posicao(preco_atual, posicao)
+    
+    if variacao_percentual <= -STOP_LOSS_PERCENT:
+        logger.info("STOP LOSS ACIONADO: Variação de %.2f%%", variacao_percentual, extra={'amostra': f"stop:{symbol}"})
+        
+        ordem = executar_ordem_venda(symbol_info, symbol, preco_atual, instante_sinal, "STOP LOSS")
+        if ordem:
+            logger.info(f"VENDA POR STOP LOSS: {float(ordem.get('executedQty', 0))} {ativo} a ~{preco_atual} USDT")
+            posicao['em_posicao'] = False
+            posicao['preco_entrada'] = None
+            posicao['saldos'] = verificar_saldo([ativo, 'USDT'])
+            return True
+            
+    elif variacao_percentual >= TAKE_PROFIT_PERCENT:
+        logger.info("TAKE PROFIT ACIONADO: Variação de %.2f%%", variacao_percentual, extra={'amostra': f"take:{symbol}"})
+        
+        ordem = executar_ordem_venda(symbol_info, symbol, preco_atual, instante_sinal, "TAKE PROFIT")
+        if ordem:
+            logger.info(f"VENDA POR TAKE PROFIT: {float(ordem.get('executedQty', 0))} {ativo} a ~{preco_atual} USDT")
+            posicao['em_posicao'] = False
+            posicao['preco_entrada'] = None
+            posicao['saldos'] = verificar_saldo([ativo, 'USDT'])
+            return True
+    
+    return False
+
+@metrica_etapas.cronometrar(etapa='executar_decisao')
+def executar_decisao(decisao, preco_atual, posicao, symbol_info, symbol=SYMBOL, valor_compra=None):
+    """Executa a ordem correspondente à decisão e à posição atual."""
+    if coordenador_ha is not None and not coordenador_ha.lider:
+        # Seguidor: mesma análise do líder, sem operar
+        logger.info(f"Seguidor: decisão {decisao} de {symbol} não executada")
+        return
+    instante_sinal = time.perf_counter()
+    ativo = symbol_info.get('base_asset', ativo_base(symbol))
+    
+    # Stop loss e take profit têm prioridade sobre o sinal do ciclo, a menos que a
+    # saída já esteja com a OCO / vigia de ticks
+    if posicao['em_posicao'] and posicao['preco_entrada'] is not None and not saida_vigiada(symbol):
+        if verificar_stop_take(preco_atual, posicao, symbol_info, symbol):
+            return
+    
+    if decisao == "COMPRAR" and not posicao['em_posicao']:
+        # Calcular quantidade para compra
+        quantidade = calcular_quantidade_compra(preco_atual, symbol_info, valor_compra)
+        
+        if quantidade > 0 and slippage_aceitavel(symbol, quantidade):
+            # Executar compra
+            ordem = executar_ordem_compra(quantidade, symbol_info, symbol, preco_atual, instante_sinal)
+            if ordem:
+                logger.info(f"COMPRA EXECUTADA: {quantidade} {ativo} a ~{preco_atual} USDT")
+                posicao['em_posicao'] = True
+                posicao['preco_entrada'] = preco_atual
+                if gerenciador_protecao is not None and symbol_info.get('filtros') is not None:
+                    protecao = gerenciador_protecao.proteger(symbol, ordem, preco_atual, symbol_info['filtros'], ativo)
+                    if protecao is not None:
+                        posicao['preco_entrada'] = protecao.preco_entrada
+                posicao['saldos'] = verificar_saldo([ativo, 'USDT'])  # Atualizar saldos
+                
+    elif decisao == "VENDER" and posicao['em_posicao']:
+        # Executar venda
+        ordem = executar_ordem_venda(symbol_info, symbol, preco_atual, instante_sinal)
+        if ordem:
+            logger.info(f"VENDA EXECUTADA: {float(ordem.get('executedQty', 0))} {ativo} a ~{preco_atual} USDT")
+            posicao['em_posicao'] = False
+            posicao['preco_entrada'] = None
+            posicao['saldos'] = verificar_saldo([ativo, 'USDT'])  # Atualizar saldos
+
+def logar_metricas(metricas):
+    """Loga as métricas principais da análise."""
+    logger.info("RSI: %.2f, MACD: %.2f, Signal: %.2f",
+                metricas.get('rsi', 0), metricas.get('macd', 0), metricas.get('macd_signal', 0))
+    logger.info("Stoch K: %.2f, D: %.2f, BB%%: %.2f",
+                metricas.get('stoch_k', 0), metricas.get('stoch_d', 0), metricas.get('bb_pct', 0))
+
+def logar_metricas_rest():
+    """Loga o orçamento de peso restante e a latência média das chamadas REST."""
+    if not isinstance(client, ClienteLimitado):
+        return
+    metricas = client.agendador.metricas()
+    latencias = ", ".join(f"{nome} {m['latencia_media']*1000:.0f}ms" for nome, m in metricas['endpoints'].items())
+    logger.info(f"REST: peso usado {metricas['peso_usado_minuto']}/{LIMITE_PESO_MINUTO} no minuto, "
+                f"bloqueios {metricas['bloqueios']}; latência média: {latencias}")
+
+def aguardar_proximo_ciclo(duracao=0.0):
+    """Espera o restante de CHECK_INTERVAL; na simulação só avança o relógio virtual.
+
+    Retorna False quando os dados da simulação acabaram.
+    """
+    if corretora_simulada is not None:
+        return corretora_simulada.avancar(CHECK_INTERVAL)
+    if despertar_ciclo.wait(max(0, CHECK_INTERVAL - duracao)):
+        despertar_ciclo.clear()  # este nó acabou de assumir a liderança: decide já
+    return True
+
+def logar_resumo_simulacao():
+    resumo = corretora_simulada.resumo()
+    logger.info(f"Simulação concluída: {resumo['candles']} candles, {resumo['ordens']} ordens "
+                f"({resumo['recusadas']} recusadas), {resumo['execucoes']} execuções, taxas {resumo['taxas']}")
+    logger.info(f"Patrimônio: {resumo['patrimonio_inicial']:.2f} -> {resumo['patrimonio_final']:.2f} USDT "
+                f"({resumo['retorno_percentual']:+.2f}%, buy and hold {resumo['buy_and_hold_percentual']})")
+
+def main_streaming(symbol_info, posicao, transporte=None):
+    """Executa o bot no modo streaming: decisão no fechamento do candle e stop/take a cada tick."""
+    trava_ordens = asyncio.Lock()
+    
+    def decidir_no_fechamento(motor):
+        preco_atual = motor.ultima_linha['close']
+        sincronizar_posicao(posicao, SYMBOL, symbol_info, verificar_saldo(), preco_atual)
+        
+        decisao, metricas = analisar_mercado_incremental(motor)
+        logar_metricas(metricas)
+        registrar_decisao(SYMBOL, decisao, preco_atual, metricas)
+        executar_decisao(decisao, preco_atual, posicao, symbol_info)
+        salvar_inicio_rapido({SYMBOL: motor})
+    
+    async def ao_fechar_candle(motor):
+        logger.info("Candle fechado de %s: %s", SYMBOL, motor.ultima_linha['close'])
+        # Atraso entre o fechamento do candle e o início da decisão
+        fechamento = (motor.ultimo_timestamp + interval_to_milliseconds(INTERVAL)) / 1000
+        metrica_atraso.set(max(time.time() - fechamento, 0.0), loop='streaming')
+        async with trava_ordens:
+            with metrica_etapas.cronometrar(etapa='ciclo'):
+                await asyncio.get_running_loop().run_in_executor(None, decidir_no_fechamento, motor)
+    
+    async def ao_receber_preco(preco):
+        if gerenciador_protecao is not None and USAR_VIGIA_TICKS:
+            gerenciador_protecao.ao_preco(SYMBOL, preco)
+            if saida_vigiada(SYMBOL):
+                return
+        # Checagem barata a cada tick; a ordem só é enviada se um limite for atingido
+        if not posicao['em_posicao'] or posicao['preco_entrada'] is None or trava_ordens.locked():
+            return
+        variacao_percentual = variacao_posicao(preco, posicao)
+        if -STOP_LOSS_PERCENT < variacao_percentual < TAKE_PROFIT_PERCENT:
+            return
+        async with trava_ordens:
+            await asyncio.get_running_loop().run_in_executor(None, verificar_stop_take, preco, posicao, symbol_info)
+    
+    fluxo = FluxoMercado(client, SYMBOL, INTERVAL, ao_fechar_candle, ao_receber_preco,
+                         transporte=transporte or TransporteWebSocket(STREAM_URL),
+                         limite_historico=LIMITE_INICIAL, criar_motor=criar_motor)
+    # Com o motor do snapshot, só os candles fechados desde então são buscados ao conectar
+    fluxo.motor = motores_salvos.get(SYMBOL)
+    asyncio.run(fluxo.executar())
+
+def main_portfolio(simbolos):
+    """Executa o bot para vários pares em um único processo, com alocação global de USDT."""
+    estados = [EstadoSimbolo(symbol, obter_informacoes_simbolo(symbol)) for symbol in simbolos]
+    for estado in estados:
+        estado.posicao['preco_entrada'] = preco_entrada_salvo(estado.symbol)
+    moedas_interesse = [estado.ativo for estado in estados] + ['USDT']
+    coletor = ColetorKlines(client, INTERVAL, LIMIT, MAX_THREADS_DADOS, limite_inicial=LIMITE_INICIAL)
+    for estado in estados:
+        estado.motor = motores_salvos.get(estado.symbol)
+        if estado.motor is not None:
+            coletor.iniciados.add(estado.symbol)  # já aquecido: não precisa do histórico longo
+    logger.info(f"Modo portfólio: {len(estados)} pares, exposição máxima de {MAX_EXPOSICAO_PERCENT}% do patrimônio")
+    
+    try:
+        proximo_ciclo = None
+        while True:
+            inicio_ciclo = time.time()
+            if proximo_ciclo is not None:
+                metrica_atraso.set(max(inicio_ciclo - proximo_ciclo, 0.0), loop='portfolio')
+            try:
+                logger.info("\n" + "=" * 50)
+                logger.info("Execução em: %s", datetime.now())
+                
+                # 1. Obter klines de todos os pares em paralelo e um único snapshot de saldos
+                klines = coletor.coletar(simbolos)
+                saldos = verificar_saldo(moedas_interesse)
+                
+                # 2. Atualizar indicadores e decidir por par
+                for estado in estados:
+                    dados = klines.get(estado.symbol)
+                    if not dados:
+                        estado.decisao = "AGUARDAR"
+                        continue
+                    estado.motor, linha_atual = atualizar_motor_klines(estado.motor, dados, criar_motor)
+                    estado.preco_atual = linha_atual['close']
+                    sincronizar_posicao(estado.posicao, estado.symbol, estado.symbol_info, saldos, estado.preco_atual)
+                    estado.decisao, estado.metricas = analisar_mercado_incremental(estado.motor, linha_atual,
+                                                                                   estado.symbol)
+                    registrar_decisao(estado.symbol, estado.decisao, estado.preco_atual, estado.metricas)
+                    logger.info("%s: %s a %s", estado.symbol, estado.decisao, estado.preco_atual)
+                
+                # 3. Vendas, stop loss e take profit primeiro, liberando USDT para as compras
+                houve_venda = False
+                for estado in estados:
+                    if estado.preco_atual is not None and estado.posicao['em_posicao']:
+                        executar_decisao(estado.decisao, estado.preco_atual, estado.posicao, estado.symbol_info, estado.symbol)
+                        houve_venda = houve_venda or not estado.posicao['em_posicao']
+                if houve_venda:
+                    saldos = verificar_saldo(moedas_interesse)
+                
+                # 4. Compras dentro do limite global de exposição
+                candidatos = [e for e in estados if e.decisao == "COMPRAR" and not e.posicao['em_posicao']]
+                if candidatos:
+                    saldo_usdt = saldos.get('USDT', 0)
+                    saldos_posicoes = dict(saldos)
+                    if gerenciador_protecao is not None:
+                        # Quantidades bloqueadas nas OCOs não aparecem no saldo livre
+                        for estado in estados:
+                            protecao = gerenciador_protecao.protecoes.get(estado.symbol)
+                            if protecao is not None and protecao.order_list_id is not None:
+                                saldos_posicoes[estado.ativo] = saldos.get(estado.ativo, 0) + protecao.quantidade
+                    exposicao = calcular_exposicao(estados, saldos_posicoes)
+                    alocacoes = alocar_compras(candidatos, saldo_usdt, saldo_usdt + exposicao, exposicao,
+                                               PERCENTUAL_SALDO, MAX_EXPOSICAO_PERCENT)
+                    for estado, valor_compra in alocacoes:
+                        estado.posicao['saldos'] = saldos
+                        executar_decisao("COMPRAR", estado.preco_atual, estado.posicao, estado.symbol_info,
+                                         estado.symbol, valor_compra)
+                
+                salvar_inicio_rapido({estado.symbol: estado.motor for estado in estados})
+                
+            except Exception as e:
+                logger.error(f"Erro no loop do portfólio: {e}")
+            
+            duracao = time.time() - inicio_ciclo
+            metrica_etapas.observar(duracao, etapa='ciclo')
+            logger.info("Ciclo do portfólio concluído em %.2fs (%d pares)", duracao, len(estados))
+            logar_metricas_rest()
+            proximo_ciclo = inicio_ciclo + max(CHECK_INTERVAL, duracao)
+            if not aguardar_proximo_ciclo(duracao):
+                break
+    finally:
+        coletor.fechar()
+
 def main():
     """Função principal do bot de trading."""
     logger.info(f"=" * 60)
@@ -427,6 +1332,15 @@ def main():
     logger.info(f"- Intervalo: {INTERVAL}")
     logger.info(f"- Verificação a cada: {CHECK_INTERVAL} segundos")
     
+    if LOJA_HA and not DIRETORIO_HA:
+        # Sem o diretório compartilhado o sucessor não encontraria as proteções do líder
+        logger.error("BOT_HA_LOJA definido sem BOT_HA_DIRETORIO: o modo HA exige um diretório compartilhado "
+                     "para as proteções")
+        exit(1)
+    
+    if USAR_INICIO_RAPIDO:
+        iniciar_inicio_rapido(WATCHLIST if MODO_PORTFOLIO else [SYMBOL])
+    
     # Verificar conexão com Binance
     try:
         status = client.get_system_status()
@@ -436,6 +1350,37 @@ def main():
         logger.error("Verifique suas chaves API e sua conexão com a internet.")
         return
     
+    if USAR_METRICAS:
+        try:
+            servir_metricas(PORTA_METRICAS)
+        except OSError as e:
+            logger.error(f"Erro ao abrir o endpoint de métricas na porta {PORTA_METRICAS}: {e}")
+    
+    if USAR_CACHE_SALDOS:
+        iniciar_cache_saldos(WATCHLIST if MODO_PORTFOLIO else [SYMBOL])
+    
+    if USAR_EXECUCAO_RAPIDA:
+        iniciar_executor_ordens()
+    
+    if USAR_DIARIO:
+        iniciar_diario(WATCHLIST if MODO_PORTFOLIO else [SYMBOL])
+    
+    if USAR_LIVRO_OFERTAS:
+        iniciar_livros(WATCHLIST if MODO_PORTFOLIO else [SYMBOL])
+    
+    if DIRETORIO_HA:
+        # O nó que assume a liderança inicia as proteções
+        iniciar_alta_disponibilidade(WATCHLIST if MODO_PORTFOLIO else [SYMBOL])
+    elif USAR_OCO or USAR_VIGIA_TICKS:
+        # No modo streaming os ticks chegam pelo próprio FluxoMercado
+        iniciar_protecao(WATCHLIST if MODO_PORTFOLIO else [SYMBOL], USAR_VIGIA_TICKS and not MODO_STREAMING)
+    
+    if MODO_PORTFOLIO:
+        main_portfolio(WATCHLIST)
+        if corretora_simulada is not None:
+            logar_resumo_simulacao()
+        return
+    
     # Obter informações do símbolo para formatação correta
     symbol_info = obter_informacoes_simbolo()
     
@@ -444,84 +1389,70 @@ def main():
     logger.info(f"Saldo inicial: {saldos}")
     
     # Variáveis para controle de posição
-    em_posicao = saldos.get('SOL', 0) > symbol_info['min_qty']
-    preco_entrada = None
+    posicao = {
+        'em_posicao': posicao_aberta(SYMBOL, saldos, symbol_info),
+        'preco_entrada': preco_entrada_salvo(SYMBOL),
+        'saldos': saldos
+    }
+    motor_indicadores = motores_salvos.get(SYMBOL)
     
-    if em_posicao:
+    if posicao['em_posicao']:
         logger.info(f"Iniciando com posição aberta em SOL: {saldos.get('SOL', 0)}")
     else:
         logger.info("Iniciando sem posição aberta")
     
+    if MODO_STREAMING:
+        logger.info("Modo streaming ativado (WebSocket kline + bookTicker)")
+        main_streaming(symbol_info, posicao)
+        return
+    
     # Loop principal
+    proximo_ciclo = None
     while True:
+        inicio_ciclo = time.time()
+        if proximo_ciclo is not None:
+            metrica_atraso.set(max(inicio_ciclo - proximo_ciclo, 0.0), loop='principal')
         try:
-            logger.info(f"\n{'='*50}")
-            logger.info(f"Execução em: {datetime.now()}")
+            logger.info("\n" + "=" * 50)
+            logger.info("Execução em: %s", datetime.now())
             
-            # 1. Obter dados históricos
-            df = obter_dados_historicos()
+            # 1. Obter dados históricos (arrays tipados; DataFrame só sem indicadores incrementais)
+            # Na primeira vez, histórico suficiente para aquecer os timeframes maiores
+            limite = LIMIT if motor_indicadores is not None else LIMITE_INICIAL
+            if USAR_INDICADORES_INCREMENTAIS:
+                dados = obter_candles(limite=limite)
+            else:
+                dados = obter_dados_historicos(limite=limite)
             
-            if df is not None and not df.empty:
+            if dados is not None and len(dados['timestamp']) > 0:
                 # 2. Calcular indicadores
-                df = calcular_indicadores(df)
+                if USAR_INDICADORES_INCREMENTAIS:
+                    motor_indicadores, linha_atual = atualizar_motor_indicadores(motor_indicadores, dados)
+                    preco_atual = linha_atual['close']
+                else:
+                    df = calcular_indicadores(dados)
+                    preco_atual = df['close'].iloc[-1]
                 
-                # 3. Obter preço atual
-                preco_atual = df['close'].iloc[-1]
-                logger.info(f"Preço atual de {SYMBOL}: {preco_atual}")
+                # 3. Preço atual: fechamento do candle em formação
+                logger.info("Preço atual de %s: %s", SYMBOL, preco_atual)
                 
                 # 4. Verificar saldo atual
-                saldos = verificar_saldo()
-                em_posicao = saldos.get('SOL', 0) > symbol_info['min_qty']
+                sincronizar_posicao(posicao, SYMBOL, symbol_info, verificar_saldo(), preco_atual)
                 
                 # 5. Analisar mercado e tomar decisão
-                decisao, metricas = analisar_mercado(df)
+                if USAR_INDICADORES_INCREMENTAIS:
+                    decisao, metricas = analisar_mercado_incremental(motor_indicadores, linha_atual)
+                else:
+                    decisao, metricas = analisar_mercado(df)
                 
                 # Logar métricas principais
-                logger.info(f"RSI: {metricas.get('rsi', 0):.2f}, MACD: {metricas.get('macd', 0):.2f}, Signal: {metricas.get('macd_signal', 0):.2f}")
-                logger.info(f"Stoch K: {metricas.get('stoch_k', 0):.2f}, D: {metricas.get('stoch_d', 0):.2f}, BB%: {metricas.get('bb_pct', 0):.2f}")
+                logar_metricas(metricas)
+                registrar_decisao(SYMBOL, decisao, preco_atual, metricas)
                 
                 # 6. Executar ordem com base na decisão e posição atual
-                if decisao == "COMPRAR" and not em_posicao:
-                    # Calcular quantidade para compra
-                    quantidade = calcular_quantidade_compra(preco_atual, symbol_info)
-                    
-                    if quantidade > 0:
-                        # Executar compra
-                        if executar_ordem_compra(quantidade, symbol_info):
-                            logger.info(f"COMPRA EXECUTADA: {quantidade} SOL a ~{preco_atual} USDT")
-                            em_posicao = True
-                            preco_entrada = preco_atual
-                            saldos = verificar_saldo()  # Atualizar saldos
-                            
-                elif decisao == "VENDER" and em_posicao:
-                    # Executar venda
-                    if executar_ordem_venda(symbol_info):
-                        logger.info(f"VENDA EXECUTADA: {saldos.get('SOL', 0)} SOL a ~{preco_atual} USDT")
-                        em_posicao = False
-                        preco_entrada = None
-                        saldos = verificar_saldo()  # Atualizar saldos
-                
                 # 7. Verificar stop loss ou take profit se tiver posição aberta
-                elif em_posicao and preco_entrada is not None:
-                    variacao_percentual = ((preco_atual - preco_entrada) / preco_entrada) * 100
-                    
-                    if variacao_percentual <= -STOP_LOSS_PERCENT:
-                        logger.info(f"STOP LOSS ACIONADO: Variação de {variacao_percentual:.2f}%")
-                        
-                        if executar_ordem_venda(symbol_info):
-                            logger.info(f"VENDA POR STOP LOSS: {saldos.get('SOL', 0)} SOL a ~{preco_atual} USDT")
-                            em_posicao = False
-                            preco_entrada = None
-                            saldos = verificar_saldo()
-                            
-                    elif variacao_percentual >= TAKE_PROFIT_PERCENT:
-                        logger.info(f"TAKE PROFIT ACIONADO: Variação de {variacao_percentual:.2f}%")
-                        
-                        if executar_ordem_venda(symbol_info):
-                            logger.info(f"VENDA POR TAKE PROFIT: {saldos.get('SOL', 0)} SOL a ~{preco_atual} USDT")
-                            em_posicao = False
-                            preco_entrada = None
-                            saldos = verificar_saldo()
+                executar_decisao(decisao, preco_atual, posicao, symbol_info)
+                salvar_inicio_rapido({SYMBOL: motor_indicadores})
                 
             else:
                 logger.warning("Não foi possível obter dados históricos. Tentando novamente na próxima iteração.")
@@ -529,9 +1460,17 @@ def main():
         except Exception as e:
             logger.error(f"Erro no loop principal: {e}")
         
+        metrica_etapas.observar(time.time() - inicio_ciclo, etapa='ciclo')
+        logar_metricas_rest()
+        
         # Aguardar até próxima verificação
-        logger.info(f"Aguardando {CHECK_INTERVAL/60:.1f} minutos até a próxima análise...")
-        time.sleep(CHECK_INTERVAL)
+        logger.info("Aguardando %.1f minutos até a próxima análise...", CHECK_INTERVAL / 60)
+        proximo_ciclo = time.time() + CHECK_INTERVAL
+        if not aguardar_proximo_ciclo():
+            break
+    
+    if corretora_simulada is not None:
+        logar_resumo_simulacao()
 
 if __name__ == "__main__":
     try:
@@ -539,4 +1478,10 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("Bot finalizado pelo usuário.")
     except Exception as e:
-        logger.error(f"Erro crítico: {e}")
\ No newline at end of file
+        logger.error(f"Erro crítico: {e}")
+    finally:
+        if coordenador_ha is not None:
+            coordenador_ha.parar()
+        if diario is not None:
+            # Grava o que ainda estiver na fila antes de sair
+            diario.fechar()
\ No newline at end of file
@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import threading
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+logger = logging.getLogger()
+
+# Cache das regras de negociação (get_exchange_info).
+# O payload completo é baixado uma única vez, persistido em disco com TTL e
+# indexado por símbolo. Para cada par, os filtros LOT_SIZE, PRICE_FILTER e
+# MIN_NOTIONAL/NOTIONAL viram valores Decimal exatos, de modo que o
+# arredondamento de quantidade e preço no caminho da ordem não depende de
+# conversões float -> str (que geram '1e-05' para stepSize pequenos).
+
+ARQUIVO_PADRAO = 'exchange_info.json'
+TTL_PADRAO = 6 * 3600  # segundos
+
+
+def _decimal(valor, padrao='0'):
+    return Decimal(str(valor if valor is not None else padrao))
+
+
+def _casas_decimais(passo):
+    """Número de casas decimais de um passo (Decimal('0.00100000') -> 3)."""
+    if passo == 0:
+        return 0
+    return max(0, -passo.normalize().as_tuple().exponent)
+
+
+class FiltrosSimbolo:
+    """Filtros de um par pré-processados em Decimal, com funções de quantização exatas."""
+
+    def __init__(self, info):
+        filtros = {f['filterType']: f for f in info.get('filters', [])}
+        lot_size = filtros.get('LOT_SIZE', {})
+        price_filter = filtros.get('PRICE_FILTER', {})
+        notional = filtros.get('NOTIONAL') or filtros.get('MIN_NOTIONAL') or {}
+
+        self.symbol = info['symbol']
+        self.base_asset = info.get('baseAsset')
+        self.quote_asset = info.get('quoteAsset')
+        self.step_size = _decimal(lot_size.get('stepSize'), '0.001')
+        self.min_qty = _decimal(lot_size.get('minQty'), '0.001')
+        self.max_qty = _decimal(lot_size.get('maxQty'), '0')
+        self.tick_size = _decimal(price_filter.get('tickSize'), '0.01')
+        self.min_price = _decimal(price_filter.get('minPrice'), '0')
+        self.max_price = _decimal(price_filter.get('maxPrice'), '0')
+        self.min_notional = _decimal(notional.get('minNotional'), '10')
+        self.quantidade_precision = _casas_decimais(self.step_size)
+        self.preco_precision = _casas_decimais(self.tick_size)
+        self._expoente_quantidade = Decimal(1).scaleb(-self.quantidade_precision)
+        self._expoente_preco = Decimal(1).scaleb(-self.preco_precision)
+
+    def quantizar_quantidade(self, quantidade):
+        """Arredonda a quantidade para baixo no múltiplo de stepSize (nunca excede o saldo)."""
+        quantidade = _decimal(quantidade)
+        if self.step_size:
+            quantidade = (quantidade / self.step_size).to_integral_value(ROUND_DOWN) * self.step_size
+        if self.max_qty and quantidade > self.max_qty:
+            quantidade = self.max_qty
+        return quantidade.quantize(self._expoente_quantidade, rounding=ROUND_DOWN)
+
+    def quantizar_preco(self, preco):
+        """Arredonda o preço para o tickSize mais próximo."""
+        preco = _decimal(preco)
+        if self.tick_size:
+            preco = (preco / self.tick_size).to_integral_value(ROUND_HALF_UP) * self.tick_size
+        return preco.quantize(self._expoente_preco)
+
+    def formatar_quantidade(self, quantidade):
+        return format(self.quantizar_quantidade(quantidade), 'f')
+
+    def formatar_preco(self, preco):
+        return format(self.quantizar_preco(preco), 'f')
+
+    def notional_valido(self, quantidade, preco):
+        return _decimal(quantidade) * _decimal(preco) >= self.min_notional
+
+    def como_symbol_info(self):
+        """Dicionário no formato retornado por obter_informacoes_simbolo."""
+        return {
+            'quantidade_precision': self.quantidade_precision,
+            'preco_precision': self.preco_precision,
+            'min_qty': float(self.min_qty),
+            'min_notional': float(self.min_notional),
+            'base_asset': self.base_asset,
+            'filtros': self,
+        }
+
+
+class CacheExchangeInfo:
+    """exchange_info carregado uma vez, persistido em disco e indexado por símbolo."""
+
+    def __init__(self, client, caminho=ARQUIVO_PADRAO, ttl=TTL_PADRAO):
+        self.client = client
+        self.caminho = caminho
+        self.ttl = ttl
+        self.indice = {}
+        self.filtros = {}
+        self.carregado_em = 0.0
+        self.trava = threading.Lock()
+        self.thread = None
+
+    def _indexar(self, exchange_info, carregado_em):
+        indice = {s['symbol']: s for s in exchange_info.get('symbols', [])}
+        with self.trava:
+            self.indice = indice
+            self.filtros = {}  # recalculados sob demanda
+            self.carregado_em = carregado_em
+
+    def _ler_disco(self):
+        try:
+            with open(self.caminho) as f:
+                dados = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        if time.time() - dados.get('carregado_em', 0) > self.ttl:
+            return False
+        self._indexar(dados['exchange_info'], dados['carregado_em'])
+        logger.info(f"Regras de negociação carregadas do disco ({len(self.indice)} símbolos)")
+        return True
+
+    def atualizar(self):
+        """Baixa o exchange_info completo e persiste em disco."""
+        exchange_info = self.client.get_exchange_info()
+        agora = time.time()
+        self._indexar(exchange_info, agora)
+        temporario = f"{self.caminho}.tmp"
+        with open(temporario, 'w') as f:
+            json.dump({'carregado_em': agora, 'exchange_info': exchange_info}, f)
+        os.replace(temporario, self.caminho)
+        logger.info(f"Regras de negociação atualizadas via API ({len(self.indice)} símbolos)")
+
+    def exportar(self, simbolos):
+        """Regras brutas dos pares informados e o horário da carga, para o snapshot de início rápido."""
+        with self.trava:
+            return {s: self.indice[s] for s in simbolos if s in self.indice}, self.carregado_em
+
+    def semear(self, infos, carregado_em):
+        """Inicializa o índice só com os pares do snapshot; os demais chegam na próxima atualização."""
+        self._indexar({'symbols': list(infos.values())}, carregado_em)
+
+    def carregar(self):
+        """Usa o arquivo em disco se estiver dentro do TTL; caso contrário baixa da API."""
+        if not self._ler_disco():
+            self.atualizar()
+
+    def simbolo(self, symbol):
+        """FiltrosSimbolo de um par (None se o par não existir)."""
+        filtros = self.filtros.get(symbol)
+        if filtros is None:
+            if not self.indice:
+                self.carregar()
+            info = self.indice.get(symbol)
+            if info is None:
+                return None
+            filtros = self.filtros[symbol] = FiltrosSimbolo(info)
+        return filtros
+
+    def _atualizar_periodicamente(self):
+        while True:
+            espera = max(self.carregado_em + self.ttl - time.time(), 60)
+            time.sleep(espera)
+            try:
+                self.atualizar()
+            except Exception as e:
+                logger.error(f"Erro ao atualizar regras de negociação: {e}")
+
+    def iniciar_atualizacao(self):
+        """Atualiza o cache em segundo plano sempre que o TTL expira."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._atualizar_periodicamente, name='exchange-info', daemon=True)
+            self.thread.start()
@@ -0,0 +1,210 @@
+import asyncio
+import collections
+import json
+import logging
+import threading
+import time
+
+from streaming import ConexaoEncerrada, TransporteWebSocket, URL_STREAM_BINANCE, RECONEXAO_ESPERA_INICIAL, RECONEXAO_ESPERA_MAXIMA
+
+logger = logging.getLogger()
+
+# Cache de saldos da conta mantido pelo user-data stream.
+# Os saldos ficam em um dicionário ativo -> (livre, bloqueado); eventos
+# outboundAccountPosition sobrescrevem os valores, balanceUpdate e fills
+# (executionReport ou resposta de create_order) aplicam deltas. Cada ativo
+# guarda o horário do último dado aplicado, então um fill mais antigo que o
+# último snapshot não é contado duas vezes; o mesmo fill vindo da resposta e do
+# executionReport é reconhecido pelo tradeId. A API REST (get_account) é usada
+# apenas na carga inicial, como fallback sem stream e em reconciliações.
+
+RECONCILIACAO_INTERVALO = 30 * 60  # segundos entre reconciliações com o stream ativo
+RECONCILIACAO_SEM_STREAM = 60  # segundos de validade do cache sem stream
+KEEPALIVE_LISTEN_KEY = 30 * 60  # segundos entre renovações da listenKey
+MAX_TRADES_APLICADOS = 10000  # tradeIds lembrados para não aplicar o mesmo fill duas vezes
+
+
+class CacheSaldos:
+    """Saldos da conta em memória, consultados com uma busca em dicionário por ativo."""
+
+    def __init__(self, client):
+        self.client = client
+        self.saldos = {}  # ativo -> [livre, bloqueado]
+        self.atualizado_em = {}  # ativo -> horário (ms) do último dado aplicado
+        self.ultima_reconciliacao = 0.0
+        self.stream_ativo = False
+        self.trava = threading.Lock()
+        self.trades_aplicados = collections.OrderedDict()  # (symbol, tradeId) já aplicados
+
+    def carregar(self):
+        """Recarrega todos os saldos via REST (get_account)."""
+        account = self.client.get_account()
+        agora_ms = int(time.time() * 1000)
+        with self.trava:
+            self.saldos = {
+                b['asset']: [float(b['free']), float(b['locked'])]
+                for b in account['balances']
+            }
+            horario = account.get('updateTime', agora_ms)
+            self.atualizado_em = {ativo: horario for ativo in self.saldos}
+            self.ultima_reconciliacao = time.time()
+        logger.info(f"Cache de saldos reconciliado via REST ({len(self.saldos)} ativos)")
+
+    def _validade(self):
+        return RECONCILIACAO_INTERVALO if self.stream_ativo else RECONCILIACAO_SEM_STREAM
+
+    def _reconciliar_se_necessario(self):
+        if time.time() - self.ultima_reconciliacao > self._validade():
+            try:
+                self.carregar()
+            except Exception as e:
+                logger.error(f"Erro ao reconciliar saldos via REST: {e}")
+
+    def saldo(self, ativo):
+        """Saldo livre de um ativo."""
+        self._reconciliar_se_necessario()
+        valores = self.saldos.get(ativo)
+        return valores[0] if valores else 0.0
+
+    def saldo_completo(self, ativo):
+        """Tupla (livre, bloqueado) de um ativo."""
+        self._reconciliar_se_necessario()
+        valores = self.saldos.get(ativo)
+        return (valores[0], valores[1]) if valores else (0.0, 0.0)
+
+    def desbloquear(self, ativo, quantidade):
+        """Move saldo bloqueado para livre logo após cancelar uma ordem (o próximo snapshot do stream confirma)."""
+        with self.trava:
+            valores = self.saldos.setdefault(ativo, [0.0, 0.0])
+            liberado = min(quantidade, valores[1])
+            valores[1] -= liberado
+            valores[0] += liberado
+
+    def _somar(self, ativo, delta, horario):
+        # Deltas mais antigos que o último snapshot do ativo já estão refletidos nele
+        if horario <= self.atualizado_em.get(ativo, 0):
+            return
+        valores = self.saldos.setdefault(ativo, [0.0, 0.0])
+        valores[0] += delta
+
+    def _aplicar_fill(self, ativo_base, ativo_cotacao, lado, quantidade, preco, comissao, ativo_comissao, horario):
+        sinal = 1 if lado == 'BUY' else -1
+        self._somar(ativo_base, sinal * quantidade, horario)
+        self._somar(ativo_cotacao, -sinal * quantidade * preco, horario)
+        if comissao:
+            self._somar(ativo_comissao, -comissao, horario)
+
+    def _trade_novo(self, symbol, trade_id):
+        """False se o fill já foi aplicado (pela resposta da ordem ou pelo executionReport)."""
+        if trade_id is None or trade_id == -1:
+            return True
+        chave = (symbol, trade_id)
+        if chave in self.trades_aplicados:
+            return False
+        self.trades_aplicados[chave] = True
+        if len(self.trades_aplicados) > MAX_TRADES_APLICADOS:
+            self.trades_aplicados.popitem(last=False)
+        return True
+
+    def aplicar_ordem(self, ordem, ativo_base, ativo_cotacao):
+        """Aplica os fills da resposta de create_order antes mesmo do evento do stream chegar."""
+        horario = ordem.get('transactTime', int(time.time() * 1000))
+        with self.trava:
+            for fill in ordem.get('fills', []):
+                if self._trade_novo(ordem.get('symbol'), fill.get('tradeId')):
+                    self._aplicar_fill(ativo_base, ativo_cotacao, ordem['side'], float(fill['qty']),
+                                       float(fill['price']), float(fill.get('commission', 0)),
+                                       fill.get('commissionAsset'), horario)
+
+    def aplicar_evento(self, evento, ativos_par=None):
+        """Aplica um evento do user-data stream ao cache."""
+        tipo = evento.get('e')
+        with self.trava:
+            if tipo == 'outboundAccountPosition':
+                horario = evento.get('u', evento.get('E', 0))
+                for b in evento['B']:
+                    self.saldos[b['a']] = [float(b['f']), float(b['l'])]
+                    self.atualizado_em[b['a']] = horario
+            elif tipo == 'balanceUpdate':
+                horario = evento.get('T', evento.get('E', 0))
+                self._somar(evento['a'], float(evento['d']), horario)
+                self.atualizado_em[evento['a']] = max(self.atualizado_em.get(evento['a'], 0), horario)
+            elif tipo == 'executionReport':
+                if evento.get('x') == 'TRADE' and ativos_par and evento['s'] in ativos_par and \
+                        self._trade_novo(evento['s'], evento.get('t')):
+                    ativo_base, ativo_cotacao = ativos_par[evento['s']]
+                    self._aplicar_fill(ativo_base, ativo_cotacao, evento['S'], float(evento['l']), float(evento['L']),
+                                       float(evento.get('n') or 0), evento.get('N'), evento['T'])
+
+
+class StreamDadosUsuario:
+    """Mantém o user-data stream em uma thread própria alimentando o CacheSaldos."""
+
+    def __init__(self, client, cache, ativos_par=None, transporte=None, url_base=URL_STREAM_BINANCE):
+        self.client = client
+        self.cache = cache
+        self.ativos_par = ativos_par or {}  # símbolo -> (ativo base, ativo cotação)
+        self.transporte = transporte or TransporteWebSocket(url_base)
+        self.ouvintes = []  # funções chamadas com cada evento recebido
+        self.ativo = False
+        self.listen_key = None
+        self.thread = None
+
+    def iniciar(self):
+        self.ativo = True
+        self.thread = threading.Thread(target=lambda: asyncio.run(self._executar()), name='user-data-stream', daemon=True)
+        self.thread.start()
+
+    def parar(self):
+        self.ativo = False
+
+    async def _renovar_listen_key(self):
+        loop = asyncio.get_running_loop()
+        while self.ativo:
+            await asyncio.sleep(KEEPALIVE_LISTEN_KEY)
+            try:
+                await loop.run_in_executor(None, lambda: self.client.stream_keepalive(self.listen_key))
+            except Exception as e:
+                logger.error(f"Erro ao renovar listenKey: {e}")
+
+    async def _executar(self):
+        loop = asyncio.get_running_loop()
+        espera = RECONEXAO_ESPERA_INICIAL
+        renovacao = None
+        while self.ativo:
+            try:
+                self.listen_key = await loop.run_in_executor(None, self.client.stream_get_listen_key)
+                await self.transporte.conectar([self.listen_key])
+                # Eventos perdidos enquanto desconectado são cobertos pela reconciliação via REST
+                await loop.run_in_executor(None, self.cache.carregar)
+                self.cache.stream_ativo = True
+                logger.info("User-data stream conectado")
+                espera = RECONEXAO_ESPERA_INICIAL
+                if renovacao is None:
+                    renovacao = asyncio.ensure_future(self._renovar_listen_key())
+                while self.ativo:
+                    mensagem = json.loads(await self.transporte.receber())
+                    evento = mensagem.get('data', mensagem)
+                    self.cache.aplicar_evento(evento, self.ativos_par)
+                    for ouvinte in list(self.ouvintes):
+                        try:
+                            ouvinte(evento)
+                        except Exception as e:
+                            # Um ouvinte com erro não derruba a conexão nem impede os demais
+                            logger.error(f"Erro em ouvinte do user-data stream: {e}")
+            except ConexaoEncerrada as e:
+                logger.warning(f"User-data stream encerrado: {e}")
+            except Exception as e:
+                logger.error(f"Erro no user-data stream: {e}")
+            finally:
+                self.cache.stream_ativo = False
+                try:
+                    await self.transporte.fechar()
+                except Exception:
+                    pass
+
+            if self.ativo:
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, RECONEXAO_ESPERA_MAXIMA)
+        if renovacao is not None:
+            renovacao.cancel()
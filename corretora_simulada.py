@@ -0,0 +1,752 @@
+import itertools
+import logging
+import math
+import os
+import random
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+
+from armazem_klines import ArmazemKlines
+
+logger = logging.getLogger()
+
+# Corretora simulada para paper trading e testes de carga.
+# Implementa o subconjunto do Client da Binance usado pelo bot (klines, conta,
+# ticker, exchange_info, ordens a mercado/limitadas/stop e OCO) sobre klines
+# gravados. O relógio é virtual: `avancar` fecha os candles seguintes, executa
+# as ordens em aberto que o intervalo high/low do candle atravessou e repõe o
+# livro de ofertas sintético em volta do novo preço. Ordens a mercado consomem
+# os níveis do livro (slippage e execução parcial), pagam taxa no ativo
+# recebido e geram os mesmos eventos do user-data stream (executionReport,
+# outboundAccountPosition, listStatus), entregues aos `ouvintes`.
+
+TAXA_PADRAO = 0.001  # 0,1% por execução, cobrada no ativo recebido
+SPREAD_PERCENT = 0.02  # distância entre o melhor bid e o melhor ask
+PASSO_LIVRO_PERCENT = 0.01  # distância entre níveis consecutivos do livro
+NIVEIS_LIVRO = 20
+VALOR_NIVEL = 5000.0  # quantidade de cada nível, em ativo de cotação
+CANDLES_INICIAIS = 100  # histórico disponível antes do primeiro ciclo
+MAX_KLINES_FORMATADOS = 5000  # klines mantidos já formatados por par
+ATIVOS_COTACAO = ('USDT', 'USDC', 'FDUSD', 'BUSD', 'BTC', 'ETH', 'BNB')
+
+
+class ErroCorretoraSimulada(Exception):
+    """Recusa no formato da API da Binance (HTTP 400 com código de erro)."""
+
+    def __init__(self, codigo, mensagem):
+        super().__init__(f"APIError(code={codigo}): {mensagem}")
+        self.code = codigo
+        self.message = mensagem
+        self.status_code = 400
+
+
+def carregar_mercado(caminho):
+    """Colunas de klines de um CSV no formato da Binance ou de um diretório de armazém local."""
+    if os.path.isdir(caminho):
+        colunas = ArmazemKlines(caminho).colunas()
+        return {nome: np.asarray(colunas[nome]) for nome in ('timestamp', 'open', 'high', 'low', 'close', 'volume')}
+    import pandas as pd
+    df = pd.read_csv(caminho, header=None, usecols=range(6),
+                     names=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    return {coluna: df[coluna].to_numpy() for coluna in df.columns}
+
+
+def localizar_dados(caminho, simbolos, interval):
+    """{symbol: arquivo} a partir de um único CSV/armazém ou de um diretório com um por par.
+
+    No diretório, cada par é procurado como `SYMBOL.csv` ou como armazém
+    `SYMBOL_interval` (o layout de DIRETORIO_KLINES).
+    """
+    if not os.path.isdir(caminho) or os.path.exists(os.path.join(caminho, 'meta.json')):
+        return {simbolos[0]: caminho}
+    arquivos = {}
+    for symbol in simbolos:
+        for candidato in (os.path.join(caminho, f"{symbol}_{interval}"), os.path.join(caminho, f"{symbol}.csv")):
+            if os.path.exists(candidato):
+                arquivos[symbol] = candidato
+                break
+        else:
+            raise FileNotFoundError(f"Sem klines gravados de {symbol} em {caminho}")
+    return arquivos
+
+
+def dividir_symbol(symbol):
+    for cotacao in ATIVOS_COTACAO:
+        if symbol.endswith(cotacao) and len(symbol) > len(cotacao):
+            return symbol[:-len(cotacao)], cotacao
+    return symbol[:-4], symbol[-4:]
+
+
+def _casas(passo):
+    return max(0, -int(math.floor(math.log10(passo) + 1e-9)))
+
+
+class Mercado:
+    """Klines de um par, filtros de negociação e o livro de ofertas sintético."""
+
+    def __init__(self, symbol, dados, indice, filtros=None):
+        self.symbol = symbol
+        self.base, self.cotacao = dividir_symbol(symbol)
+        self.timestamp = np.asarray(dados['timestamp'], dtype=np.int64)
+        self.high = np.asarray(dados['high'], dtype=np.float64)
+        self.low = np.asarray(dados['low'], dtype=np.float64)
+        self.close = np.asarray(dados['close'], dtype=np.float64)
+        self.open = np.asarray(dados['open'], dtype=np.float64) if 'open' in dados else \
+            np.concatenate((self.close[:1], self.close[:-1]))
+        self.volume = np.asarray(dados['volume'], dtype=np.float64) if 'volume' in dados else np.zeros(len(self.close))
+        self.intervalo_ms = int(np.median(np.diff(self.timestamp[:100]))) if len(self.timestamp) > 1 else 60_000
+        self.indice = indice  # último candle fechado; o seguinte está em formação
+
+        ordem_grandeza = math.floor(math.log10(max(float(self.close[indice]), 1e-8)))
+        filtros = filtros or {}
+        self.step_size = filtros.get('stepSize', 10.0 ** -max(0, ordem_grandeza + 2))
+        self.tick_size = filtros.get('tickSize', min(0.01, 10.0 ** (ordem_grandeza - 4)))
+        self.min_qty = filtros.get('minQty', self.step_size)
+        self.min_notional = filtros.get('minNotional', 5.0)
+        self.casas_quantidade = _casas(self.step_size)
+        self.casas_preco = _casas(self.tick_size)
+        self.asks = []
+        self.bids = []
+        self.klines_fechados = {}  # índice -> kline formatado (candles fechados não mudam)
+
+    @property
+    def em_formacao(self):
+        return self.indice + 1 < len(self.timestamp)
+
+    @property
+    def preco(self):
+        """Preço corrente: abertura do candle em formação."""
+        return float(self.open[self.indice + 1])
+
+    def formatar_preco(self, preco):
+        return f"{preco:.{self.casas_preco}f}"
+
+    def formatar_quantidade(self, quantidade):
+        return f"{quantidade:.{self.casas_quantidade}f}"
+
+    def info(self):
+        """Entrada do símbolo no formato de get_exchange_info."""
+        return {
+            'symbol': self.symbol, 'status': 'TRADING', 'baseAsset': self.base, 'quoteAsset': self.cotacao,
+            'filters': [
+                {'filterType': 'PRICE_FILTER', 'minPrice': self.formatar_preco(self.tick_size),
+                 'maxPrice': '1000000.00000000', 'tickSize': self.formatar_preco(self.tick_size)},
+                {'filterType': 'LOT_SIZE', 'minQty': self.formatar_quantidade(self.min_qty),
+                 'maxQty': '9000000.00000000', 'stepSize': self.formatar_quantidade(self.step_size)},
+                {'filterType': 'NOTIONAL', 'minNotional': f"{self.min_notional:.8f}"},
+            ],
+        }
+
+    def kline(self, i, parcial=False):
+        if not parcial and i in self.klines_fechados:
+            return self.klines_fechados[i]
+        t = int(self.timestamp[i])
+        if parcial:
+            # Candle recém-aberto: só o preço de abertura é conhecido
+            o = h = l = c = self.formatar_preco(self.open[i])
+            return [t, o, h, l, c, '0', t + self.intervalo_ms - 1, '0', 0, '0', '0', '0']
+        if len(self.klines_fechados) >= MAX_KLINES_FORMATADOS:
+            self.klines_fechados.clear()
+        o, h, l, c = (self.formatar_preco(x) for x in (self.open[i], self.high[i], self.low[i], self.close[i]))
+        kline = self.klines_fechados[i] = [t, o, h, l, c, f"{self.volume[i]:.8f}", t + self.intervalo_ms - 1,
+                                           '0', 0, '0', '0', '0']
+        return kline
+
+    def reabastecer(self, niveis, spread_percent, passo_percent, valor_nivel):
+        """Recria o livro em volta do preço corrente (chamado a cada candle)."""
+        preco = self.preco
+        metade = preco * spread_percent / 200
+        passo = max(preco * passo_percent / 100, self.tick_size)
+        quantidade = valor_nivel / preco
+        self.asks = [[math.ceil((preco + metade + k * passo) / self.tick_size) * self.tick_size, quantidade]
+                     for k in range(niveis)]
+        self.bids = [[math.floor((preco - metade - k * passo) / self.tick_size) * self.tick_size, quantidade]
+                     for k in range(niveis)]
+
+    def simular_consumo(self, lado, quantidade=None, valor=None):
+        """Fills [(preço, quantidade)] que uma ordem a mercado teria, sem alterar o livro."""
+        fills = []
+        for preco, disponivel in (self.asks if lado == 'BUY' else self.bids):
+            if quantidade is not None:
+                executar = min(disponivel, quantidade)
+                quantidade -= executar
+            else:
+                executar = min(disponivel, valor / preco)
+                executar = math.floor(executar / self.step_size) * self.step_size
+                valor -= executar * preco
+            if executar > 0:
+                fills.append((preco, executar))
+            if (quantidade is not None and quantidade <= 1e-12) or (valor is not None and valor < preco * self.step_size):
+                break
+        return fills
+
+    def consumir(self, lado, fills):
+        niveis = self.asks if lado == 'BUY' else self.bids
+        for (preco, quantidade), nivel in zip(fills, niveis):
+            nivel[1] -= quantidade
+        while niveis and niveis[0][1] <= 1e-12:
+            niveis.pop(0)
+
+
+class OrdemSimulada:
+    def __init__(self, order_id, symbol, lado, tipo, quantidade, client_order_id, horario,
+                 preco=0.0, preco_stop=0.0, lista=-1, time_in_force=None):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.lado = lado
+        self.tipo = tipo
+        self.quantidade = quantidade
+        self.client_order_id = client_order_id
+        self.horario = horario
+        self.preco = preco
+        self.preco_stop = preco_stop
+        self.lista = lista
+        self.time_in_force = time_in_force
+        self.status = 'NEW'
+        self.executada = 0.0
+        self.valor_executado = 0.0
+        self.disparada = False  # perna stop já atingida (virou limitada)
+
+    @property
+    def restante(self):
+        return self.quantidade - self.executada
+
+    @property
+    def aberta(self):
+        return self.status in ('NEW', 'PARTIALLY_FILLED')
+
+    def como_dict(self, mercado):
+        return {
+            'symbol': self.symbol, 'orderId': self.order_id, 'orderListId': self.lista,
+            'clientOrderId': self.client_order_id, 'transactTime': self.horario, 'time': self.horario,
+            'price': mercado.formatar_preco(self.preco), 'origQty': mercado.formatar_quantidade(self.quantidade),
+            'executedQty': mercado.formatar_quantidade(self.executada),
+            'cummulativeQuoteQty': f"{self.valor_executado:.8f}", 'status': self.status,
+            'timeInForce': self.time_in_force or 'GTC', 'type': self.tipo, 'side': self.lado,
+            'stopPrice': mercado.formatar_preco(self.preco_stop),
+        }
+
+
+class CorretoraSimulada:
+    """Substituto do Client da Binance sobre klines gravados, com relógio virtual."""
+
+    def __init__(self, mercados, saldos=None, taxa=TAXA_PADRAO, latencia=0.0, jitter=0.5,
+                 candles_iniciais=CANDLES_INICIAIS, niveis_livro=NIVEIS_LIVRO, spread_percent=SPREAD_PERCENT,
+                 passo_livro_percent=PASSO_LIVRO_PERCENT, valor_nivel=VALOR_NIVEL, filtros=None, semente=None):
+        """`mercados` é {symbol: colunas de klines}; `filtros` é {symbol: {stepSize, tickSize, ...}}."""
+        self.taxa = taxa
+        self.latencia = latencia  # segundos reais por chamada (0 desliga)
+        self.jitter = jitter
+        self.livro = (niveis_livro, spread_percent, passo_livro_percent, valor_nivel)
+        self.aleatorio = random.Random(semente)
+        self.trava = threading.RLock()
+        self.ouvintes = []  # funções chamadas com cada evento de conta (formato do user-data stream)
+        self.eventos = []
+        self.ordens = {}  # orderId -> OrdemSimulada
+        self.listas = {}  # orderListId -> [orderIds]
+        self.sequencia_ordens = itertools.count(1)
+        self.sequencia_listas = itertools.count(1)
+        self.saldos = {}
+        for ativo, valor in (saldos or {'USDT': 1000.0}).items():
+            self.saldos[ativo] = [float(valor), 0.0]
+        self.saldos_iniciais = {ativo: valores[0] for ativo, valores in self.saldos.items()}
+        self.estatisticas = {'ordens': 0, 'execucoes': 0, 'recusadas': 0, 'candles': 0,
+                             'volume': 0.0, 'taxas': {}}
+
+        filtros = filtros or {}
+        self.mercados = {}
+        inicio = max(int(dados['timestamp'][min(candles_iniciais, len(dados['timestamp']) - 2)])
+                     for dados in mercados.values())
+        for symbol, dados in mercados.items():
+            indice = max(int(np.searchsorted(dados['timestamp'], inicio, side='right')) - 1, 0)
+            self.mercados[symbol] = Mercado(symbol, dados, indice, filtros.get(symbol))
+        self.agora_ms = min(int(m.timestamp[m.indice + 1]) for m in self.mercados.values())
+        for mercado in self.mercados.values():
+            mercado.reabastecer(*self.livro)
+        self.saldos_iniciais.update({m.base: self.saldos.get(m.base, [0.0])[0] for m in self.mercados.values()})
+        self.precos_iniciais = {symbol: m.preco for symbol, m in self.mercados.items()}
+
+    @classmethod
+    def de_arquivos(cls, arquivos, **opcoes):
+        """Cria a corretora a partir de {symbol: caminho do CSV ou do armazém}."""
+        return cls({symbol: carregar_mercado(caminho) for symbol, caminho in arquivos.items()}, **opcoes)
+
+    # Relógio virtual
+
+    @property
+    def ativa(self):
+        """False quando algum mercado não tem mais candles para reproduzir."""
+        return all(m.em_formacao for m in self.mercados.values())
+
+    def avancar(self, segundos):
+        """Avança o relógio virtual fechando os candles do intervalo; False no fim dos dados."""
+        with self.trava:
+            destino = self.agora_ms + max(int(segundos * 1000), 1)
+            while True:
+                proximos = [m for m in self.mercados.values()
+                            if m.indice + 2 < len(m.timestamp) and int(m.timestamp[m.indice + 2]) <= destino]
+                if not proximos:
+                    break
+                for mercado in proximos:
+                    mercado.indice += 1
+                    self.agora_ms = max(self.agora_ms, int(mercado.timestamp[mercado.indice + 1]))
+                    self._executar_candle(mercado, mercado.indice)
+                    mercado.reabastecer(*self.livro)
+                    self.estatisticas['candles'] += 1
+            self.agora_ms = destino
+            continua = all(m.indice + 2 < len(m.timestamp) for m in self.mercados.values())
+        self._emitir()
+        return continua
+
+    def _executar_candle(self, mercado, i):
+        """Executa as ordens em aberto do par cujo preço o candle `i` atravessou."""
+        abertura, maxima, minima = float(mercado.open[i]), float(mercado.high[i]), float(mercado.low[i])
+        # Stops antes dos alvos: com as duas pernas da OCO no mesmo candle, assume o pior caso
+        pendentes = sorted((o for o in self.ordens.values() if o.symbol == mercado.symbol and o.aberta),
+                           key=lambda o: (o.tipo != 'STOP_LOSS_LIMIT', o.order_id))
+        for ordem in pendentes:
+            if not ordem.aberta:
+                continue  # cancelada pela outra perna da OCO neste mesmo candle
+            preco = self._preco_execucao(ordem, abertura, maxima, minima)
+            if preco is not None:
+                self._executar(mercado, ordem, [(preco, ordem.restante)])
+
+    @staticmethod
+    def _preco_execucao(ordem, abertura, maxima, minima):
+        compra = ordem.lado == 'BUY'
+        if ordem.tipo == 'STOP_LOSS_LIMIT' and not ordem.disparada:
+            if (compra and maxima < ordem.preco_stop) or (not compra and minima > ordem.preco_stop):
+                return None
+            ordem.disparada = True
+            # Disparada no stop, ou na abertura se o candle abriu além dele (gap)
+            gatilho = max(abertura, ordem.preco_stop) if compra else min(abertura, ordem.preco_stop)
+            if (compra and gatilho <= ordem.preco) or (not compra and gatilho >= ordem.preco):
+                return gatilho
+            # O preço pulou o limite: a ordem fica no livro como limitada
+        if compra and minima <= ordem.preco:
+            return min(ordem.preco, abertura)
+        if not compra and maxima >= ordem.preco:
+            return max(ordem.preco, abertura)
+        return None
+
+    # Infraestrutura
+
+    def _latencia(self):
+        if self.latencia > 0:
+            time.sleep(self.latencia * self.aleatorio.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _mercado(self, symbol):
+        mercado = self.mercados.get(symbol)
+        if mercado is None:
+            raise ErroCorretoraSimulada(-1121, "Invalid symbol.")
+        return mercado
+
+    def _recusar(self, codigo, mensagem):
+        self.estatisticas['recusadas'] += 1
+        raise ErroCorretoraSimulada(codigo, mensagem)
+
+    def _emitir(self):
+        """Entrega os eventos acumulados fora da trava (os ouvintes podem chamar a corretora)."""
+        with self.trava:
+            eventos, self.eventos = self.eventos, []
+        for evento in eventos:
+            for ouvinte in list(self.ouvintes):
+                try:
+                    ouvinte(evento)
+                except Exception as e:
+                    logger.error(f"Erro em ouvinte da corretora simulada: {e}")
+
+    def _saldo(self, ativo):
+        return self.saldos.setdefault(ativo, [0.0, 0.0])
+
+    def _bloquear(self, ativo, quantidade):
+        saldo = self._saldo(ativo)
+        if saldo[0] + 1e-12 < quantidade:
+            self._recusar(-2010, "Account has insufficient balance for requested action.")
+        saldo[0] -= quantidade
+        saldo[1] += quantidade
+
+    def _desbloquear(self, ordem, mercado):
+        if ordem.lado == 'SELL':
+            ativo, quantidade = mercado.base, ordem.restante
+        else:
+            ativo, quantidade = mercado.cotacao, ordem.restante * ordem.preco
+        saldo = self._saldo(ativo)
+        liberado = min(quantidade, saldo[1])
+        saldo[1] -= liberado
+        saldo[0] += liberado
+
+    def _evento_conta(self, *ativos):
+        self.eventos.append({
+            'e': 'outboundAccountPosition', 'E': self.agora_ms, 'u': self.agora_ms,
+            'B': [{'a': a, 'f': f"{self._saldo(a)[0]:.8f}", 'l': f"{self._saldo(a)[1]:.8f}"} for a in ativos],
+        })
+
+    def _evento_ordem(self, ordem, mercado, tipo_execucao, quantidade=0.0, preco=0.0, comissao=0.0, ativo_comissao=None,
+                      trade_id=-1):
+        self.eventos.append({
+            'e': 'executionReport', 'E': self.agora_ms, 's': ordem.symbol, 'c': ordem.client_order_id,
+            'S': ordem.lado, 'o': ordem.tipo, 'f': ordem.time_in_force or 'GTC',
+            'q': mercado.formatar_quantidade(ordem.quantidade), 'p': mercado.formatar_preco(ordem.preco),
+            'P': mercado.formatar_preco(ordem.preco_stop), 'g': ordem.lista, 'x': tipo_execucao, 'X': ordem.status,
+            'i': ordem.order_id, 'l': mercado.formatar_quantidade(quantidade), 'z': mercado.formatar_quantidade(ordem.executada),
+            'L': mercado.formatar_preco(preco), 'n': f"{comissao:.8f}", 'N': ativo_comissao, 'T': self.agora_ms,
+            'Z': f"{ordem.valor_executado:.8f}", 't': trade_id,
+        })
+
+    def _evento_lista(self, lista, symbol):
+        self.eventos.append({'e': 'listStatus', 'E': self.agora_ms, 's': symbol, 'g': lista, 'c': 'OCO',
+                             'l': 'ALL_DONE', 'L': 'ALL_DONE', 'T': self.agora_ms})
+
+    def _executar(self, mercado, ordem, fills):
+        """Aplica os fills à ordem e aos saldos; retorna a lista de fills no formato da API."""
+        resposta = []
+        for preco, quantidade in fills:
+            valor = preco * quantidade
+            if ordem.lado == 'BUY':
+                recebido, ativo_comissao, comissao = quantidade, mercado.base, quantidade * self.taxa
+                pago_de, pago = mercado.cotacao, valor
+                reservado = quantidade * ordem.preco if ordem.tipo != 'MARKET' else 0.0
+            else:
+                recebido, ativo_comissao, comissao = valor, mercado.cotacao, valor * self.taxa
+                pago_de, pago = mercado.base, quantidade
+                reservado = quantidade if ordem.tipo != 'MARKET' else 0.0
+            saldo_pago = self._saldo(pago_de)
+            if reservado:
+                # Ordem que estava no livro: paga com o saldo bloqueado e devolve a diferença de preço
+                saldo_pago[1] -= min(reservado, saldo_pago[1])
+                saldo_pago[0] += reservado - pago
+            else:
+                saldo_pago[0] -= pago
+            self._saldo(ativo_comissao)[0] += recebido - comissao
+
+            ordem.executada += quantidade
+            ordem.valor_executado += valor
+            ordem.status = 'FILLED' if ordem.restante <= 1e-12 else 'PARTIALLY_FILLED'
+            taxas = self.estatisticas['taxas']
+            taxas[ativo_comissao] = taxas.get(ativo_comissao, 0.0) + comissao
+            self.estatisticas['execucoes'] += 1
+            self.estatisticas['volume'] += valor
+            self._evento_ordem(ordem, mercado, 'TRADE', quantidade, preco, comissao, ativo_comissao,
+                               self.estatisticas['execucoes'])
+            resposta.append({'price': mercado.formatar_preco(preco), 'qty': mercado.formatar_quantidade(quantidade),
+                             'commission': f"{comissao:.8f}", 'commissionAsset': ativo_comissao,
+                             'tradeId': self.estatisticas['execucoes']})
+        self._evento_conta(mercado.base, mercado.cotacao)
+        if ordem.lista != -1 and ordem.status == 'FILLED':
+            self._encerrar_lista(ordem.lista, mercado, 'EXPIRED', exceto=ordem.order_id)
+        return resposta
+
+    def _encerrar_lista(self, lista, mercado, status, exceto=None):
+        for order_id in self.listas.get(lista, []):
+            outra = self.ordens[order_id]
+            if order_id != exceto and outra.aberta:
+                self._desbloquear(outra, mercado)
+                outra.status = status
+                self._evento_ordem(outra, mercado, status)
+        self._evento_lista(lista, mercado.symbol)
+
+    def _quantidade_valida(self, mercado, quantidade):
+        passos = Decimal(str(quantidade)) / Decimal(mercado.formatar_quantidade(mercado.step_size))
+        if quantidade < mercado.min_qty or passos != passos.to_integral_value():
+            self._recusar(-1013, "Filter failure: LOT_SIZE")
+
+    def _nova_ordem(self, mercado, lado, tipo, quantidade, client_order_id, **campos):
+        self.estatisticas['ordens'] += 1
+        ordem = OrdemSimulada(next(self.sequencia_ordens), mercado.symbol, lado, tipo, quantidade,
+                              client_order_id or f"sim-{self.estatisticas['ordens']}", self.agora_ms, **campos)
+        self.ordens[ordem.order_id] = ordem
+        return ordem
+
+    def _ordem_limitada(self, mercado, lado, tipo, quantidade, preco, client_order_id, preco_stop=0.0, lista=-1):
+        if tipo == 'LIMIT_MAKER' and ((lado == 'BUY' and preco >= mercado.asks[0][0]) or
+                                      (lado == 'SELL' and preco <= mercado.bids[0][0])):
+            self._recusar(-2010, "Order would immediately match and take.")
+        if preco * quantidade < mercado.min_notional:
+            self._recusar(-1013, "Filter failure: NOTIONAL")
+        ordem = self._nova_ordem(mercado, lado, tipo, quantidade, client_order_id, preco=preco,
+                                 preco_stop=preco_stop, lista=lista, time_in_force='GTC')
+        self._evento_ordem(ordem, mercado, 'NEW')
+        return ordem
+
+    # API do Client
+
+    def get_system_status(self):
+        self._latencia()
+        return {'status': 0, 'msg': 'normal'}
+
+    def get_server_time(self):
+        return {'serverTime': self.agora_ms}
+
+    def get_exchange_info(self):
+        self._latencia()
+        return {'timezone': 'UTC', 'serverTime': self.agora_ms, 'symbols': [m.info() for m in self.mercados.values()]}
+
+    def get_symbol_info(self, symbol):
+        self._latencia()
+        mercado = self.mercados.get(symbol)
+        return mercado.info() if mercado else None
+
+    def get_klines(self, symbol, interval=None, limit=500, startTime=None, endTime=None, **kwargs):
+        """Candles fechados até o relógio virtual mais o candle em formação (o intervalo é o dos dados)."""
+        self._latencia()
+        with self.trava:
+            mercado = self._mercado(symbol)
+            ultimo = mercado.indice + 1 if mercado.em_formacao else mercado.indice
+            fim = ultimo + 1
+            if endTime is not None:
+                fim = min(fim, int(np.searchsorted(mercado.timestamp, endTime, side='right')))
+            inicio = max(fim - limit, 0)
+            if startTime is not None:
+                inicio = int(np.searchsorted(mercado.timestamp, startTime, side='left'))
+                fim = min(fim, inicio + limit)
+            return [mercado.kline(i, parcial=i == mercado.indice + 1) for i in range(inicio, fim)]
+
+    def get_ticker(self, symbol):
+        self._latencia()
+        with self.trava:
+            mercado = self._mercado(symbol)
+            return {'symbol': symbol, 'lastPrice': mercado.formatar_preco(mercado.preco),
+                    'bidPrice': mercado.formatar_preco(mercado.bids[0][0]),
+                    'askPrice': mercado.formatar_preco(mercado.asks[0][0])}
+
+    def get_orderbook_ticker(self, symbol):
+        self._latencia()
+        with self.trava:
+            mercado = self._mercado(symbol)
+            return {'symbol': symbol,
+                    'bidPrice': mercado.formatar_preco(mercado.bids[0][0]),
+                    'bidQty': mercado.formatar_quantidade(mercado.bids[0][1]),
+                    'askPrice': mercado.formatar_preco(mercado.asks[0][0]),
+                    'askQty': mercado.formatar_quantidade(mercado.asks[0][1])}
+
+    def get_order_book(self, symbol, limit=100):
+        self._latencia()
+        with self.trava:
+            mercado = self._mercado(symbol)
+            return {
+                'lastUpdateId': self.agora_ms,
+                'bids': [[mercado.formatar_preco(p), mercado.formatar_quantidade(q)] for p, q in mercado.bids[:limit]],
+                'asks': [[mercado.formatar_preco(p), mercado.formatar_quantidade(q)] for p, q in mercado.asks[:limit]],
+            }
+
+    def get_account(self):
+        self._latencia()
+        with self.trava:
+            return {
+                'updateTime': self.agora_ms, 'canTrade': True, 'accountType': 'SPOT',
+                'balances': [{'asset': ativo, 'free': f"{livre:.8f}", 'locked': f"{bloqueado:.8f}"}
+                             for ativo, (livre, bloqueado) in self.saldos.items()],
+            }
+
+    def get_asset_balance(self, asset):
+        with self.trava:
+            livre, bloqueado = self._saldo(asset)
+            return {'asset': asset, 'free': f"{livre:.8f}", 'locked': f"{bloqueado:.8f}"}
+
+    def create_order(self, symbol, side, type, quantity=None, quoteOrderQty=None, price=None, stopPrice=None,
+                     timeInForce=None, newClientOrderId=None, newOrderRespType=None, **kwargs):
+        self._latencia()
+        try:
+            with self.trava:
+                mercado = self._mercado(symbol)
+                quantidade = float(quantity) if quantity is not None else None
+                if type == 'MARKET':
+                    resposta = self._ordem_mercado(mercado, side, quantidade, quoteOrderQty, newClientOrderId)
+                elif type in ('LIMIT', 'LIMIT_MAKER', 'STOP_LOSS_LIMIT'):
+                    self._quantidade_valida(mercado, quantidade)
+                    preco = float(price)
+                    if side == 'SELL':
+                        self._bloquear(mercado.base, quantidade)
+                    else:
+                        self._bloquear(mercado.cotacao, quantidade * preco)
+                    ordem = self._ordem_limitada(mercado, side, type, quantidade, preco, newClientOrderId,
+                                                 float(stopPrice or 0))
+                    self._evento_conta(mercado.base, mercado.cotacao)
+                    resposta = {**ordem.como_dict(mercado), 'fills': []}
+                else:
+                    self._recusar(-1116, "Invalid orderType.")
+        finally:
+            self._emitir()
+        return resposta
+
+    def _ordem_mercado(self, mercado, lado, quantidade, valor_cotacao, client_order_id):
+        if quantidade is not None:
+            self._quantidade_valida(mercado, quantidade)
+            fills = mercado.simular_consumo(lado, quantidade=quantidade)
+        else:
+            fills = mercado.simular_consumo(lado, valor=float(valor_cotacao))
+            quantidade = sum(q for _, q in fills)
+        executada = sum(q for _, q in fills)
+        valor = sum(p * q for p, q in fills)
+        if valor < mercado.min_notional:
+            self._recusar(-1013, "Filter failure: NOTIONAL")
+        if lado == 'BUY' and self._saldo(mercado.cotacao)[0] + 1e-9 < valor:
+            self._recusar(-2010, "Account has insufficient balance for requested action.")
+        if lado == 'SELL' and self._saldo(mercado.base)[0] + 1e-12 < executada:
+            self._recusar(-2010, "Account has insufficient balance for requested action.")
+
+        ordem = self._nova_ordem(mercado, lado, 'MARKET', quantidade, client_order_id)
+        self._evento_ordem(ordem, mercado, 'NEW')
+        mercado.consumir(lado, fills)
+        resposta_fills = self._executar(mercado, ordem, fills)
+        if ordem.restante > 1e-12:
+            # Livro esgotado: o restante da ordem a mercado expira, como na Binance
+            ordem.status = 'EXPIRED'
+            self._evento_ordem(ordem, mercado, 'EXPIRED')
+        return {**ordem.como_dict(mercado), 'fills': resposta_fills}
+
+    def create_oco_order(self, symbol, side, quantity, aboveType=None, abovePrice=None, belowType=None,
+                         belowStopPrice=None, belowPrice=None, listClientOrderId=None, **kwargs):
+        """OCO com uma perna LIMIT_MAKER (acima do preço) e uma STOP_LOSS_LIMIT (abaixo), para venda."""
+        self._latencia()
+        try:
+            with self.trava:
+                mercado = self._mercado(symbol)
+                if side != 'SELL' or aboveType != 'LIMIT_MAKER' or belowType != 'STOP_LOSS_LIMIT':
+                    self._recusar(-1116, "Only SELL OCO with LIMIT_MAKER above and STOP_LOSS_LIMIT below is simulated.")
+                quantidade = float(quantity)
+                self._quantidade_valida(mercado, quantidade)
+                if float(belowStopPrice) >= mercado.bids[0][0]:
+                    self._recusar(-2010, "Order would trigger immediately.")
+                self._bloquear(mercado.base, quantidade)
+                lista = next(self.sequencia_listas)
+                try:
+                    acima = self._ordem_limitada(mercado, side, 'LIMIT_MAKER', quantidade, float(abovePrice), None,
+                                                 lista=lista)
+                    abaixo = self._ordem_limitada(mercado, side, 'STOP_LOSS_LIMIT', quantidade, float(belowPrice), None,
+                                                  preco_stop=float(belowStopPrice), lista=lista)
+                except ErroCorretoraSimulada:
+                    self._saldo(mercado.base)[0] += quantidade
+                    self._saldo(mercado.base)[1] -= quantidade
+                    raise
+                self.listas[lista] = [acima.order_id, abaixo.order_id]
+                self._evento_conta(mercado.base)
+                return {
+                    'orderListId': lista, 'contingencyType': 'OCO', 'listStatusType': 'EXEC_STARTED',
+                    'listOrderStatus': 'EXECUTING', 'listClientOrderId': listClientOrderId or f"sim-lista-{lista}",
+                    'transactionTime': self.agora_ms, 'symbol': symbol,
+                    'orders': [{'symbol': symbol, 'orderId': o.order_id, 'clientOrderId': o.client_order_id}
+                               for o in (acima, abaixo)],
+                    'orderReports': [o.como_dict(mercado) for o in (acima, abaixo)],
+                }
+        finally:
+            self._emitir()
+
+    def _ordem(self, symbol, orderId=None, origClientOrderId=None):
+        for ordem in ([self.ordens.get(orderId)] if orderId is not None else self.ordens.values()):
+            if ordem is not None and ordem.symbol == symbol and \
+                    (origClientOrderId is None or ordem.client_order_id == origClientOrderId):
+                return ordem
+        self._recusar(-2013, "Order does not exist.")
+
+    def get_order(self, symbol, orderId=None, origClientOrderId=None, **kwargs):
+        self._latencia()
+        with self.trava:
+            return self._ordem(symbol, orderId, origClientOrderId).como_dict(self._mercado(symbol))
+
+    def get_open_orders(self, symbol=None, **kwargs):
+        self._latencia()
+        with self.trava:
+            return [o.como_dict(self.mercados[o.symbol]) for o in self.ordens.values()
+                    if o.aberta and (symbol is None or o.symbol == symbol)]
+
+    def cancel_order(self, symbol, orderId=None, origClientOrderId=None, **kwargs):
+        self._latencia()
+        try:
+            with self.trava:
+                mercado = self._mercado(symbol)
+                ordem = self._ordem(symbol, orderId, origClientOrderId)
+                if not ordem.aberta:
+                    self._recusar(-2011, "Unknown order sent.")
+                if ordem.lista != -1:
+                    return self._cancelar_lista(mercado, ordem.lista)
+                self._desbloquear(ordem, mercado)
+                ordem.status = 'CANCELED'
+                self._evento_ordem(ordem, mercado, 'CANCELED')
+                self._evento_conta(mercado.base, mercado.cotacao)
+                return ordem.como_dict(mercado)
+        finally:
+            self._emitir()
+
+    def _cancelar_lista(self, mercado, lista):
+        if lista not in self.listas or not any(self.ordens[i].aberta for i in self.listas[lista]):
+            self._recusar(-2011, "Unknown order list sent.")
+        self._encerrar_lista(lista, mercado, 'CANCELED')
+        self._evento_conta(mercado.base, mercado.cotacao)
+        return {'orderListId': lista, 'contingencyType': 'OCO', 'listStatusType': 'ALL_DONE',
+                'listOrderStatus': 'ALL_DONE', 'symbol': mercado.symbol,
+                'orderReports': [self.ordens[i].como_dict(mercado) for i in self.listas[lista]]}
+
+    def v3_delete_order_list(self, symbol, orderListId, **kwargs):
+        self._latencia()
+        try:
+            with self.trava:
+                return self._cancelar_lista(self._mercado(symbol), orderListId)
+        finally:
+            self._emitir()
+
+    def get_open_oco_orders(self, **kwargs):
+        self._latencia()
+        with self.trava:
+            return [{'orderListId': lista, 'contingencyType': 'OCO', 'listStatusType': 'EXEC_STARTED',
+                     'symbol': self.ordens[ids[0]].symbol,
+                     'orders': [{'symbol': self.ordens[i].symbol, 'orderId': i} for i in ids]}
+                    for lista, ids in self.listas.items() if any(self.ordens[i].aberta for i in ids)]
+
+    # Relatório
+
+    def patrimonio(self):
+        """Valor da conta no ativo de cotação, marcando as posições pelo preço corrente."""
+        with self.trava:
+            total = 0.0
+            cotacoes = {m.cotacao for m in self.mercados.values()}
+            for ativo, (livre, bloqueado) in self.saldos.items():
+                if ativo in cotacoes:
+                    total += livre + bloqueado
+            for mercado in self.mercados.values():
+                livre, bloqueado = self._saldo(mercado.base)
+                total += (livre + bloqueado) * mercado.preco
+            return total
+
+    def resumo(self):
+        cotacoes = {m.cotacao for m in self.mercados.values()}
+        inicial = sum(self.saldos_iniciais.get(ativo, 0.0) for ativo in cotacoes)
+        inicial += sum(self.saldos_iniciais.get(m.base, 0.0) * self.precos_iniciais[s] for s, m in self.mercados.items())
+        final = self.patrimonio()
+        return {
+            **self.estatisticas,
+            'patrimonio_inicial': inicial,
+            'patrimonio_final': final,
+            'retorno_percentual': (final / inicial - 1) * 100 if inicial else 0.0,
+            'buy_and_hold_percentual': {s: (m.preco / self.precos_iniciais[s] - 1) * 100
+                                        for s, m in self.mercados.items()},
+            'saldos': {ativo: valores[0] + valores[1] for ativo, valores in self.saldos.items()},
+        }
+
+
+class StreamUsuarioSimulado:
+    """Substitui o StreamDadosUsuario: repassa os eventos da corretora simulada ao cache e aos ouvintes."""
+
+    def __init__(self, corretora, cache, ativos_par=None):
+        self.corretora = corretora
+        self.cache = cache
+        self.ativos_par = ativos_par or {}
+        self.ouvintes = []
+
+    def iniciar(self):
+        self.corretora.ouvintes.append(self._receber)
+        self.cache.stream_ativo = True
+
+    def parar(self):
+        self.cache.stream_ativo = False
+        if self._receber in self.corretora.ouvintes:
+            self.corretora.ouvintes.remove(self._receber)
+
+    def _receber(self, evento):
+        self.cache.aplicar_evento(evento, self.ativos_par)
+        for ouvinte in list(self.ouvintes):
+            ouvinte(evento)
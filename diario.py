@@ -0,0 +1,413 @@
+import argparse
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger()
+
+# Diário transacional de ordens, fills, posições e decisões em SQLite (WAL).
+# As chamadas de registro só atualizam o estado em memória e enfileiram as
+# linhas; uma thread gravadora agrupa tudo em uma transação por lote, fora do
+# caminho quente. Ordens forçam a gravação imediata do lote e aguardam o commit
+# (uma falha é informada a quem registrou), para que a posição recuperada ao
+# reiniciar seja exatamente a última confirmada. Consultas de
+# PnL usam uma conexão própria (leitores não bloqueiam o gravador no WAL) e
+# índices por (symbol, horário).
+
+ARQUIVO_PADRAO = 'diario.db'
+INTERVALO_GRAVACAO = 0.5  # segundos máximos que uma linha espera na fila
+TAMANHO_LOTE = 500  # registros por transação
+TIMEOUT_CONFIRMACAO = 5.0  # segundos que o registro de uma ordem aguarda o commit
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ordens (
+    id INTEGER PRIMARY KEY,
+    horario_ms INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    lado TEXT NOT NULL,
+    order_id INTEGER,
+    client_order_id TEXT,
+    status TEXT,
+    quantidade REAL,
+    valor_cotacao REAL,
+    preco_medio REAL,
+    motivo TEXT,
+    resposta TEXT
+);
+CREATE INDEX IF NOT EXISTS ordens_symbol_horario ON ordens (symbol, horario_ms);
+
+CREATE TABLE IF NOT EXISTS fills (
+    id INTEGER PRIMARY KEY,
+    order_id INTEGER,
+    horario_ms INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    lado TEXT NOT NULL,
+    preco REAL NOT NULL,
+    quantidade REAL NOT NULL,
+    comissao REAL,
+    ativo_comissao TEXT
+);
+CREATE INDEX IF NOT EXISTS fills_symbol_horario ON fills (symbol, horario_ms);
+
+CREATE TABLE IF NOT EXISTS posicoes (
+    symbol TEXT PRIMARY KEY,
+    quantidade REAL NOT NULL,
+    preco_entrada REAL,
+    aberta_em_ms INTEGER,
+    atualizada_em_ms INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS resultados (
+    id INTEGER PRIMARY KEY,
+    fechado_em_ms INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    quantidade REAL NOT NULL,
+    preco_entrada REAL NOT NULL,
+    preco_saida REAL NOT NULL,
+    pnl REAL NOT NULL,
+    motivo TEXT
+);
+CREATE INDEX IF NOT EXISTS resultados_symbol_horario ON resultados (symbol, fechado_em_ms);
+CREATE INDEX IF NOT EXISTS resultados_horario ON resultados (fechado_em_ms);
+
+CREATE TABLE IF NOT EXISTS decisoes (
+    id INTEGER PRIMARY KEY,
+    horario_ms INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    decisao TEXT NOT NULL,
+    preco REAL,
+    metricas TEXT
+);
+CREATE INDEX IF NOT EXISTS decisoes_symbol_horario ON decisoes (symbol, horario_ms);
+"""
+
+
+def _conectar(caminho):
+    conexao = sqlite3.connect(caminho, check_same_thread=False)
+    conexao.execute('PRAGMA journal_mode=WAL')
+    conexao.execute('PRAGMA synchronous=NORMAL')  # durável a quedas do processo; fsync nos checkpoints
+    return conexao
+
+
+def resumo_execucao(ordem, ativo_base, ativo_cotacao):
+    """Quantidade líquida de ativo base, valor líquido em cotação e preço médio de uma ordem executada."""
+    fills = ordem.get('fills') or []
+    if fills:
+        quantidade = sum(float(f['qty']) for f in fills)
+        valor = sum(float(f['qty']) * float(f['price']) for f in fills)
+    else:
+        quantidade = float(ordem.get('executedQty', 0))
+        valor = float(ordem.get('cummulativeQuoteQty', 0))
+    preco = valor / quantidade if quantidade else None
+    comissao_base = sum(float(f.get('commission', 0)) for f in fills if f.get('commissionAsset') == ativo_base)
+    comissao_cotacao = sum(float(f.get('commission', 0)) for f in fills if f.get('commissionAsset') == ativo_cotacao)
+    return quantidade - comissao_base, valor - comissao_cotacao, preco
+
+
+def ordem_de_execucao(evento):
+    """Converte um executionReport de fill (ex.: perna de OCO) para o formato da resposta de create_order."""
+    return {
+        'symbol': evento['s'],
+        'side': evento['S'],
+        'orderId': evento['i'],
+        'clientOrderId': evento.get('c'),
+        'status': evento.get('X'),
+        'transactTime': evento.get('T'),
+        'fills': [{'price': evento['L'], 'qty': evento['l'], 'commission': evento.get('n') or '0',
+                   'commissionAsset': evento.get('N')}],
+    }
+
+
+def residuo(quantidade, preco, quantidade_minima=0.0, valor_minimo=0.0):
+    """True se a quantidade é poeira: não alcança a quantidade ou o valor mínimo de uma ordem do par."""
+    if quantidade <= quantidade_minima:
+        return True
+    return preco is not None and quantidade * preco < valor_minimo
+
+
+class Confirmacao:
+    """Aviso de gravação de um registro urgente: `evento` é ligado após o commit (ou a falha, em `erro`)."""
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.erro = None
+
+    def aguardar(self, timeout=TIMEOUT_CONFIRMACAO):
+        """True se o registro foi gravado dentro do prazo."""
+        if not self.evento.wait(timeout):
+            logger.error(f"Gravação no diário não confirmada em {timeout}s")
+            return False
+        return self.erro is None
+
+
+class Posicao:
+    def __init__(self, symbol, quantidade=0.0, preco_entrada=None, aberta_em_ms=None):
+        self.symbol = symbol
+        self.quantidade = quantidade
+        self.preco_entrada = preco_entrada
+        self.aberta_em_ms = aberta_em_ms
+
+
+class DiarioNegociacao:
+    """Diário em SQLite com gravação em lote por uma thread dedicada."""
+
+    def __init__(self, caminho=ARQUIVO_PADRAO, intervalo=INTERVALO_GRAVACAO, tamanho_lote=TAMANHO_LOTE):
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self.tamanho_lote = tamanho_lote
+        self.fila = queue.Queue()
+        self.trava = threading.Lock()
+        conexao = _conectar(caminho)
+        conexao.executescript(ESQUEMA)
+        self.posicoes = {
+            symbol: Posicao(symbol, quantidade, preco_entrada, aberta_em_ms)
+            for symbol, quantidade, preco_entrada, aberta_em_ms in conexao.execute(
+                'SELECT symbol, quantidade, preco_entrada, aberta_em_ms FROM posicoes WHERE quantidade > 0')
+        }
+        conexao.close()
+        self.leitura = _conectar(caminho)
+        self.ativo = True
+        self.thread = threading.Thread(target=self._gravar, name='diario', daemon=True)
+        self.thread.start()
+
+    # Gravação
+
+    def _enfileirar(self, comandos, urgente=False):
+        """Enfileira uma lista de (sql, valores) gravada sempre na mesma transação.
+
+        Registros urgentes gravam o lote na hora e retornam uma Confirmacao do commit.
+        """
+        confirmacao = Confirmacao() if urgente else None
+        self.fila.put((comandos, confirmacao))
+        return confirmacao
+
+    def _gravar(self):
+        conexao = _conectar(self.caminho)
+        while self.ativo or not self.fila.empty():
+            try:
+                lote = [self.fila.get(timeout=self.intervalo)]
+            except queue.Empty:
+                continue
+            # Junta o que chegar até o prazo do lote, ou grava já se houver uma ordem
+            prazo = time.monotonic() + self.intervalo
+            urgente = lote[0][1] is not None
+            while len(lote) < self.tamanho_lote and not urgente:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self.fila.get(timeout=restante))
+                except queue.Empty:
+                    break
+                urgente = lote[-1][1] is not None
+            while len(lote) < self.tamanho_lote:
+                try:
+                    lote.append(self.fila.get_nowait())
+                except queue.Empty:
+                    break
+            erros = {}
+            try:
+                with conexao:
+                    for comandos, _ in lote:
+                        for sql, valores in comandos:
+                            conexao.execute(sql, valores)
+            except Exception as e:
+                logger.error(f"Erro ao gravar {len(lote)} registros no diário, gravando um a um: {e}")
+                erros = self._gravar_separados(conexao, lote)
+            finally:
+                for indice, (_, confirmacao) in enumerate(lote):
+                    if confirmacao is not None:
+                        confirmacao.erro = erros.get(indice)
+                        confirmacao.evento.set()
+                    self.fila.task_done()
+        conexao.close()
+
+    def _gravar_separados(self, conexao, lote):
+        """Grava cada registro de um lote que falhou em sua própria transação; retorna {índice: erro}."""
+        erros = {}
+        for indice, (comandos, _) in enumerate(lote):
+            try:
+                with conexao:
+                    for sql, valores in comandos:
+                        conexao.execute(sql, valores)
+            except Exception as e:
+                logger.error(f"Registro descartado do diário: {e}")
+                erros[indice] = e
+        return erros
+
+    def sincronizar(self):
+        """Aguarda até que tudo o que foi registrado esteja gravado."""
+        self.fila.join()
+
+    def fechar(self):
+        self.ativo = False
+        self.thread.join()
+        self.leitura.close()
+
+    # Registro
+
+    def _comando_posicao(self, posicao, horario_ms):
+        return (
+            'INSERT INTO posicoes (symbol, quantidade, preco_entrada, aberta_em_ms, atualizada_em_ms) '
+            'VALUES (?, ?, ?, ?, ?) ON CONFLICT(symbol) DO UPDATE SET quantidade = excluded.quantidade, '
+            'preco_entrada = excluded.preco_entrada, aberta_em_ms = excluded.aberta_em_ms, '
+            'atualizada_em_ms = excluded.atualizada_em_ms',
+            (posicao.symbol, posicao.quantidade, posicao.preco_entrada, posicao.aberta_em_ms, horario_ms),
+        )
+
+    def registrar_ordem(self, ordem, symbol, ativo_base, ativo_cotacao, motivo=None, lado=None,
+                        quantidade_minima=0.0, valor_minimo=0.0):
+        """Registra a ordem e seus fills e atualiza a posição (preço médio e PnL realizado).
+
+        Após uma venda, uma sobra abaixo da quantidade ou do valor mínimo do par
+        (resto do arredondamento ao step) encerra a posição. Aguarda o commit e
+        retorna False se a ordem não foi gravada.
+        """
+        horario_ms = ordem.get('transactTime', int(time.time() * 1000))
+        lado = lado or ordem.get('side')
+        quantidade, valor, preco = resumo_execucao(ordem, ativo_base, ativo_cotacao)
+        comandos = [(
+            'INSERT INTO ordens (horario_ms, symbol, lado, order_id, client_order_id, status, quantidade, '
+            'valor_cotacao, preco_medio, motivo, resposta) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (horario_ms, symbol, lado, ordem.get('orderId'), ordem.get('clientOrderId'), ordem.get('status'),
+             quantidade, valor, preco, motivo, json.dumps(ordem)),
+        )]
+        for fill in ordem.get('fills') or []:
+            comandos.append((
+                'INSERT INTO fills (order_id, horario_ms, symbol, lado, preco, quantidade, comissao, ativo_comissao) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (ordem.get('orderId'), horario_ms, symbol, lado, float(fill['price']), float(fill['qty']),
+                 float(fill.get('commission', 0)), fill.get('commissionAsset')),
+            ))
+        if not quantidade:
+            return self._enfileirar(comandos, urgente=True).aguardar()
+
+        with self.trava:
+            posicao = self.posicoes.setdefault(symbol, Posicao(symbol))
+            if lado == 'BUY':
+                # Preço de entrada inclui a comissão (custo por unidade de fato recebida)
+                custo = (posicao.preco_entrada or 0.0) * posicao.quantidade + valor
+                if posicao.quantidade <= 0:
+                    posicao.aberta_em_ms = horario_ms
+                posicao.quantidade += quantidade
+                posicao.preco_entrada = custo / posicao.quantidade
+            else:
+                vendida = min(quantidade, posicao.quantidade)
+                if vendida > 0 and posicao.preco_entrada is not None:
+                    pnl = valor * vendida / quantidade - posicao.preco_entrada * vendida
+                    comandos.append((
+                        'INSERT INTO resultados (fechado_em_ms, symbol, quantidade, preco_entrada, preco_saida, pnl, '
+                        'motivo) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (horario_ms, symbol, vendida, posicao.preco_entrada, preco, pnl, motivo),
+                    ))
+                posicao.quantidade = max(posicao.quantidade - quantidade, 0.0)
+                if residuo(posicao.quantidade, preco, quantidade_minima, valor_minimo):
+                    posicao.quantidade = 0.0
+                    posicao.preco_entrada = None
+                    posicao.aberta_em_ms = None
+            comandos.append(self._comando_posicao(posicao, horario_ms))
+            # Ordem, fills, resultado e posição entram na mesma transação
+            confirmacao = self._enfileirar(comandos, urgente=True)
+        return confirmacao.aguardar()
+
+    def adotar_posicao(self, symbol, quantidade, preco_entrada, aberta_em_ms=None):
+        """Abre no diário uma posição aberta por outro processo (o líder anterior no modo HA).
+
+        Uma posição já aberta no diário é mantida. Aguarda o commit e retorna
+        False se a posição não foi gravada.
+        """
+        horario_ms = int(time.time() * 1000)
+        with self.trava:
+            if self.posicao(symbol) is not None:
+                return True
+            posicao = Posicao(symbol, quantidade, preco_entrada, aberta_em_ms or horario_ms)
+            self.posicoes[symbol] = posicao
+            confirmacao = self._enfileirar([self._comando_posicao(posicao, horario_ms)], urgente=True)
+        return confirmacao.aguardar()
+
+    def registrar_decisao(self, symbol, decisao, preco, metricas=None):
+        self._enfileirar([(
+            'INSERT INTO decisoes (horario_ms, symbol, decisao, preco, metricas) VALUES (?, ?, ?, ?, ?)',
+            (int(time.time() * 1000), symbol, decisao, preco, json.dumps(metricas, default=float) if metricas else None),
+        )])
+
+    # Consultas
+
+    def posicao(self, symbol):
+        """Posição aberta do par segundo o diário (None se não houver)."""
+        posicao = self.posicoes.get(symbol)
+        return posicao if posicao is not None and posicao.quantidade > 0 else None
+
+    def reconciliar(self, symbol, saldo_total, quantidade_minima=0.0, valor_minimo=0.0):
+        """Ajusta a posição do diário ao saldo real da conta após um reinício.
+
+        O valor mínimo é avaliado ao preço de entrada registrado: um saldo que
+        não forma uma ordem é poeira e encerra a posição.
+        """
+        with self.trava:
+            posicao = self.posicoes.get(symbol)
+            if posicao is None or posicao.quantidade <= 0:
+                if saldo_total > quantidade_minima:
+                    logger.warning(f"Saldo de {saldo_total} em {symbol} sem posição no diário: preço de entrada desconhecido")
+                return None
+            if residuo(saldo_total, posicao.preco_entrada, quantidade_minima, valor_minimo):
+                logger.warning(f"Posição de {symbol} no diário não existe mais na conta; encerrando sem resultado")
+                posicao.quantidade = 0.0
+                posicao.preco_entrada = None
+                posicao.aberta_em_ms = None
+            elif saldo_total < posicao.quantidade:
+                logger.warning(f"Posição de {symbol} reduzida de {posicao.quantidade} para o saldo {saldo_total}")
+                posicao.quantidade = saldo_total
+            else:
+                return posicao
+            self._enfileirar([self._comando_posicao(posicao, int(time.time() * 1000))], urgente=True)
+            return self.posicao(symbol)
+
+    def relatorio_pnl(self, symbol=None, inicio_ms=None, fim_ms=None):
+        """PnL realizado por par no período (usa os índices de resultados)."""
+        condicoes, valores = [], []
+        if symbol is not None:
+            condicoes.append('symbol = ?')
+            valores.append(symbol)
+        if inicio_ms is not None:
+            condicoes.append('fechado_em_ms >= ?')
+            valores.append(inicio_ms)
+        if fim_ms is not None:
+            condicoes.append('fechado_em_ms <= ?')
+            valores.append(fim_ms)
+        onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ''
+        linhas = self.leitura.execute(
+            f'SELECT symbol, COUNT(*), SUM(pnl), SUM(pnl > 0), MIN(pnl), MAX(pnl) FROM resultados {onde} '
+            f'GROUP BY symbol ORDER BY symbol', valores).fetchall()
+        return [
+            {'symbol': s, 'trades': n, 'pnl': pnl, 'vencedores': vencedores, 'pior': pior, 'melhor': melhor}
+            for s, n, pnl, vencedores, pior, melhor in linhas
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório de PnL realizado a partir do diário de negociação")
+    parser.add_argument('arquivo', nargs='?', default=ARQUIVO_PADRAO)
+    parser.add_argument('--symbol')
+    parser.add_argument('--dias', type=float, help="Apenas os últimos N dias")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    inicio_ms = int((time.time() - args.dias * 86400) * 1000) if args.dias else None
+    diario = DiarioNegociacao(args.arquivo)
+    try:
+        for linha in diario.relatorio_pnl(args.symbol, inicio_ms):
+            logger.info(f"{linha['symbol']}: {linha['trades']} trades, PnL {linha['pnl']:.4f}, "
+                        f"vencedores {linha['vencedores']}, pior {linha['pior']:.4f}, melhor {linha['melhor']:.4f}")
+        for posicao in diario.posicoes.values():
+            if posicao.quantidade > 0:
+                logger.info(f"Posição aberta {posicao.symbol}: {posicao.quantidade} a {posicao.preco_entrada}")
+    finally:
+        diario.fechar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+import json
+import logging
+
+import numpy as np
+
+logger = logging.getLogger()
+
+# Estratégias declaradas em configuração.
+# Uma estratégia é uma lista de regras (limiar, cruzamento, tendência) que
+# votam em compra ou venda com um peso. As regras são compiladas uma única vez
+# em duas funções geradas a partir da mesma descrição: uma escalar, que avalia
+# o candle atual a partir das linhas de indicadores (dicts) do motor
+# incremental, e uma vetorizada, que avalia o histórico inteiro de uma vez
+# sobre os arrays do backtest. Várias estratégias podem ser avaliadas lado a
+# lado sobre as mesmas linhas de indicadores.
+#
+# Exemplo de regra:
+#   {'nome': 'macd_cruza_cima', 'lado': 'compra', 'tipo': 'cruzamento',
+#    'rapido': 'macd', 'lento': 'macd_signal', 'direcao': 'cima', 'peso': 1}
+#
+# Tipos:
+#   limiar      indicador (ou lista, todos precisam passar) `op` valor, ou
+#               `op` outro indicador com 'referencia' no lugar de 'valor'
+#   cruzamento  'rapido' cruzou 'lento' para 'cima' ou para 'baixo' neste candle
+#   tendencia   'medias' ordenadas ('alta': decrescentes, 'baixa': crescentes);
+#               a partir da terceira, a média só conta quando já é positiva
+#               (durante o aquecimento ela ainda é NaN)
+# Qualquer regra aceita 'e': [regras], condições adicionais que também
+# precisam ser verdadeiras.
+
+OPERADORES = ('<', '<=', '>', '>=')
+LADOS = ('compra', 'venda')
+MIN_VOTOS_PADRAO = 3
+
+# Limiares da estratégia padrão (os mesmos de avaliar_sinais)
+LIMIARES_PADRAO = {
+    'rsi_sobrevendido': 30,
+    'rsi_sobrecomprado': 70,
+    'stoch_sobrevendido': 20,
+    'stoch_sobrecomprado': 80,
+    'bb_inferior': 0.2,
+    'bb_superior': 0.8,
+    'min_sinais': MIN_VOTOS_PADRAO,
+}
+
+
+class ErroEstrategia(ValueError):
+    """Configuração de estratégia inválida."""
+
+
+def estrategia_padrao(parametros=None):
+    """Configuração da estratégia de contagem de sinais original do bot."""
+    p = dict(LIMIARES_PADRAO, **(parametros or {}))
+    return {
+        'nome': 'contagem_sinais',
+        'min_votos': p['min_sinais'],
+        'regras': [
+            {'nome': 'rsi_sobrevendido', 'lado': 'compra', 'tipo': 'limiar',
+             'indicador': 'rsi', 'op': '<', 'valor': p['rsi_sobrevendido']},
+            {'nome': 'macd_cruza_cima', 'lado': 'compra', 'tipo': 'cruzamento',
+             'rapido': 'macd', 'lento': 'macd_signal', 'direcao': 'cima'},
+            {'nome': 'bb_inferior', 'lado': 'compra', 'tipo': 'limiar',
+             'indicador': 'bb_pct', 'op': '<', 'valor': p['bb_inferior']},
+            {'nome': 'stoch_sobrevendido', 'lado': 'compra', 'tipo': 'limiar',
+             'indicador': ['stoch_k', 'stoch_d'], 'op': '<', 'valor': p['stoch_sobrevendido']},
+            {'nome': 'stoch_cruza_cima', 'lado': 'compra', 'tipo': 'cruzamento',
+             'rapido': 'stoch_k', 'lento': 'stoch_d', 'direcao': 'cima',
+             'e': [{'tipo': 'limiar', 'indicador': 'stoch_k', 'op': '<', 'valor': 50}]},
+            {'nome': 'tendencia_alta', 'lado': 'compra', 'tipo': 'tendencia',
+             'medias': ['sma_9', 'sma_20', 'sma_50'], 'direcao': 'alta'},
+            {'nome': 'rsi_sobrecomprado', 'lado': 'venda', 'tipo': 'limiar',
+             'indicador': 'rsi', 'op': '>', 'valor': p['rsi_sobrecomprado']},
+            {'nome': 'macd_cruza_baixo', 'lado': 'venda', 'tipo': 'cruzamento',
+             'rapido': 'macd', 'lento': 'macd_signal', 'direcao': 'baixo'},
+            {'nome': 'bb_superior', 'lado': 'venda', 'tipo': 'limiar',
+             'indicador': 'bb_pct', 'op': '>', 'valor': p['bb_superior']},
+            {'nome': 'stoch_sobrecomprado', 'lado': 'venda', 'tipo': 'limiar',
+             'indicador': ['stoch_k', 'stoch_d'], 'op': '>', 'valor': p['stoch_sobrecomprado']},
+            {'nome': 'stoch_cruza_baixo', 'lado': 'venda', 'tipo': 'cruzamento',
+             'rapido': 'stoch_k', 'lento': 'stoch_d', 'direcao': 'baixo',
+             'e': [{'tipo': 'limiar', 'indicador': 'stoch_k', 'op': '>', 'valor': 50}]},
+            {'nome': 'tendencia_baixa', 'lado': 'venda', 'tipo': 'tendencia',
+             'medias': ['sma_9', 'sma_20', 'sma_50'], 'direcao': 'baixa'},
+        ],
+    }
+
+
+class _Gerador:
+    """Traduz regras em expressões Python escalares (and/or/not) ou vetorizadas (&/|/~)."""
+
+    def __init__(self, vetorizado):
+        self.vetorizado = vetorizado
+        self.indicadores = set()
+        self.anteriores = set()  # indicadores usados no candle anterior
+
+    def _e(self, termos):
+        return '(' + (' & ' if self.vetorizado else ' and ').join(termos) + ')' if len(termos) > 1 else termos[0]
+
+    def _ou(self, a, b):
+        return f"({a} | {b})" if self.vetorizado else f"({a} or {b})"
+
+    def _nao(self, a):
+        return f"~{a}" if self.vetorizado else f"(not {a})"
+
+    def _atual(self, nome):
+        self.indicadores.add(nome)
+        return f"a[{nome!r}]"
+
+    def _anterior(self, nome):
+        self.indicadores.add(nome)
+        self.anteriores.add(nome)
+        return f"p[{nome!r}]"
+
+    def expressao(self, regra):
+        tipo = regra.get('tipo')
+        gerar = getattr(self, f"_{tipo}", None) if isinstance(tipo, str) else None
+        if gerar is None:
+            raise ErroEstrategia(f"Tipo de regra desconhecido em {regra.get('nome', regra)}: {tipo}")
+        termos = [gerar(regra)] + [self.expressao(condicao) for condicao in regra.get('e', [])]
+        return self._e(termos)
+
+    def _limiar(self, regra):
+        op = regra.get('op')
+        if op not in OPERADORES:
+            raise ErroEstrategia(f"Operador inválido em {regra.get('nome', regra)}: {op}")
+        if 'referencia' in regra:
+            direita = self._atual(_nome_indicador(regra['referencia']))
+        elif 'valor' in regra:
+            direita = repr(float(regra['valor']))
+        else:
+            raise ErroEstrategia(f"Regra de limiar sem 'valor' nem 'referencia': {regra.get('nome', regra)}")
+        indicadores = regra.get('indicador')
+        indicadores = indicadores if isinstance(indicadores, list) else [indicadores]
+        return self._e([f"({self._atual(_nome_indicador(nome))} {op} {direita})" for nome in indicadores])
+
+    def _cruzamento(self, regra):
+        rapido, lento = _nome_indicador(regra.get('rapido')), _nome_indicador(regra.get('lento'))
+        direcao = regra.get('direcao')
+        if direcao not in ('cima', 'baixo'):
+            raise ErroEstrategia(f"Direção de cruzamento inválida em {regra.get('nome', regra)}: {direcao}")
+        agora, antes = ('>', '<=') if direcao == 'cima' else ('<', '>=')
+        return self._e([f"({self._atual(rapido)} {agora} {self._atual(lento)})",
+                        f"({self._anterior(rapido)} {antes} {self._anterior(lento)})"])
+
+    def _tendencia(self, regra):
+        medias = [_nome_indicador(nome) for nome in regra.get('medias', [])]
+        direcao = regra.get('direcao')
+        if len(medias) < 2 or direcao not in ('alta', 'baixa'):
+            raise ErroEstrategia(f"Regra de tendência precisa de 2+ médias e direção alta/baixa: {regra.get('nome', regra)}")
+        op = '>' if direcao == 'alta' else '<'
+        termos = [f"({self._atual(medias[0])} {op} {self._atual(medias[1])})"]
+        for anterior, media in zip(medias[1:], medias[2:]):
+            ordenada = f"({self._atual(anterior)} {op} {self._atual(media)})"
+            termos.append(self._ou(ordenada, self._nao(f"({self._atual(media)} > 0)")))
+        return self._e(termos)
+
+
+def _nome_indicador(nome):
+    if not isinstance(nome, str) or not nome:
+        raise ErroEstrategia(f"Nome de indicador inválido: {nome!r}")
+    return nome
+
+
+def _compilar(expressoes, lados, pesos, nome):
+    """Gera `avaliar(a, p) -> (resultados, votos de compra, votos de venda)`.
+
+    `a` e `p` mapeiam o nome do indicador ao valor no candle atual e no
+    anterior (escalares ou arrays, conforme o gerador das expressões).
+    """
+    linhas = ["def avaliar(a, p):"]
+    linhas += [f"    r{i} = {expressao}" for i, expressao in enumerate(expressoes)]
+    votos = {lado: " + ".join(f"r{i} * {pesos[i]!r}" for i in range(len(expressoes)) if lados[i] == lado) or "0"
+             for lado in LADOS}
+    linhas.append(f"    return ({''.join(f'r{i}, ' for i in range(len(expressoes)))}), {votos['compra']}, {votos['venda']}")
+    escopo = {'__builtins__': {}}
+    exec(compile("\n".join(linhas), f"<estrategia {nome}>", 'exec'), escopo)
+    return escopo['avaliar']
+
+
+def _anterior(valores):
+    anterior = np.empty_like(valores, dtype=np.float64)
+    anterior[0] = np.nan
+    anterior[1:] = valores[:-1]
+    return anterior
+
+
+class Estrategia:
+    """Regras compiladas de uma estratégia, avaliadas no candle atual ou em arrays completos."""
+
+    def __init__(self, config):
+        self.nome = config.get('nome', 'estrategia')
+        self.min_votos = config.get('min_votos', MIN_VOTOS_PADRAO)
+        regras = config.get('regras') or []
+        if not regras:
+            raise ErroEstrategia(f"Estratégia {self.nome} sem regras")
+        self.nomes_regras = []
+        self.pesos = []
+        self.lados = []
+        for i, regra in enumerate(regras):
+            lado = regra.get('lado')
+            if lado not in LADOS:
+                raise ErroEstrategia(f"Regra {regra.get('nome', i)} de {self.nome} sem lado compra/venda")
+            self.nomes_regras.append(regra.get('nome', f"regra_{i}"))
+            self.lados.append(lado)
+            peso = regra.get('peso', 1)
+            if not isinstance(peso, (int, float)) or isinstance(peso, bool):
+                raise ErroEstrategia(f"Peso inválido na regra {self.nomes_regras[-1]} de {self.nome}: {peso!r}")
+            self.pesos.append(peso)
+        if len(set(self.nomes_regras)) != len(self.nomes_regras):
+            raise ErroEstrategia(f"Nomes de regra repetidos em {self.nome}")
+
+        escalar, vetorizado = _Gerador(False), _Gerador(True)
+        self._avaliar_linha = _compilar([escalar.expressao(r) for r in regras], self.lados, self.pesos, self.nome)
+        self._avaliar_arrays = _compilar([vetorizado.expressao(r) for r in regras], self.lados, self.pesos, self.nome)
+        self.indicadores = sorted(escalar.indicadores)
+        self.anteriores = sorted(escalar.anteriores)
+
+    def _decidir(self, votos_compra, votos_venda):
+        if votos_compra >= self.min_votos and votos_compra > votos_venda:
+            return "COMPRAR"
+        if votos_venda >= self.min_votos and votos_venda > votos_compra:
+            return "VENDER"
+        return "AGUARDAR"
+
+    def avaliar(self, atual, anterior):
+        """Decisão para o candle atual a partir das linhas de indicadores (dict ou Series).
+
+        As métricas trazem o valor dos indicadores usados, os votos e o resultado de cada regra.
+        """
+        resultados, votos_compra, votos_venda = self._avaliar_linha(atual, anterior)
+        metricas = {'preco': atual['close']}
+        for nome in self.indicadores:
+            metricas[nome] = atual[nome]
+        metricas['sinais_compra'] = votos_compra
+        metricas['sinais_venda'] = votos_venda
+        metricas['regras'] = dict(zip(self.nomes_regras, resultados))
+        return self._decidir(votos_compra, votos_venda), metricas
+
+    def avaliar_arrays(self, ind):
+        """Votos de compra e de venda de cada candle e o resultado de cada regra, sobre arrays completos."""
+        anteriores = {nome: _anterior(ind[nome]) for nome in self.anteriores}
+        with np.errstate(invalid='ignore'):
+            resultados, votos_compra, votos_venda = self._avaliar_arrays(ind, anteriores)
+        n = len(ind[self.indicadores[0]])
+        # Um lado sem regras soma 0 (escalar): expande para um array por candle
+        votos_compra = np.broadcast_to(votos_compra, n) if np.ndim(votos_compra) == 0 else votos_compra
+        votos_venda = np.broadcast_to(votos_venda, n) if np.ndim(votos_venda) == 0 else votos_venda
+        return votos_compra, votos_venda, dict(zip(self.nomes_regras, resultados))
+
+    def decisoes(self, ind):
+        """Arrays booleanos de COMPRAR e VENDER para cada candle."""
+        compra, venda, _ = self.avaliar_arrays(ind)
+        return (compra >= self.min_votos) & (compra > venda), (venda >= self.min_votos) & (venda > compra)
+
+    def diagnostico(self, ind):
+        """Quantas vezes cada regra disparou no histórico (para ajustar limiares)."""
+        _, _, regras = self.avaliar_arrays(ind)
+        return {nome: int(np.count_nonzero(resultado)) for nome, resultado in regras.items()}
+
+
+class GrupoEstrategias:
+    """Várias estratégias avaliadas sobre as mesmas linhas de indicadores; a primeira é a principal."""
+
+    def __init__(self, estrategias):
+        if not estrategias:
+            raise ErroEstrategia("Nenhuma estratégia configurada")
+        nomes = [e.nome for e in estrategias]
+        if len(set(nomes)) != len(nomes):
+            raise ErroEstrategia(f"Nomes de estratégia repetidos: {nomes}")
+        self.estrategias = estrategias
+
+    @property
+    def principal(self):
+        return self.estrategias[0]
+
+    @property
+    def indicadores(self):
+        return sorted({nome for e in self.estrategias for nome in e.indicadores})
+
+    def avaliar(self, atual, anterior):
+        """{nome: (decisão, métricas)} de todas as estratégias, na ordem configurada."""
+        return {e.nome: e.avaliar(atual, anterior) for e in self.estrategias}
+
+
+def carregar_estrategias(caminho):
+    """Lê um JSON com uma estratégia ou uma lista delas e compila as regras."""
+    with open(caminho) as f:
+        configuracao = json.load(f)
+    if isinstance(configuracao, dict):
+        configuracao = [configuracao]
+    return GrupoEstrategias([Estrategia(config) for config in configuracao])
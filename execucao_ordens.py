@@ -0,0 +1,241 @@
+import asyncio
+import collections
+import concurrent.futures
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+from streaming import ConexaoEncerrada, RECONEXAO_ESPERA_INICIAL, RECONEXAO_ESPERA_MAXIMA
+
+logger = logging.getLogger()
+
+# Caminho rápido de execução de ordens.
+# A ordem é validada apenas contra dados já em memória (filtros do
+# CacheExchangeInfo, saldos do CacheSaldos e o preço que gerou o sinal), sem
+# nenhuma chamada REST antes do envio. O envio usa uma conexão já aberta com a
+# WebSocket API da Binance (order.place), com fallback para o create_order REST
+# quando ela não está disponível. O fill é confirmado pelo executionReport do
+# user-data stream, e cada ordem registra os instantes sinal -> validação ->
+# envio -> ack -> fill.
+
+URL_WS_API_BINANCE = 'wss://ws-api.binance.com:443/ws-api/v3'
+TIMEOUT_RESPOSTA = 5.0  # segundos aguardando o ack da WebSocket API
+TIMEOUT_CONFIRMACAO = 2.0  # segundos aguardando o fill pelo user-data stream
+ETAPAS = ('sinal', 'validado', 'enviado', 'ack', 'fill')
+CODIGO_STATUS_DESCONHECIDO = -1007  # Timeout no servidor: situação da ordem desconhecida
+
+
+class ErroOrdem(Exception):
+    """A ordem foi recusada pela validação local ou pela Binance."""
+
+
+class OrdemSemResposta(Exception):
+    """A ordem foi enviada, mas a resposta não chegou: pode ter sido executada."""
+
+
+def assinar(parametros, api_secret):
+    """Assinatura HMAC-SHA256 da WebSocket API (parâmetros em ordem alfabética)."""
+    carga = urlencode(sorted(parametros.items()))
+    return hmac.new(api_secret.encode(), carga.encode(), hashlib.sha256).hexdigest()
+
+
+class ClienteOrdensWS:
+    """Conexão persistente com a WebSocket API, mantida em uma thread com loop asyncio próprio."""
+
+    def __init__(self, api_key, api_secret, url=URL_WS_API_BINANCE):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.url = url
+        self.conexao = None
+        self.loop = None
+        self.pendentes = {}  # id da requisição -> Future
+        self.sequencia = itertools.count(1)
+        self.ativo = False
+        self.thread = None
+
+    @property
+    def conectado(self):
+        return self.conexao is not None
+
+    def iniciar(self):
+        self.ativo = True
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self._executar(),),
+                                       name='ws-api-ordens', daemon=True)
+        self.thread.start()
+
+    def parar(self):
+        self.ativo = False
+        if self.loop is not None and self.conexao is not None:
+            asyncio.run_coroutine_threadsafe(self.conexao.close(), self.loop)
+
+    async def _executar(self):
+        import websockets
+        espera = RECONEXAO_ESPERA_INICIAL
+        while self.ativo:
+            try:
+                async with websockets.connect(self.url, ping_interval=20) as conexao:
+                    self.conexao = conexao
+                    logger.info("Conexão com a WebSocket API de ordens estabelecida")
+                    espera = RECONEXAO_ESPERA_INICIAL
+                    async for mensagem in conexao:
+                        resposta = json.loads(mensagem)
+                        futuro = self.pendentes.pop(resposta.get('id'), None)
+                        if futuro is not None and not futuro.done():
+                            futuro.set_result(resposta)
+            except Exception as e:
+                logger.warning(f"Conexão com a WebSocket API de ordens perdida: {e}")
+            finally:
+                self.conexao = None
+                for futuro in self.pendentes.values():
+                    if not futuro.done():
+                        # Já enviada: o estado da ordem é desconhecido e não pode ser reenviada
+                        futuro.set_exception(ConexaoEncerrada("Conexão encerrada antes da resposta"))
+                self.pendentes.clear()
+            if self.ativo:
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, RECONEXAO_ESPERA_MAXIMA)
+
+    async def _requisitar(self, metodo, parametros):
+        identificador = next(self.sequencia)
+        futuro = self.loop.create_future()
+        self.pendentes[identificador] = futuro
+        await self.conexao.send(json.dumps({'id': identificador, 'method': metodo, 'params': parametros}))
+        return await futuro
+
+    def requisitar(self, metodo, parametros, assinado=True, timeout=TIMEOUT_RESPOSTA):
+        """Envia uma requisição pela conexão aberta e aguarda a resposta (chamada síncrona)."""
+        if not self.conectado:
+            raise ConnectionError("WebSocket API de ordens desconectada")
+        parametros = dict(parametros)
+        if assinado:
+            parametros['apiKey'] = self.api_key
+            parametros['timestamp'] = int(time.time() * 1000)
+            parametros['signature'] = assinar(parametros, self.api_secret)
+        try:
+            resposta = asyncio.run_coroutine_threadsafe(self._requisitar(metodo, parametros), self.loop).result(timeout)
+        except concurrent.futures.TimeoutError as e:
+            raise OrdemSemResposta(f"Sem resposta da WebSocket API para {metodo} em {timeout}s") from e
+        except ConexaoEncerrada as e:
+            raise OrdemSemResposta(f"Conexão perdida aguardando {metodo}: {e}") from e
+        if resposta.get('status') != 200:
+            erro = resposta.get('error', {})
+            if resposta.get('status', 0) >= 500 or erro.get('code') == CODIGO_STATUS_DESCONHECIDO:
+                # Erro do servidor ou timeout interno: a ordem pode ter sido executada
+                raise OrdemSemResposta(f"WebSocket API sem resultado para {metodo}: {resposta.get('status')} "
+                                       f"{erro.get('code')} {erro.get('msg')}")
+            raise ErroOrdem(f"WebSocket API recusou {metodo}: {erro.get('code')} {erro.get('msg')}")
+        return resposta['result']
+
+
+class OrdemEmAndamento:
+    """Instantes (perf_counter) de cada etapa de uma ordem e o evento de confirmação do fill."""
+
+    def __init__(self, client_order_id, instante_sinal=None):
+        self.client_order_id = client_order_id
+        self.instantes = {'sinal': instante_sinal if instante_sinal is not None else time.perf_counter()}
+        self.preenchida = threading.Event()
+        self.quantidade_executada = 0.0
+
+    def marcar(self, etapa):
+        self.instantes.setdefault(etapa, time.perf_counter())
+
+    def latencias_ms(self):
+        """Milissegundos entre etapas consecutivas registradas (ex.: 'sinal->validado')."""
+        etapas = [etapa for etapa in ETAPAS if etapa in self.instantes]
+        return {
+            f"{anterior}->{atual}": (self.instantes[atual] - self.instantes[anterior]) * 1000
+            for anterior, atual in zip(etapas, etapas[1:])
+        }
+
+
+class ExecutorOrdens:
+    """Valida ordens contra os caches em memória e as envia pelo canal mais rápido disponível."""
+
+    def __init__(self, client, cache_saldos=None, cliente_ws=None, timeout_confirmacao=TIMEOUT_CONFIRMACAO):
+        self.client = client
+        self.cache_saldos = cache_saldos
+        self.cliente_ws = cliente_ws
+        self.timeout_confirmacao = timeout_confirmacao
+        self.em_andamento = {}  # clientOrderId -> OrdemEmAndamento
+        self.historico_latencias = collections.deque(maxlen=1000)
+
+    def ao_evento_usuario(self, evento):
+        """Ouvinte do user-data stream: confirma o fill das ordens enviadas por este executor."""
+        if evento.get('e') != 'executionReport':
+            return
+        ordem = self.em_andamento.get(evento.get('c'))
+        if ordem is None:
+            return
+        if evento.get('x') == 'TRADE':
+            ordem.quantidade_executada = float(evento.get('z', 0))
+        if evento.get('X') == 'FILLED':
+            ordem.marcar('fill')
+            ordem.preenchida.set()
+
+    def validar(self, lado, quantidade, preco_referencia, filtros, ativo_base, ativo_cotacao):
+        """Quantiza e valida a ordem só com dados em memória; retorna a quantidade formatada."""
+        quantidade_decimal = filtros.quantizar_quantidade(quantidade)
+        if quantidade_decimal < filtros.min_qty:
+            raise ErroOrdem(f"Quantidade {quantidade_decimal} abaixo do mínimo {filtros.min_qty}")
+        if not filtros.notional_valido(quantidade_decimal, preco_referencia):
+            raise ErroOrdem(f"Valor da ordem abaixo do mínimo {filtros.min_notional}")
+        if self.cache_saldos is not None:
+            if lado == 'BUY':
+                necessario, ativo = float(quantidade_decimal) * preco_referencia, ativo_cotacao
+            else:
+                necessario, ativo = float(quantidade_decimal), ativo_base
+            disponivel = self.cache_saldos.saldo(ativo)
+            if disponivel < necessario:
+                raise ErroOrdem(f"Saldo {ativo} insuficiente: {disponivel} < {necessario}")
+        return format(quantidade_decimal, 'f')
+
+    def _enviar(self, parametros):
+        if self.cliente_ws is not None and self.cliente_ws.conectado:
+            try:
+                return self.cliente_ws.requisitar('order.place', parametros)
+            except ConnectionError as e:
+                # A requisição não chegou a ser enviada: segue pelo REST
+                logger.warning(f"WebSocket API indisponível ({e}), enviando ordem via REST")
+        return self.client.create_order(**parametros)
+
+    def executar_mercado(self, symbol, lado, quantidade, preco_referencia, filtros, ativo_base, ativo_cotacao,
+                         instante_sinal=None, client_order_id=None):
+        """Valida e envia uma ordem a mercado; retorna a resposta da Binance."""
+        ordem = OrdemEmAndamento(client_order_id or f"bot-{uuid.uuid4().hex[:24]}", instante_sinal)
+        quantidade_formatada = self.validar(lado, quantidade, preco_referencia, filtros, ativo_base, ativo_cotacao)
+        ordem.marcar('validado')
+
+        parametros = {
+            'symbol': symbol,
+            'side': lado,
+            'type': 'MARKET',
+            'quantity': quantidade_formatada,
+            'newClientOrderId': ordem.client_order_id,
+            'newOrderRespType': 'FULL',
+        }
+        # Registrada antes do envio: o executionReport pode chegar antes do ack
+        self.em_andamento[ordem.client_order_id] = ordem
+        try:
+            ordem.marcar('enviado')
+            resposta = self._enviar(parametros)
+            ordem.marcar('ack')
+
+            if self.cache_saldos is not None and self.cache_saldos.stream_ativo:
+                if not ordem.preenchida.wait(self.timeout_confirmacao):
+                    logger.warning(f"Fill da ordem {ordem.client_order_id} não confirmado pelo stream "
+                                   f"em {self.timeout_confirmacao}s (status da resposta: {resposta.get('status')})")
+        finally:
+            self.em_andamento.pop(ordem.client_order_id, None)
+
+        latencias = ordem.latencias_ms()
+        self.historico_latencias.append(latencias)
+        logger.info(f"Latência da ordem {symbol} {lado}: " +
+                    ", ".join(f"{etapa} {ms:.1f}ms" for etapa, ms in latencias.items()))
+        return resposta
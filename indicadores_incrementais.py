@@ -0,0 +1,399 @@
+import math
+from collections import deque
+
+# Motor de indicadores incremental (O(1) por candle).
+# Cada indicador guarda apenas o estado necessário para o próximo valor e
+# reproduz a mesma convenção da biblioteca `ta` (EMAs com adjust=False,
+# desvio padrão populacional nas Bollinger Bands, min_periods = janela).
+# `atualizar` consome um candle fechado; `espiar` calcula o valor que o
+# indicador teria com um candle ainda em formação, sem alterar o estado.
+
+NAN = math.nan
+
+# Número de atualizações entre recálculos completos das somas acumuladas,
+# para limitar o erro de arredondamento das somas móveis.
+RECALCULO_SOMAS = 1000
+
+
+class EMAIncremental:
+    """Média móvel exponencial (equivalente a ewm(adjust=False))."""
+
+    def __init__(self, periodo, alpha=None):
+        self.periodo = periodo
+        self.alpha = alpha if alpha is not None else 2.0 / (periodo + 1)
+        self.valor = NAN
+        self.n = 0
+
+    def _proximo(self, x):
+        if self.n == 0:
+            return x
+        return self.valor + self.alpha * (x - self.valor)
+
+    def atualizar(self, x):
+        if x != x:  # NaN no início da série é ignorado, como no pandas
+            return self.atual()
+        self.valor = self._proximo(x)
+        self.n += 1
+        return self.atual()
+
+    def espiar(self, x):
+        if x != x:
+            return self.atual()
+        return self._proximo(x) if self.n + 1 >= self.periodo else NAN
+
+    def atual(self):
+        return self.valor if self.n >= self.periodo else NAN
+
+
+class RSIIncremental:
+    """RSI com médias de Wilder (alpha = 1/janela)."""
+
+    def __init__(self, janela=14):
+        self.fechamento_anterior = None
+        self.media_alta = EMAIncremental(janela, alpha=1.0 / janela)
+        self.media_baixa = EMAIncremental(janela, alpha=1.0 / janela)
+        self.valor = NAN
+
+    @staticmethod
+    def _rsi(alta, baixa):
+        if baixa != baixa or alta != alta:
+            return NAN
+        if baixa == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + alta / baixa)
+
+    def _diferenca(self, fechamento):
+        # Como no `ta`, a primeira variação (indefinida) entra como zero
+        if self.fechamento_anterior is None:
+            return 0.0
+        return fechamento - self.fechamento_anterior
+
+    def atualizar(self, fechamento):
+        diff = self._diferenca(fechamento)
+        alta = self.media_alta.atualizar(diff if diff > 0 else 0.0)
+        baixa = self.media_baixa.atualizar(-diff if diff < 0 else 0.0)
+        self.valor = self._rsi(alta, baixa)
+        self.fechamento_anterior = fechamento
+        return self.valor
+
+    def espiar(self, fechamento):
+        diff = self._diferenca(fechamento)
+        alta = self.media_alta.espiar(diff if diff > 0 else 0.0)
+        baixa = self.media_baixa.espiar(-diff if diff < 0 else 0.0)
+        return self._rsi(alta, baixa)
+
+
+class MACDIncremental:
+    """MACD (12, 26, 9) com linha de sinal sobre os valores válidos do MACD."""
+
+    def __init__(self, rapida=12, lenta=26, sinal=9):
+        self.ema_rapida = EMAIncremental(rapida)
+        self.ema_lenta = EMAIncremental(lenta)
+        self.ema_sinal = EMAIncremental(sinal)
+        self.valores = (NAN, NAN, NAN)
+
+    def atualizar(self, fechamento):
+        macd = self.ema_rapida.atualizar(fechamento) - self.ema_lenta.atualizar(fechamento)
+        sinal = self.ema_sinal.atualizar(macd)
+        self.valores = (macd, sinal, macd - sinal)
+        return self.valores
+
+    def espiar(self, fechamento):
+        macd = self.ema_rapida.espiar(fechamento) - self.ema_lenta.espiar(fechamento)
+        sinal = self.ema_sinal.espiar(macd)
+        return macd, sinal, macd - sinal
+
+
+class JanelaMovel:
+    """Buffer circular com soma e soma de quadrados para média e desvio padrão."""
+
+    def __init__(self, janela):
+        self.janela = janela
+        self.buffer = [0.0] * janela
+        self.indice = 0
+        self.n = 0
+        self.referencia = None  # deslocamento para reduzir cancelamento numérico
+        self.soma = 0.0
+        self.soma_quadrados = 0.0
+        self.atualizacoes = 0
+
+    def _recalcular(self):
+        valores = self.buffer if self.n >= self.janela else self.buffer[:self.n]
+        self.referencia = math.fsum(valores) / len(valores)
+        deslocados = [v - self.referencia for v in valores]
+        self.soma = math.fsum(deslocados)
+        self.soma_quadrados = math.fsum(d * d for d in deslocados)
+
+    def atualizar(self, x):
+        if self.referencia is None:
+            self.referencia = x
+        d = x - self.referencia
+        if self.n >= self.janela:
+            antigo = self.buffer[self.indice] - self.referencia
+            self.soma -= antigo
+            self.soma_quadrados -= antigo * antigo
+        else:
+            self.n += 1
+        self.buffer[self.indice] = x
+        self.indice = (self.indice + 1) % self.janela
+        self.soma += d
+        self.soma_quadrados += d * d
+        self.atualizacoes += 1
+        if self.atualizacoes % RECALCULO_SOMAS == 0:
+            self._recalcular()
+
+    def _estatisticas(self, soma, soma_quadrados):
+        media = soma / self.janela
+        variancia = soma_quadrados / self.janela - media * media
+        return self.referencia + media, math.sqrt(variancia) if variancia > 0 else 0.0
+
+    def estatisticas(self):
+        """Retorna (média, desvio padrão populacional) da janela atual."""
+        if self.n < self.janela:
+            return NAN, NAN
+        return self._estatisticas(self.soma, self.soma_quadrados)
+
+    def espiar(self, x):
+        """Estatísticas que a janela teria após receber `x`."""
+        if self.n + 1 < self.janela:
+            return NAN, NAN
+        referencia = self.referencia if self.referencia is not None else x
+        d = x - referencia
+        soma = self.soma + d
+        soma_quadrados = self.soma_quadrados + d * d
+        if self.n >= self.janela:
+            antigo = self.buffer[self.indice] - referencia
+            soma -= antigo
+            soma_quadrados -= antigo * antigo
+        media = soma / self.janela
+        variancia = soma_quadrados / self.janela - media * media
+        return referencia + media, math.sqrt(variancia) if variancia > 0 else 0.0
+
+
+class SMAIncremental:
+    """Média móvel simples sobre um buffer circular."""
+
+    def __init__(self, janela):
+        self.janela_movel = JanelaMovel(janela)
+
+    def atualizar(self, x):
+        self.janela_movel.atualizar(x)
+        return self.janela_movel.estatisticas()[0]
+
+    def espiar(self, x):
+        return self.janela_movel.espiar(x)[0]
+
+
+class BollingerIncremental:
+    """Bollinger Bands (média, bandas e %B) sobre um buffer circular."""
+
+    def __init__(self, janela=20, desvios=2):
+        self.janela_movel = JanelaMovel(janela)
+        self.desvios = desvios
+        self.valores = (NAN, NAN, NAN, NAN)
+
+    def _bandas(self, fechamento, media, desvio):
+        alta = media + self.desvios * desvio
+        baixa = media - self.desvios * desvio
+        pct = (fechamento - baixa) / (alta - baixa) if alta != baixa else NAN
+        return alta, baixa, media, pct
+
+    def atualizar(self, fechamento):
+        self.janela_movel.atualizar(fechamento)
+        self.valores = self._bandas(fechamento, *self.janela_movel.estatisticas())
+        return self.valores
+
+    def espiar(self, fechamento):
+        return self._bandas(fechamento, *self.janela_movel.espiar(fechamento))
+
+
+class EstocasticoIncremental:
+    """Oscilador estocástico com deques monotônicos para máxima/mínima da janela."""
+
+    def __init__(self, janela=14, suavizacao=3):
+        self.janela = janela
+        self.maximas = deque()  # (índice, máxima) em ordem decrescente
+        self.minimas = deque()  # (índice, mínima) em ordem crescente
+        self.ultimos_k = deque(maxlen=suavizacao)
+        self.suavizacao = suavizacao
+        self.indice = 0
+        self.valores = (NAN, NAN)
+
+    @staticmethod
+    def _k(fechamento, minima, maxima):
+        amplitude = maxima - minima
+        if amplitude == 0:
+            return NAN
+        return 100.0 * (fechamento - minima) / amplitude
+
+    def _d(self, ks):
+        if len(ks) < self.suavizacao or any(k != k for k in ks):
+            return NAN
+        return sum(ks) / self.suavizacao
+
+    def atualizar(self, maxima, minima, fechamento):
+        i = self.indice
+        while self.maximas and self.maximas[-1][1] <= maxima:
+            self.maximas.pop()
+        self.maximas.append((i, maxima))
+        while self.minimas and self.minimas[-1][1] >= minima:
+            self.minimas.pop()
+        self.minimas.append((i, minima))
+        limite = i - self.janela
+        if self.maximas[0][0] <= limite:
+            self.maximas.popleft()
+        if self.minimas[0][0] <= limite:
+            self.minimas.popleft()
+        self.indice += 1
+
+        k = NAN
+        if self.indice >= self.janela:
+            k = self._k(fechamento, self.minimas[0][1], self.maximas[0][1])
+        self.ultimos_k.append(k)
+        self.valores = (k, self._d(self.ultimos_k))
+        return self.valores
+
+    @staticmethod
+    def _extremo_restante(extremos, limite, padrao):
+        for j, valor in (extremos[0], extremos[1]) if len(extremos) > 1 else extremos:
+            if j > limite:
+                return valor
+        return padrao
+
+    def espiar(self, maxima, minima, fechamento):
+        if self.indice + 1 < self.janela:
+            return NAN, NAN
+        limite = self.indice - self.janela
+        # O primeiro elemento do deque sai da janela; o segundo é o extremo do restante
+        maior = max(self._extremo_restante(self.maximas, limite, maxima), maxima)
+        menor = min(self._extremo_restante(self.minimas, limite, minima), minima)
+        k = self._k(fechamento, menor, maior)
+        ks = list(self.ultimos_k)[1 - self.suavizacao:] + [k] if self.suavizacao > 1 else [k]
+        return k, self._d(ks)
+
+
+class FluxoTakerIncremental:
+    """Fração do volume comprada por agressores (taker buy / volume) no candle e na janela."""
+
+    def __init__(self, janela=14):
+        self.volume = SMAIncremental(janela)
+        self.volume_compra = SMAIncremental(janela)
+        self.valores = (NAN, NAN)
+
+    @staticmethod
+    def _razao(compra, total):
+        return compra / total if total > 0 else NAN
+
+    def atualizar(self, volume, volume_compra):
+        if volume != volume:  # candle sem volume informado
+            return NAN, NAN
+        media = self._razao(self.volume_compra.atualizar(volume_compra), self.volume.atualizar(volume))
+        self.valores = (self._razao(volume_compra, volume), media)
+        return self.valores
+
+    def espiar(self, volume, volume_compra):
+        if volume != volume:
+            return NAN, NAN
+        return self._razao(volume_compra, volume), self._razao(self.volume_compra.espiar(volume_compra),
+                                                               self.volume.espiar(volume))
+
+
+class MotorIndicadores:
+    """Mantém todos os indicadores do bot atualizados candle a candle."""
+
+    def __init__(self):
+        self.rsi = RSIIncremental(14)
+        self.macd = MACDIncremental(12, 26, 9)
+        self.sma_9 = SMAIncremental(9)
+        self.sma_20 = SMAIncremental(20)
+        self.sma_50 = SMAIncremental(50)
+        self.ema_9 = EMAIncremental(9)
+        self.bollinger = BollingerIncremental(20, 2)
+        self.estocastico = EstocasticoIncremental(14, 3)
+        self.fluxo_taker = FluxoTakerIncremental(14)
+        self.total_candles = 0
+        self.ultimo_timestamp = None
+        self.ultima_linha = None
+        self.penultima_linha = None
+
+    def __len__(self):
+        return self.total_candles
+
+    @staticmethod
+    def _linha(fechamento, rsi, macd, sma_9, sma_20, sma_50, ema_9, bollinger, estocastico, fluxo_taker):
+        return {
+            'close': fechamento,
+            'rsi': rsi,
+            'macd': macd[0],
+            'macd_signal': macd[1],
+            'macd_diff': macd[2],
+            'sma_9': sma_9,
+            'sma_20': sma_20,
+            'sma_50': sma_50,
+            'ema_9': ema_9,
+            'bb_high': bollinger[0],
+            'bb_low': bollinger[1],
+            'bb_mid': bollinger[2],
+            'bb_pct': bollinger[3],
+            'stoch_k': estocastico[0],
+            'stoch_d': estocastico[1],
+            'taker_compra': fluxo_taker[0],
+            'taker_compra_14': fluxo_taker[1],
+        }
+
+    def atualizar(self, timestamp, maxima, minima, fechamento, volume=NAN, volume_compra=NAN):
+        """Consome um candle fechado e retorna a linha de indicadores resultante.
+
+        `volume` e `volume_compra` (taker_buy_base_asset_volume) são opcionais; sem
+        eles, as colunas de fluxo de agressão ficam NaN.
+        """
+        linha = self._linha(
+            fechamento,
+            self.rsi.atualizar(fechamento),
+            self.macd.atualizar(fechamento),
+            self.sma_9.atualizar(fechamento),
+            self.sma_20.atualizar(fechamento),
+            self.sma_50.atualizar(fechamento),
+            self.ema_9.atualizar(fechamento),
+            self.bollinger.atualizar(fechamento),
+            self.estocastico.atualizar(maxima, minima, fechamento),
+            self.fluxo_taker.atualizar(volume, volume_compra),
+        )
+        self.total_candles += 1
+        self.ultimo_timestamp = timestamp
+        self.penultima_linha = self.ultima_linha
+        self.ultima_linha = linha
+        return linha
+
+    def espiar(self, maxima, minima, fechamento, volume=NAN, volume_compra=NAN):
+        """Calcula a linha de indicadores para um candle em formação sem alterar o estado."""
+        return self._linha(
+            fechamento,
+            self.rsi.espiar(fechamento),
+            self.macd.espiar(fechamento),
+            self.sma_9.espiar(fechamento),
+            self.sma_20.espiar(fechamento),
+            self.sma_50.espiar(fechamento),
+            self.ema_9.espiar(fechamento),
+            self.bollinger.espiar(fechamento),
+            self.estocastico.espiar(maxima, minima, fechamento),
+            self.fluxo_taker.espiar(volume, volume_compra),
+        )
+
+    def semear(self, df):
+        """Inicializa o motor a partir de um histórico de candles fechados (DataFrame ou dict de arrays)."""
+        timestamps = df['timestamp'].tolist()
+        maximas = df['high'].tolist()
+        minimas = df['low'].tolist()
+        fechamentos = df['close'].tolist()
+        volumes, volumes_compra = colunas_volume(df)
+        for t, h, l, c, v, vc in zip(timestamps, maximas, minimas, fechamentos, volumes, volumes_compra):
+            self.atualizar(t, h, l, c, v, vc)
+        return self
+
+
+def colunas_volume(df):
+    """Volume e volume comprado por agressores de um DataFrame ou dict de arrays de klines (NaN se ausentes)."""
+    if 'volume' not in df or 'taker_buy_base_asset_volume' not in df:
+        return [NAN] * len(df['timestamp']), [NAN] * len(df['timestamp'])
+    return df['volume'].tolist(), df['taker_buy_base_asset_volume'].tolist()
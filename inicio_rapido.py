@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import time
+from collections import deque
+
+import indicadores_incrementais
+import multiplos_tempos
+
+logger = logging.getLogger()
+
+# Início rápido: a cada ciclo, o estado dos motores de indicadores e as regras
+# de negociação dos pares são gravados em um snapshot JSON pequeno. Ao
+# reiniciar (ex.: após uma queda), o bot retoma desse snapshot: só os candles
+# fechados desde então são buscados e aplicados ao motor, sem semear o
+# histórico nem baixar/ler o exchange_info completo.
+# O estado é serializado atributo a atributo, apenas para as classes de
+# indicadores conhecidas; um snapshot de outra versão do código (atributos
+# diferentes) ou de outra configuração é ignorado e o bot parte do zero.
+
+VERSAO = 1
+
+CLASSES_ESTADO = {
+    classe.__name__: classe for classe in (
+        indicadores_incrementais.EMAIncremental,
+        indicadores_incrementais.RSIIncremental,
+        indicadores_incrementais.MACDIncremental,
+        indicadores_incrementais.JanelaMovel,
+        indicadores_incrementais.SMAIncremental,
+        indicadores_incrementais.BollingerIncremental,
+        indicadores_incrementais.EstocasticoIncremental,
+        indicadores_incrementais.FluxoTakerIncremental,
+        indicadores_incrementais.MotorIndicadores,
+        multiplos_tempos.AgregadorCandles,
+        multiplos_tempos.MotorMultiTempo,
+    )
+}
+
+
+def para_estado(valor):
+    """Converte um motor (e tudo o que ele referencia) em tipos JSON."""
+    if isinstance(valor, (int, float, str, bool)) or valor is None:
+        return valor
+    if isinstance(valor, list):
+        return [para_estado(v) for v in valor]
+    if isinstance(valor, tuple):
+        return {'__tipo__': 'tuple', 'itens': [para_estado(v) for v in valor]}
+    if isinstance(valor, deque):
+        return {'__tipo__': 'deque', 'itens': [para_estado(v) for v in valor], 'maxlen': valor.maxlen}
+    if isinstance(valor, dict):
+        return {chave: para_estado(v) for chave, v in valor.items()}
+    nome = type(valor).__name__
+    if CLASSES_ESTADO.get(nome) is not type(valor):
+        raise TypeError(f"Tipo sem estado serializável: {nome}")
+    return {'__tipo__': nome, **{atributo: para_estado(v) for atributo, v in vars(valor).items()}}
+
+
+def de_estado(estado):
+    """Reconstrói os objetos gravados por para_estado."""
+    if isinstance(estado, list):
+        return [de_estado(v) for v in estado]
+    if not isinstance(estado, dict):
+        return estado
+    tipo = estado.get('__tipo__')
+    if tipo is None:
+        return {chave: de_estado(v) for chave, v in estado.items()}
+    if tipo == 'tuple':
+        return tuple(de_estado(v) for v in estado['itens'])
+    if tipo == 'deque':
+        return deque((de_estado(v) for v in estado['itens']), maxlen=estado['maxlen'])
+    classe = CLASSES_ESTADO.get(tipo)
+    if classe is None:
+        raise ValueError(f"Tipo desconhecido no snapshot: {tipo}")
+    objeto = classe.__new__(classe)
+    vars(objeto).update({atributo: de_estado(v) for atributo, v in estado.items() if atributo != '__tipo__'})
+    return objeto
+
+
+def forma(estado, formas=None):
+    """Classes e nomes de atributos presentes em um estado, para detectar snapshots de outra versão."""
+    formas = set() if formas is None else formas
+    if isinstance(estado, list):
+        for v in estado:
+            forma(v, formas)
+    elif isinstance(estado, dict):
+        tipo = estado.get('__tipo__')
+        if tipo in CLASSES_ESTADO:
+            formas.add(f"{tipo}:{','.join(sorted(estado))}")
+        for v in estado.values():
+            forma(v, formas)
+    return formas
+
+
+class SnapshotInicio:
+    """Snapshot em disco dos motores de indicadores e das regras dos pares negociados."""
+
+    def __init__(self, caminho, configuracao, criar_motor):
+        self.caminho = caminho
+        self.configuracao = configuracao  # ex.: intervalo e timeframes; outro valor invalida o snapshot
+        self.forma_motor = sorted(forma(para_estado(criar_motor())))
+
+    def salvar(self, motores, regras=None, regras_carregadas_em=None):
+        """Grava {symbol: motor} e as regras brutas dos pares (escrita atômica)."""
+        dados = {
+            'versao': VERSAO,
+            'configuracao': self.configuracao,
+            'salvo_em': time.time(),
+            'motores': {symbol: para_estado(motor) for symbol, motor in motores.items() if motor is not None},
+            'regras': regras or {},
+            'regras_carregadas_em': regras_carregadas_em,
+        }
+        temporario = f"{self.caminho}.tmp"
+        with open(temporario, 'w') as f:
+            json.dump(dados, f)
+        os.replace(temporario, self.caminho)
+
+    def carregar(self):
+        """Retorna {'motores', 'regras', 'regras_carregadas_em', 'salvo_em'} ou None se não houver snapshot utilizável."""
+        try:
+            with open(self.caminho) as f:
+                dados = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Snapshot de início rápido ilegível ({e}), iniciando do zero")
+            return None
+        if dados.get('versao') != VERSAO or dados.get('configuracao') != self.configuracao:
+            logger.info("Snapshot de início rápido de outra configuração, iniciando do zero")
+            return None
+        motores = {}
+        for symbol, estado in dados.get('motores', {}).items():
+            if sorted(forma(estado)) != self.forma_motor:
+                logger.info("Snapshot de início rápido de outra versão dos indicadores, iniciando do zero")
+                return None
+            motores[symbol] = de_estado(estado)
+        return {
+            'motores': motores,
+            'regras': dados.get('regras', {}),
+            'regras_carregadas_em': dados.get('regras_carregadas_em'),
+            'salvo_em': dados.get('salvo_em', 0),
+        }
@@ -0,0 +1,241 @@
+import bisect
+import functools
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger()
+
+# Instrumentação do bot: contadores, medidores e histogramas com rótulos,
+# expostos no formato texto do Prometheus em um endpoint HTTP local e como
+# snapshot (dicionário) dentro do processo. Registrar uma observação custa
+# uma busca binária nos limites e um incremento sob trava; medidores que
+# dependem de outros componentes (peso da API, filas) usam uma função lida
+# apenas no momento da coleta, sem custo no caminho quente.
+
+PORTA_PADRAO = 9108
+LIMITES_PADRAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = [f'{nome}="{valor}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.valores = {}
+        self.trava = threading.Lock()
+
+    def _chave(self, rotulos):
+        return tuple(str(rotulos[nome]) for nome in self.rotulos)
+
+    def _cabecalho(self):
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self.trava:
+            self.valores[chave] = self.valores.get(chave, 0) + valor
+
+    def snapshot(self):
+        with self.trava:
+            return {chave: valor for chave, valor in self.valores.items()}
+
+    def exposicao(self):
+        linhas = self._cabecalho()
+        for chave, valor in sorted(self.snapshot().items()):
+            linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {valor}")
+        return linhas
+
+
+class Medidor(_Metrica):
+    tipo = 'gauge'
+
+    def __init__(self, nome, ajuda, rotulos=(), funcao=None):
+        super().__init__(nome, ajuda, rotulos)
+        self.funcao = funcao  # lida na coleta; retorna um número ou {chave de rótulos: número}
+
+    def set(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self.trava:
+            self.valores[chave] = valor
+
+    def snapshot(self):
+        if self.funcao is not None:
+            try:
+                valor = self.funcao()
+            except Exception as e:
+                logger.debug(f"Erro ao ler o medidor {self.nome}: {e}")
+                return {}
+            return valor if isinstance(valor, dict) else {(): valor}
+        with self.trava:
+            return dict(self.valores)
+
+    def exposicao(self):
+        linhas = self._cabecalho()
+        for chave, valor in sorted(self.snapshot().items()):
+            linhas.append(f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {valor}")
+        return linhas
+
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), limites=LIMITES_PADRAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(limites)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        indice = bisect.bisect_left(self.limites, valor)
+        with self.trava:
+            serie = self.valores.get(chave)
+            if serie is None:
+                # [contagens por faixa (última = +Inf), soma, total, máximo]
+                serie = self.valores[chave] = [[0] * (len(self.limites) + 1), 0.0, 0, 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+            if valor > serie[3]:
+                serie[3] = valor
+
+    def cronometrar(self, **rotulos):
+        """Context manager / decorador que observa a duração em segundos."""
+        return _Cronometro(self, rotulos)
+
+    def snapshot(self):
+        with self.trava:
+            copias = {chave: (list(serie[0]), serie[1], serie[2], serie[3]) for chave, serie in self.valores.items()}
+        resultado = {}
+        for chave, (contagens, soma, total, maximo) in copias.items():
+            acumulado, percentis, alvo = 0, {}, [(0.5, 'p50'), (0.9, 'p90'), (0.99, 'p99')]
+            for limite, contagem in zip(self.limites + (float('inf'),), contagens):
+                acumulado += contagem
+                while alvo and acumulado >= alvo[0][0] * total:
+                    percentis[alvo.pop(0)[1]] = min(limite, maximo)
+            resultado[chave] = {'total': total, 'soma': soma, 'media': soma / total if total else 0.0,
+                                'maximo': maximo, **percentis}
+        return resultado
+
+    def exposicao(self):
+        linhas = self._cabecalho()
+        with self.trava:
+            copias = {chave: (list(serie[0]), serie[1], serie[2]) for chave, serie in self.valores.items()}
+        for chave, (contagens, soma, total) in sorted(copias.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float('inf'),), contagens):
+                acumulado += contagem
+                le = 'le="+Inf"' if limite == float('inf') else f'le="{limite}"'
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, le)} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(self.rotulos, chave)} {soma}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(self.rotulos, chave)} {total}")
+        return linhas
+
+
+class _Cronometro:
+    def __init__(self, histograma, rotulos):
+        self.histograma = histograma
+        self.rotulos = rotulos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.histograma.observar(time.perf_counter() - self.inicio, **self.rotulos)
+        return False
+
+    def __call__(self, funcao):
+        @functools.wraps(funcao)
+        def cronometrada(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                self.histograma.observar(time.perf_counter() - inicio, **self.rotulos)
+        return cronometrada
+
+
+class Registro:
+    """Conjunto de métricas do processo."""
+
+    def __init__(self):
+        self.metricas = {}
+
+    def _registrar(self, metrica):
+        existente = self.metricas.get(metrica.nome)
+        if existente is not None:
+            return existente
+        self.metricas[metrica.nome] = metrica
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def medidor(self, nome, ajuda, rotulos=(), funcao=None):
+        return self._registrar(Medidor(nome, ajuda, rotulos, funcao))
+
+    def histograma(self, nome, ajuda, rotulos=(), limites=LIMITES_PADRAO):
+        return self._registrar(Histograma(nome, ajuda, rotulos, limites))
+
+    def snapshot(self):
+        """Estado atual de todas as métricas: {nome: {rótulos: valor ou resumo}}."""
+        resultado = {}
+        for nome, metrica in self.metricas.items():
+            resultado[nome] = {
+                ','.join(f"{r}={v}" for r, v in zip(metrica.rotulos, chave)): valor
+                for chave, valor in metrica.snapshot().items()
+            }
+        return resultado
+
+    def exposicao(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        linhas = []
+        for metrica in self.metricas.values():
+            linhas.extend(metrica.exposicao())
+        return '\n'.join(linhas) + '\n'
+
+
+REGISTRO = Registro()
+
+
+def servir(porta=PORTA_PADRAO, host='127.0.0.1', registro=REGISTRO):
+    """Serve /metrics (Prometheus) e /metrics.json (snapshot) em uma thread própria."""
+
+    class Manipulador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                corpo, tipo = registro.exposicao().encode(), 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path == '/metrics.json':
+                corpo, tipo = json.dumps(registro.snapshot(), default=str).encode(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((host, porta), Manipulador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name='metricas-http', daemon=True).start()
+    logger.info(f"Métricas disponíveis em http://{host}:{servidor.server_port}/metrics")
+    return servidor
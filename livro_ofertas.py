@@ -0,0 +1,312 @@
+import asyncio
+import json
+import logging
+import math
+import threading
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+from streaming import (TransporteWebSocket, ConexaoEncerrada, RECONEXAO_ESPERA_INICIAL,
+                       RECONEXAO_ESPERA_MAXIMA)
+
+logger = logging.getLogger()
+
+# Livro de ofertas L2 mantido localmente a partir do stream de diff depth.
+# Sincronização (procedimento da Binance):
+#   1. os eventos `<symbol>@depth@100ms` ficam em buffer enquanto o snapshot
+#      REST (GET /api/v3/depth) é baixado;
+#   2. eventos com `u` <= lastUpdateId do snapshot são descartados;
+#   3. o primeiro evento aplicado deve conter lastUpdateId + 1 em [U, u];
+#   4. cada evento seguinte começa em `u` anterior + 1; uma quebra na sequência
+#      (ou uma reconexão) descarta o livro e um novo snapshot é baixado.
+# Cada lado é guardado em dois arrays compactos ordenados (preços e
+# quantidades), com o melhor preço no fim: as alterações mais frequentes,
+# perto do topo, movem poucos elementos.
+
+NAN = math.nan
+
+NIVEIS_SNAPSHOT = 1000  # limit do snapshot REST (peso 50)
+NIVEIS_MAXIMOS = 5000  # níveis mantidos por lado; os mais distantes do topo são descartados
+NIVEIS_DESEQUILIBRIO = 10  # níveis de cada lado somados no desequilíbrio
+MAX_EVENTOS_BUFFER = 10000  # eventos guardados enquanto o snapshot não chega
+TENTATIVAS_SNAPSHOT = 5
+VELOCIDADE_STREAM = '100ms'
+
+# Chaves acrescentadas às linhas de indicadores para as regras das estratégias
+CHAVES_LIVRO = ('livro_spread_bps', 'livro_desequilibrio', 'livro_microprice_bps')
+
+
+class LadoLivro:
+    """Um lado do livro em arrays ordenados; a chave é o preço (bids) ou o preço negativo (asks)."""
+
+    def __init__(self, compra, niveis_maximos=NIVEIS_MAXIMOS):
+        self.sinal = 1.0 if compra else -1.0
+        self.niveis_maximos = niveis_maximos
+        self.chaves = array('d')
+        self.quantidades = array('d')
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def carregar(self, niveis):
+        """Substitui o lado pelos níveis [[preço, quantidade], ...] de um snapshot."""
+        sinal = self.sinal
+        pares = sorted((sinal * float(preco), float(quantidade)) for preco, quantidade in niveis)
+        pares = [par for par in pares if par[1] > 0][-self.niveis_maximos:]
+        self.chaves = array('d', [chave for chave, _ in pares])
+        self.quantidades = array('d', [quantidade for _, quantidade in pares])
+
+    def aplicar(self, niveis):
+        """Aplica as alterações de um evento; quantidade zero remove o nível."""
+        chaves = self.chaves
+        quantidades = self.quantidades
+        sinal = self.sinal
+        for preco, quantidade in niveis:
+            chave = sinal * float(preco)
+            quantidade = float(quantidade)
+            i = bisect_left(chaves, chave)
+            if i < len(chaves) and chaves[i] == chave:
+                if quantidade:
+                    quantidades[i] = quantidade
+                else:
+                    del chaves[i]
+                    del quantidades[i]
+            elif quantidade:
+                chaves.insert(i, chave)
+                quantidades.insert(i, quantidade)
+        excesso = len(chaves) - self.niveis_maximos
+        if excesso > 0:
+            del chaves[:excesso]
+            del quantidades[:excesso]
+
+    def melhor(self):
+        """(preço, quantidade) do topo; (NaN, 0.0) com o lado vazio."""
+        if not self.chaves:
+            return NAN, 0.0
+        return self.sinal * self.chaves[-1], self.quantidades[-1]
+
+    def quantidade_topo(self, niveis):
+        return math.fsum(self.quantidades[-niveis:])
+
+    def niveis(self):
+        """Percorre (preço, quantidade) do melhor para o pior preço."""
+        sinal = self.sinal
+        chaves = self.chaves
+        quantidades = self.quantidades
+        for i in range(len(chaves) - 1, -1, -1):
+            yield sinal * chaves[i], quantidades[i]
+
+
+class LivroOfertas:
+    """Livro L2 local de um par, com detecção de lacunas na sequência de eventos."""
+
+    def __init__(self, symbol, niveis_maximos=NIVEIS_MAXIMOS):
+        self.symbol = symbol
+        self.bids = LadoLivro(True, niveis_maximos)
+        self.asks = LadoLivro(False, niveis_maximos)
+        self.ultimo_id = None
+        self.sincronizado = False
+        self.buffer = deque(maxlen=MAX_EVENTOS_BUFFER)
+        self.trava = threading.Lock()
+        self.eventos = 0
+        self.ressincronizacoes = 0
+        self.atualizado_em = None  # horário (ms) do último evento aplicado
+
+    def receber(self, evento):
+        """Aplica um evento depthUpdate; retorna False se o livro precisar de um snapshot."""
+        with self.trava:
+            if not self.sincronizado:
+                self.buffer.append(evento)
+                return False
+            return self._aplicar(evento)
+
+    def _aplicar(self, evento):
+        if evento['u'] <= self.ultimo_id:
+            return True  # já contido no snapshot
+        if evento['U'] > self.ultimo_id + 1:
+            logger.warning(f"Lacuna no livro de {self.symbol}: esperado {self.ultimo_id + 1}, "
+                           f"recebido {evento['U']}; aguardando novo snapshot")
+            self.dessincronizar()
+            self.buffer.append(evento)
+            return False
+        self.bids.aplicar(evento['b'])
+        self.asks.aplicar(evento['a'])
+        self.ultimo_id = evento['u']
+        self.atualizado_em = evento.get('E')
+        self.eventos += 1
+        return True
+
+    def dessincronizar(self):
+        """Descarta o livro (reconexão ou lacuna); os próximos eventos ficam em buffer."""
+        if self.sincronizado:
+            self.ressincronizacoes += 1
+        self.sincronizado = False
+        self.buffer.clear()
+
+    def aplicar_snapshot(self, snapshot):
+        """Carrega o snapshot REST e os eventos em buffer; False se o snapshot for anterior ao buffer."""
+        with self.trava:
+            ultimo_id = snapshot['lastUpdateId']
+            if self.buffer and self.buffer[0]['U'] > ultimo_id + 1:
+                return False
+            self.bids.carregar(snapshot['bids'])
+            self.asks.carregar(snapshot['asks'])
+            self.ultimo_id = ultimo_id
+            self.sincronizado = True
+            pendentes = list(self.buffer)
+            self.buffer.clear()
+            for i, evento in enumerate(pendentes):
+                if not self._aplicar(evento):
+                    self.buffer.extend(pendentes[i + 1:])
+                    return False
+            return True
+
+    def topo(self):
+        """(bid, quantidade no bid, ask, quantidade no ask) do topo do livro."""
+        with self.trava:
+            return (*self.bids.melhor(), *self.asks.melhor())
+
+    def caracteristicas(self, niveis=NIVEIS_DESEQUILIBRIO):
+        """Spread e microprice em pontos-base do preço médio e desequilíbrio dos `niveis` do topo.
+
+        O desequilíbrio vai de -1 (só ofertas de venda) a 1 (só ofertas de compra); o
+        microprice acima do preço médio indica pressão compradora. NaN fora de sincronia.
+        """
+        with self.trava:
+            if not self.sincronizado or not self.bids or not self.asks:
+                return dict.fromkeys(CHAVES_LIVRO, NAN)
+            bid, quantidade_bid = self.bids.melhor()
+            ask, quantidade_ask = self.asks.melhor()
+            total_bids = self.bids.quantidade_topo(niveis)
+            total_asks = self.asks.quantidade_topo(niveis)
+        medio = (bid + ask) / 2
+        microprice = (bid * quantidade_ask + ask * quantidade_bid) / (quantidade_bid + quantidade_ask)
+        return {
+            'livro_spread_bps': (ask - bid) / medio * 10000,
+            'livro_desequilibrio': (total_bids - total_asks) / (total_bids + total_asks),
+            'livro_microprice_bps': (microprice - medio) / medio * 10000,
+        }
+
+    def estimar_execucao(self, compra, quantidade=None, valor=None):
+        """Preço médio de uma ordem a mercado que consome o livro, por quantidade ou por valor em cotação.
+
+        Retorna dict com preco_medio, quantidade, valor, slippage_percent (sobre o melhor
+        preço) e suficiente (se a profundidade local cobre a ordem), ou None sem livro.
+        """
+        with self.trava:
+            lado = self.asks if compra else self.bids
+            if not self.sincronizado or not lado:
+                return None
+            melhor = lado.melhor()[0]
+            restante_quantidade = quantidade if quantidade is not None else math.inf
+            restante_valor = valor if valor is not None else math.inf
+            total_quantidade = total_valor = 0.0
+            suficiente = False
+            for preco, disponivel in lado.niveis():
+                executada = min(disponivel, restante_quantidade, restante_valor / preco)
+                total_quantidade += executada
+                total_valor += executada * preco
+                restante_quantidade -= executada
+                restante_valor -= executada * preco
+                if executada < disponivel or restante_quantidade <= 0 or restante_valor <= 0:
+                    suficiente = True  # a ordem termina neste nível
+                    break
+        if total_quantidade <= 0:
+            return None
+        preco_medio = total_valor / total_quantidade
+        slippage = (preco_medio - melhor) / melhor * 100 * (1 if compra else -1)
+        return {
+            'preco_medio': preco_medio,
+            'quantidade': total_quantidade,
+            'valor': total_valor,
+            'slippage_percent': slippage,
+            'suficiente': suficiente,
+        }
+
+
+class FluxoLivros:
+    """Mantém os livros de vários pares pelo stream de diff depth, em uma thread própria."""
+
+    def __init__(self, client, simbolos, transporte=None, niveis_snapshot=NIVEIS_SNAPSHOT,
+                 niveis_maximos=NIVEIS_MAXIMOS):
+        self.client = client
+        self.livros = {symbol: LivroOfertas(symbol, niveis_maximos) for symbol in simbolos}
+        self.transporte = transporte or TransporteWebSocket()
+        self.niveis_snapshot = niveis_snapshot
+        self.pendentes = set()  # pares aguardando snapshot
+        self.ativo = False
+        self.thread = None
+
+    def streams(self):
+        return [f"{symbol.lower()}@depth@{VELOCIDADE_STREAM}" for symbol in self.livros]
+
+    def iniciar(self):
+        self.ativo = True
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.executar()), name='livros', daemon=True)
+        self.thread.start()
+
+    def parar(self):
+        self.ativo = False
+
+    def sincronizar(self, livro):
+        """Baixa o snapshot REST e o aplica ao livro; retorna True se o livro ficou sincronizado."""
+        snapshot = self.client.get_order_book(symbol=livro.symbol, limit=self.niveis_snapshot)
+        return livro.aplicar_snapshot(snapshot)
+
+    async def _ressincronizar(self, livro):
+        loop = asyncio.get_running_loop()
+        espera = RECONEXAO_ESPERA_INICIAL
+        try:
+            for _ in range(TENTATIVAS_SNAPSHOT):
+                # O snapshot é baixado fora do loop para os eventos continuarem entrando no buffer
+                if await loop.run_in_executor(None, self.sincronizar, livro):
+                    logger.info(f"Livro de {livro.symbol} sincronizado em {livro.ultimo_id} "
+                                f"({len(livro.bids)} bids, {len(livro.asks)} asks)")
+                    return
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, RECONEXAO_ESPERA_MAXIMA)
+            logger.warning(f"Livro de {livro.symbol} não sincronizou após {TENTATIVAS_SNAPSHOT} snapshots")
+        except Exception as e:
+            logger.error(f"Erro ao sincronizar o livro de {livro.symbol}: {e}")
+        finally:
+            self.pendentes.discard(livro.symbol)
+
+    def processar_mensagem(self, mensagem):
+        """Aplica uma mensagem do stream combinado; agenda um snapshot quando o livro perde a sincronia."""
+        if isinstance(mensagem, (str, bytes)):
+            mensagem = json.loads(mensagem)
+        dados = mensagem.get('data', mensagem)
+        if dados.get('e') != 'depthUpdate':
+            return
+        livro = self.livros.get(dados['s'])
+        if livro is None or livro.receber(dados) or livro.symbol in self.pendentes:
+            return
+        self.pendentes.add(livro.symbol)
+        asyncio.get_running_loop().create_task(self._ressincronizar(livro))
+
+    async def executar(self):
+        espera = RECONEXAO_ESPERA_INICIAL
+        while self.ativo:
+            try:
+                await self.transporte.conectar(self.streams())
+                logger.info(f"Livros conectados: {', '.join(self.streams())}")
+                espera = RECONEXAO_ESPERA_INICIAL
+                while self.ativo:
+                    self.processar_mensagem(await self.transporte.receber())
+            except ConexaoEncerrada as e:
+                logger.warning(f"Stream dos livros encerrado: {e}")
+            except Exception as e:
+                logger.error(f"Erro no stream dos livros: {e}")
+            finally:
+                # Eventos perdidos durante a desconexão: todos os livros precisam de snapshot novo
+                for livro in self.livros.values():
+                    with livro.trava:
+                        livro.dessincronizar()
+                try:
+                    await self.transporte.fechar()
+                except Exception:
+                    pass
+            if self.ativo:
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, RECONEXAO_ESPERA_MAXIMA)
@@ -0,0 +1,241 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger()
+
+# Logging fora do caminho quente.
+# As chamadas de log só colocam o LogRecord em uma fila em memória; uma thread
+# (QueueListener) formata a mensagem, serializa em JSON (uma linha por
+# registro) e grava nos arquivos com rotação por tamanho e por tempo.
+# Registros marcados com `extra={'amostra': chave}` (ex.: eventos por tick)
+# passam no máximo uma vez por intervalo por chave, descartados ainda na
+# thread de quem chamou. Ordens usam `registrar_duravel`, que espera o fsync.
+
+TAMANHO_MAXIMO = 50 * 1024 * 1024  # bytes por arquivo antes da rotação
+QUANTIDADE_BACKUPS = 5
+INTERVALO_ROTACAO = 24 * 3600  # segundos; 0 rotaciona só por tamanho
+INTERVALO_AMOSTRAGEM = 5.0  # segundos entre registros de uma mesma chave de amostragem
+TIMEOUT_DURAVEL = 2.0  # segundos aguardando a gravação de um registro durável
+FORMATO_TEXTO = '%(asctime)s - %(levelname)s - %(message)s'
+LOGGER_ORDENS = 'ordens'
+
+_ATRIBUTOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+_ATRIBUTOS_CONTROLE = {'amostra', 'duravel', 'confirmacao'}
+
+_ouvinte = None
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro, incluindo os campos passados em `extra`."""
+
+    def format(self, record):
+        dados = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.name != 'root':
+            dados['logger'] = record.name
+        for chave, valor in record.__dict__.items():
+            if chave not in _ATRIBUTOS_PADRAO and chave not in _ATRIBUTOS_CONTROLE:
+                dados[chave] = valor
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            dados['excecao'] = record.exc_text
+        return json.dumps(dados, default=str, ensure_ascii=False)
+
+
+class FiltroAmostragem(logging.Filter):
+    """Deixa passar no máximo um registro por intervalo para cada chave `amostra`."""
+
+    def __init__(self, intervalo=INTERVALO_AMOSTRAGEM):
+        super().__init__()
+        self.intervalo = intervalo
+        self.ultimos = {}
+        self.suprimidos = {}
+        self.trava = threading.Lock()
+
+    def filter(self, record):
+        chave = getattr(record, 'amostra', None)
+        if chave is None:
+            return True
+        agora = time.monotonic()
+        with self.trava:
+            ultimo = self.ultimos.get(chave)
+            if ultimo is not None and agora - ultimo < self.intervalo:
+                self.suprimidos[chave] = self.suprimidos.get(chave, 0) + 1
+                return False
+            self.ultimos[chave] = agora
+            suprimidos = self.suprimidos.pop(chave, 0)
+        if suprimidos:
+            record.suprimidos = suprimidos
+        return True
+
+
+class ManipuladorArquivoRotativo(logging.handlers.RotatingFileHandler):
+    """Arquivo rotacionado por tamanho ou por tempo; registros duráveis são gravados com fsync."""
+
+    def __init__(self, caminho, tamanho_maximo=TAMANHO_MAXIMO, backups=QUANTIDADE_BACKUPS,
+                 intervalo_rotacao=INTERVALO_ROTACAO):
+        super().__init__(caminho, maxBytes=tamanho_maximo, backupCount=backups, encoding='utf-8')
+        self.intervalo_rotacao = intervalo_rotacao
+        self.proxima_rotacao = time.time() + intervalo_rotacao if intervalo_rotacao else None
+
+    def shouldRollover(self, record):
+        if self.proxima_rotacao is not None and time.time() >= self.proxima_rotacao:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.intervalo_rotacao:
+            self.proxima_rotacao = time.time() + self.intervalo_rotacao
+
+    def emit(self, record):
+        super().emit(record)
+        if getattr(record, 'duravel', False) and self.stream is not None:
+            try:
+                self.stream.flush()
+                os.fsync(self.stream.fileno())
+            except Exception:
+                self.handleError(record)
+
+
+class ManipuladorFila(logging.handlers.QueueHandler):
+    """Enfileira o registro sem formatá-lo: a mensagem é montada na thread de escrita.
+
+    Os argumentos do registro são lidos depois, então o caminho quente deve
+    passar apenas valores imutáveis (números, strings) como argumentos.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _OuvinteFila(logging.handlers.QueueListener):
+    def handle(self, record):
+        try:
+            super().handle(record)
+        finally:
+            confirmacao = getattr(record, 'confirmacao', None)
+            if confirmacao is not None:
+                confirmacao.set()
+
+
+class _Despacho(logging.Handler):
+    """Encaminha cada registro da fila para os manipuladores do logger de origem."""
+
+    def __init__(self, manipuladores, manipuladores_ordens):
+        super().__init__()
+        self.manipuladores = manipuladores
+        self.manipuladores_ordens = manipuladores_ordens
+
+    def handle(self, record):
+        if record.name == LOGGER_ORDENS and self.manipuladores_ordens:
+            destinos = self.manipuladores_ordens
+        else:
+            destinos = self.manipuladores
+        for manipulador in destinos:
+            if record.levelno >= manipulador.level:
+                manipulador.handle(record)
+        return True
+
+    def close(self):
+        for manipulador in self.manipuladores + self.manipuladores_ordens:
+            manipulador.close()
+        super().close()
+
+
+def _manipulador_arquivo(caminho, formatador, tamanho_maximo, backups, intervalo_rotacao):
+    manipulador = ManipuladorArquivoRotativo(caminho, tamanho_maximo, backups, intervalo_rotacao)
+    manipulador.setFormatter(formatador)
+    return manipulador
+
+
+def configurar_logging(arquivo, arquivo_ordens=None, assincrono=True, usar_json=True, nivel=logging.INFO,
+                       tamanho_maximo=TAMANHO_MAXIMO, backups=QUANTIDADE_BACKUPS,
+                       intervalo_rotacao=INTERVALO_ROTACAO, intervalo_amostragem=INTERVALO_AMOSTRAGEM):
+    """Configura o logger raiz (e o logger de ordens) com arquivo rotativo e console.
+
+    Com `assincrono`, os manipuladores rodam em uma thread própria atrás de uma
+    fila; sem ele, gravam na thread de quem chamou, como o logging.basicConfig.
+    """
+    global _ouvinte
+    encerrar_logging()
+    formatador = FormatadorJSON() if usar_json else logging.Formatter(FORMATO_TEXTO)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(FORMATO_TEXTO))
+    manipuladores = [_manipulador_arquivo(arquivo, formatador, tamanho_maximo, backups, intervalo_rotacao), console]
+
+    manipuladores_ordens = []
+    if arquivo_ordens:
+        manipuladores_ordens.append(
+            _manipulador_arquivo(arquivo_ordens, formatador, tamanho_maximo, backups, intervalo_rotacao))
+    # Sem arquivo próprio, as ordens vão para o log principal
+    log_ordens = logging.getLogger(LOGGER_ORDENS)
+    log_ordens.propagate = not manipuladores_ordens
+
+    raiz = logging.getLogger()
+    raiz.setLevel(nivel)
+    log_ordens.setLevel(nivel)
+    for log in (raiz, log_ordens):
+        for manipulador in list(log.handlers):
+            log.removeHandler(manipulador)
+
+    for filtro in list(raiz.filters):
+        if isinstance(filtro, FiltroAmostragem):
+            raiz.removeFilter(filtro)
+
+    amostragem = FiltroAmostragem(intervalo_amostragem)
+    if not assincrono:
+        # Uma única vez por registro, no logger: em cada manipulador o segundo veria o registro como repetido
+        raiz.addFilter(amostragem)
+        for manipulador in manipuladores:
+            raiz.addHandler(manipulador)
+        for manipulador in manipuladores_ordens:
+            log_ordens.addHandler(manipulador)
+        return None
+
+    fila = queue.SimpleQueue()
+    entrada = ManipuladorFila(fila)
+    entrada.addFilter(amostragem)  # descarta na origem, antes de enfileirar
+    raiz.addHandler(entrada)
+    if manipuladores_ordens:
+        log_ordens.addHandler(ManipuladorFila(fila))
+
+    # Um único ouvinte: cada registro vai para os manipuladores do seu logger
+    _ouvinte = _OuvinteFila(fila, _Despacho(manipuladores, manipuladores_ordens), respect_handler_level=False)
+    _ouvinte.start()
+    atexit.register(encerrar_logging)
+    return _ouvinte
+
+
+def encerrar_logging():
+    """Grava o que ainda está na fila e fecha os arquivos."""
+    global _ouvinte
+    if _ouvinte is None:
+        return
+    ouvinte, _ouvinte = _ouvinte, None
+    ouvinte.stop()
+    for manipulador in ouvinte.handlers:
+        manipulador.close()
+
+
+def registrar_duravel(log, nivel, mensagem, *args, timeout=TIMEOUT_DURAVEL, **campos):
+    """Registra e espera a gravação em disco (fsync); retorna False se o timeout expirar."""
+    if not log.isEnabledFor(nivel):
+        return True
+    confirmacao = threading.Event() if _ouvinte is not None else None
+    log.log(nivel, mensagem, *args, extra={**campos, 'duravel': True, 'confirmacao': confirmacao})
+    if confirmacao is None:
+        return True
+    return confirmacao.wait(timeout)
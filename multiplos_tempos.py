@@ -0,0 +1,159 @@
+from indicadores_incrementais import MotorIndicadores, NAN, colunas_volume
+from streaming import intervalo_em_ms
+
+# Análise em vários timeframes a partir de uma única série base.
+# Os candles dos timeframes maiores (ex.: 1h e 4h sobre candles de 5m) são
+# montados localmente, candle base a candle base, sem chamadas extras à API.
+# Cada timeframe tem seu próprio MotorIndicadores alimentado só pelos candles
+# maiores já fechados; o candle maior em formação entra via `espiar`, como o
+# candle base em formação no resto do bot. As linhas de indicadores trazem as
+# chaves do timeframe base e as mesmas chaves com sufixo (`rsi_1h`, `sma_50_4h`).
+# Os blocos são alinhados à época, como os da Binance, exceto as semanas, que
+# começam na segunda-feira; 1M não tem duração fixa e não é suportado.
+
+DESLOCAMENTO_SEMANA_MS = 4 * 24 * 60 * 60_000  # 1970-01-01 foi uma quinta: a primeira segunda é 4 dias depois
+
+
+def timestamp_ms(timestamp):
+    """Milissegundos desde a época para um int (klines) ou um pd.Timestamp (DataFrame)."""
+    if hasattr(timestamp, 'value'):
+        return int(timestamp.value) // 1_000_000
+    return int(timestamp)
+
+
+def chave_timeframe(indicador, timeframe):
+    """Nome do indicador de um timeframe maior nas linhas do motor (ex.: rsi_1h)."""
+    return f"{indicador}_{timeframe}"
+
+
+class AgregadorCandles:
+    """Monta os candles de um timeframe maior e mantém seus indicadores."""
+
+    def __init__(self, timeframe, intervalo_ms, intervalo_base_ms, deslocamento_ms=0):
+        self.timeframe = timeframe
+        self.intervalo_ms = intervalo_ms
+        self.intervalo_base_ms = intervalo_base_ms
+        self.deslocamento_ms = deslocamento_ms  # início do primeiro bloco após a época
+        self.motor = MotorIndicadores()
+        self.parcial = None  # [início, máxima, mínima, fechamento, volume, volume comprado] do candle em formação
+
+    def _fechar_parcial(self):
+        parcial = self.parcial
+        self.parcial = None
+        return self.motor.atualizar(*parcial)
+
+    def _ultimo_do_bloco(self, timestamp, inicio):
+        return timestamp + self.intervalo_base_ms >= inicio + self.intervalo_ms
+
+    def atualizar(self, timestamp, maxima, minima, fechamento, volume=NAN, volume_compra=NAN):
+        """Consome um candle base fechado e retorna a linha do timeframe maior até ele."""
+        inicio = timestamp - (timestamp - self.deslocamento_ms) % self.intervalo_ms
+        parcial = self.parcial
+        if parcial is not None and parcial[0] != inicio:
+            # Faltou o último candle base do bloco anterior: fecha com o que houver
+            self._fechar_parcial()
+            parcial = None
+        if parcial is None:
+            parcial = self.parcial = [inicio, maxima, minima, fechamento, volume, volume_compra]
+        else:
+            if maxima > parcial[1]:
+                parcial[1] = maxima
+            if minima < parcial[2]:
+                parcial[2] = minima
+            parcial[3] = fechamento
+            parcial[4] += volume
+            parcial[5] += volume_compra
+
+        if self._ultimo_do_bloco(timestamp, inicio):
+            return self._fechar_parcial()
+        return self.motor.espiar(*parcial[1:])
+
+    def espiar(self, timestamp, maxima, minima, fechamento, volume=NAN, volume_compra=NAN):
+        """Linha do timeframe maior incluindo um candle base em formação, sem alterar o estado."""
+        inicio = timestamp - (timestamp - self.deslocamento_ms) % self.intervalo_ms
+        parcial = self.parcial
+        if parcial is not None and parcial[0] == inicio:
+            maxima = max(maxima, parcial[1])
+            minima = min(minima, parcial[2])
+            volume += parcial[4]
+            volume_compra += parcial[5]
+        # Um parcial de bloco anterior (lacuna) só é fechado no próximo `atualizar`
+        return self.motor.espiar(maxima, minima, fechamento, volume, volume_compra)
+
+
+class MotorMultiTempo:
+    """Substituto do MotorIndicadores com os indicadores de timeframes maiores nas mesmas linhas.
+
+    Aceita a mesma interface (`atualizar`, `espiar`, `semear`, `ultima_linha`,
+    `penultima_linha`, `ultimo_timestamp`), então pode ser usado em qualquer
+    ponto do bot que hoje recebe um MotorIndicadores.
+    """
+
+    def __init__(self, intervalo_base, timeframes):
+        self.intervalo_base_ms = intervalo_em_ms(intervalo_base)
+        if self.intervalo_base_ms is None:
+            raise ValueError(f"Intervalo base não suportado: {intervalo_base}")
+        self.intervalo_base = intervalo_base
+        self.agregadores = []
+        for timeframe in timeframes:
+            intervalo_ms = intervalo_em_ms(timeframe)
+            if intervalo_ms is None:
+                raise ValueError(f"Timeframe não suportado: {timeframe}")
+            if intervalo_ms <= self.intervalo_base_ms or intervalo_ms % self.intervalo_base_ms:
+                raise ValueError(f"O timeframe {timeframe} não é múltiplo maior do intervalo base {intervalo_base}")
+            deslocamento_ms = DESLOCAMENTO_SEMANA_MS if timeframe.endswith('w') else 0
+            self.agregadores.append(AgregadorCandles(timeframe, intervalo_ms, self.intervalo_base_ms, deslocamento_ms))
+        self.base = MotorIndicadores()
+        # Pares (chave original, chave com sufixo) pré-calculados por timeframe
+        nomes = list(self.base.espiar(0.0, 0.0, 0.0))
+        self.chaves = [[(nome, chave_timeframe(nome, a.timeframe)) for nome in nomes] for a in self.agregadores]
+        self.ultimo_timestamp = None
+        self.ultimo_ms = None
+        self.ultima_linha = None
+        self.penultima_linha = None
+
+    def __len__(self):
+        return len(self.base)
+
+    @property
+    def timeframes(self):
+        return [agregador.timeframe for agregador in self.agregadores]
+
+    def _juntar(self, linha, linhas_timeframes):
+        for chaves, linha_timeframe in zip(self.chaves, linhas_timeframes):
+            for nome, chave in chaves:
+                linha[chave] = linha_timeframe[nome]
+        return linha
+
+    def atualizar(self, timestamp, maxima, minima, fechamento, volume=NAN, volume_compra=NAN):
+        """Consome um candle base fechado e atualiza todos os timeframes (O(1) por timeframe)."""
+        ms = timestamp_ms(timestamp)
+        linha = dict(self.base.atualizar(timestamp, maxima, minima, fechamento, volume, volume_compra))
+        linha = self._juntar(linha, [a.atualizar(ms, maxima, minima, fechamento, volume, volume_compra)
+                                     for a in self.agregadores])
+        self.ultimo_timestamp = timestamp
+        self.ultimo_ms = ms
+        self.penultima_linha = self.ultima_linha
+        self.ultima_linha = linha
+        return linha
+
+    def espiar(self, maxima, minima, fechamento, volume=NAN, volume_compra=NAN):
+        """Linha completa para o candle base em formação, sem alterar o estado."""
+        linha = dict(self.base.espiar(maxima, minima, fechamento, volume, volume_compra))
+        if self.ultimo_ms is None:
+            linhas = [a.motor.espiar(maxima, minima, fechamento, volume, volume_compra) for a in self.agregadores]
+        else:
+            ms = self.ultimo_ms + self.intervalo_base_ms
+            linhas = [a.espiar(ms, maxima, minima, fechamento, volume, volume_compra) for a in self.agregadores]
+        return self._juntar(linha, linhas)
+
+    def semear(self, df):
+        """Inicializa o motor a partir de um histórico de candles base fechados."""
+        timestamps = df['timestamp'].tolist()
+        maximas = df['high'].tolist()
+        minimas = df['low'].tolist()
+        fechamentos = df['close'].tolist()
+        volumes, volumes_compra = colunas_volume(df)
+        for t, h, l, c, v, vc in zip(timestamps, maximas, minimas, fechamentos, volumes, volumes_compra):
+            self.atualizar(t, h, l, c, v, vc)
+        return self
@@ -0,0 +1,206 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import backtest
+
+logger = logging.getLogger()
+
+# Otimizador de parâmetros da estratégia sobre um pool de processos.
+# O histórico de klines e os indicadores (que não dependem dos limiares)
+# são calculados uma única vez e publicados em memória compartilhada; cada
+# worker apenas cria views NumPy sobre esses blocos, sem cópia nem pickle.
+
+GRADE_PADRAO = {
+    'rsi_sobrevendido': [25, 30, 35],
+    'rsi_sobrecomprado': [65, 70, 75],
+    'stoch_sobrevendido': [15, 20, 25],
+    'stoch_sobrecomprado': [75, 80, 85],
+    'bb_inferior': [0.1, 0.2, 0.3],
+    'bb_superior': [0.7, 0.8, 0.9],
+    'min_sinais': [2, 3, 4],
+    'stop_loss': [1.5, 2.5, 4.0],
+    'take_profit': [3.0, 5.0, 8.0],
+}
+
+PESO_DRAWDOWN = 0.5  # Penalidade do drawdown na pontuação (retorno% - peso * drawdown%)
+TAMANHO_LOTE = 16  # Configurações enviadas por vez a cada worker
+
+# Views dos arrays compartilhados dentro de cada worker
+_dados = None
+_ind = None
+_blocos = []
+_opcoes = {}
+
+
+class ArraysCompartilhados:
+    """Publica um dicionário de arrays NumPy em blocos de memória compartilhada."""
+
+    def __init__(self, arrays):
+        self.blocos = []
+        self.descricao = {}
+        for nome, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            bloco = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=bloco.buf)[:] = array
+            self.blocos.append(bloco)
+            self.descricao[nome] = (bloco.name, array.shape, array.dtype.str)
+
+    def liberar(self):
+        for bloco in self.blocos:
+            bloco.close()
+            bloco.unlink()
+        self.blocos = []
+
+
+def _anexar(descricao):
+    arrays = {}
+    for nome, (nome_bloco, formato, dtype) in descricao.items():
+        bloco = shared_memory.SharedMemory(name=nome_bloco)
+        _blocos.append(bloco)
+        arrays[nome] = np.ndarray(formato, dtype=np.dtype(dtype), buffer=bloco.buf)
+    return arrays
+
+
+def _inicializar_worker(descricao_dados, descricao_ind, opcoes):
+    global _dados, _ind, _opcoes
+    _dados = _anexar(descricao_dados)
+    _ind = _anexar(descricao_ind)
+    _opcoes = opcoes
+
+
+def pontuar(resultado):
+    return resultado['retorno_percentual'] - PESO_DRAWDOWN * resultado['max_drawdown_percentual']
+
+
+def _avaliar(tarefa):
+    parametros, inicio, fim = tarefa
+    relatorio = backtest.executar_backtest(_dados, parametros, ind=_ind, inicio=inicio, fim=fim, **_opcoes)
+    resultado = {
+        'parametros': parametros,
+        'retorno_percentual': relatorio['retorno_percentual'],
+        'max_drawdown_percentual': relatorio['max_drawdown_percentual'],
+        'total_trades': relatorio['total_trades'],
+        'vencedores': relatorio['vencedores'],
+    }
+    resultado['pontuacao'] = pontuar(resultado)
+    return resultado
+
+
+def gerar_grade(grade):
+    """Todas as combinações da grade de parâmetros."""
+    nomes = list(grade)
+    for valores in itertools.product(*(grade[nome] for nome in nomes)):
+        yield dict(zip(nomes, valores))
+
+
+def gerar_aleatorio(grade, quantidade, semente=None):
+    """Amostra aleatória (sem repetição quando possível) da grade de parâmetros."""
+    sorteio = random.Random(semente)
+    vistos = set()
+    total = 1
+    for valores in grade.values():
+        total *= len(valores)
+    while len(vistos) < min(quantidade, total):
+        parametros = {nome: sorteio.choice(valores) for nome, valores in grade.items()}
+        chave = tuple(parametros.values())
+        if chave not in vistos:
+            vistos.add(chave)
+            yield parametros
+
+
+def ranquear(resultados):
+    """Ordena por pontuação, desempatando por menor drawdown."""
+    return sorted(resultados, key=lambda r: (-r['pontuacao'], r['max_drawdown_percentual']))
+
+
+class Otimizador:
+    """Distribui avaliações de parâmetros entre processos com dados em memória compartilhada."""
+
+    def __init__(self, dados, processos=None, **opcoes):
+        self.dados = {nome: dados[nome] for nome in ('timestamp', 'high', 'low', 'close')}
+        self.processos = processos or os.cpu_count() or 1
+        self.opcoes = opcoes
+        self.ind = backtest.calcular_indicadores_vetorizados(dados['high'], dados['low'], dados['close'])
+
+    def __enter__(self):
+        self.compartilhados_dados = ArraysCompartilhados(self.dados)
+        self.compartilhados_ind = ArraysCompartilhados(self.ind)
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.processos,
+            initializer=_inicializar_worker,
+            initargs=(self.compartilhados_dados.descricao, self.compartilhados_ind.descricao, self.opcoes),
+        )
+        return self
+
+    def __exit__(self, *args):
+        self.pool.shutdown()
+        self.compartilhados_dados.liberar()
+        self.compartilhados_ind.liberar()
+
+    def avaliar(self, configuracoes, inicio=0, fim=None):
+        tarefas = [(parametros, inicio, fim) for parametros in configuracoes]
+        return ranquear(self.pool.map(_avaliar, tarefas, chunksize=TAMANHO_LOTE))
+
+    def walk_forward(self, configuracoes, divisoes):
+        """Otimiza em cada janela de treino e avalia o melhor conjunto na janela seguinte."""
+        configuracoes = list(configuracoes)
+        limites = np.linspace(0, len(self.dados['close']), divisoes + 2, dtype=int)
+        janelas = []
+        for k in range(divisoes):
+            treino = (int(limites[k]), int(limites[k + 1]))
+            teste = (int(limites[k + 1]), int(limites[k + 2]))
+            melhor = self.avaliar(configuracoes, *treino)[0]
+            resultado_teste = self.avaliar([melhor['parametros']], *teste)[0]
+            logger.info(f"Walk-forward {k + 1}/{divisoes}: treino {melhor['retorno_percentual']:.2f}% -> "
+                        f"teste {resultado_teste['retorno_percentual']:.2f}% "
+                        f"(DD {resultado_teste['max_drawdown_percentual']:.2f}%)")
+            janelas.append({'treino': treino, 'teste': teste, 'melhor_treino': melhor, 'resultado_teste': resultado_teste})
+        return janelas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Otimização de parâmetros da estratégia em paralelo")
+    parser.add_argument('arquivo', help="CSV de klines no formato da Binance ou diretório do armazém local")
+    parser.add_argument('--grade', help="JSON com a grade de parâmetros (padrão: GRADE_PADRAO)")
+    parser.add_argument('--aleatorio', type=int, help="Avalia N configurações sorteadas em vez da grade completa")
+    parser.add_argument('--semente', type=int)
+    parser.add_argument('--processos', type=int)
+    parser.add_argument('--walk-forward', type=int, default=0, help="Número de janelas treino/teste")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--taxa', type=float, default=backtest.TAXA)
+    parser.add_argument('--slippage', type=float, default=backtest.SLIPPAGE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    grade = GRADE_PADRAO
+    if args.grade:
+        with open(args.grade) as f:
+            grade = json.load(f)
+
+    if args.aleatorio:
+        configuracoes = list(gerar_aleatorio(grade, args.aleatorio, args.semente))
+    else:
+        configuracoes = list(gerar_grade(grade))
+    logger.info(f"Avaliando {len(configuracoes)} configurações")
+
+    dados = backtest.carregar_klines(args.arquivo)
+    with Otimizador(dados, args.processos, taxa=args.taxa, slippage=args.slippage) as otimizador:
+        if args.walk_forward:
+            otimizador.walk_forward(configuracoes, args.walk_forward)
+        else:
+            for posicao, resultado in enumerate(otimizador.avaliar(configuracoes)[:args.top], 1):
+                logger.info(f"#{posicao} retorno {resultado['retorno_percentual']:.2f}%, "
+                            f"drawdown {resultado['max_drawdown_percentual']:.2f}%, "
+                            f"trades {resultado['total_trades']}: {resultado['parametros']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from indicadores_incrementais import MotorIndicadores
+from streaming import candle_de_kline
+
+logger = logging.getLogger()
+
+# Modo portfólio: um único processo acompanha N pares. As klines de todos os
+# pares são obtidas em paralelo por um pool de threads limitado, cada par
+# mantém seu próprio motor de indicadores e sua posição, e o USDT é dividido
+# entre os sinais de compra respeitando um limite global de exposição.
+
+
+class EstadoSimbolo:
+    """Estado de um par no portfólio: regras do par, indicadores e posição."""
+
+    def __init__(self, symbol, symbol_info):
+        self.symbol = symbol
+        self.symbol_info = symbol_info
+        self.motor = None
+        self.preco_atual = None
+        self.decisao = "AGUARDAR"
+        self.metricas = {}
+        # Mesmo formato usado por executar_decisao em binance.py
+        self.posicao = {
+            'em_posicao': False,
+            'preco_entrada': None,
+            'saldos': {}
+        }
+
+    @property
+    def ativo(self):
+        return self.symbol_info['base_asset']
+
+
+class ColetorKlines:
+    """Busca klines de vários pares simultaneamente com um pool de threads persistente."""
+
+    def __init__(self, client, interval, limite, max_threads=16, limite_inicial=None):
+        self.client = client
+        self.interval = interval
+        self.limite = limite
+        # Primeira busca de cada par com mais histórico, para aquecer os indicadores
+        self.limite_inicial = limite_inicial or limite
+        self.iniciados = set()
+        self.pool = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix='klines')
+
+    def _obter(self, symbol):
+        limite = self.limite if symbol in self.iniciados else self.limite_inicial
+        try:
+            klines = self.client.get_klines(symbol=symbol, interval=self.interval, limit=limite)
+            self.iniciados.add(symbol)
+            return klines
+        except Exception as e:
+            logger.error(f"Erro ao obter klines de {symbol}: {e}")
+            return None
+
+    def coletar(self, simbolos):
+        """Retorna {símbolo: klines} (None para os pares que falharam)."""
+        return dict(zip(simbolos, self.pool.map(self._obter, simbolos)))
+
+    def fechar(self):
+        self.pool.shutdown(wait=False)
+
+
+def atualizar_motor_klines(motor, klines, criar_motor=MotorIndicadores):
+    """Equivalente a atualizar_motor_indicadores trabalhando direto nas klines da API, sem DataFrame."""
+    # O último candle retornado pela API ainda está em formação
+    fechados = klines[:-1]
+    novos = fechados
+
+    if motor is not None and motor.ultimo_timestamp is not None:
+        novos = [k for k in fechados if int(k[0]) > motor.ultimo_timestamp]
+        if len(novos) == len(fechados):
+            motor = None  # lacuna: reinicializa a partir do histórico recebido
+
+    if motor is None:
+        motor = criar_motor()
+    for kline in novos:
+        motor.atualizar(*candle_de_kline(kline))
+
+    return motor, motor.espiar(*candle_de_kline(klines[-1])[1:])
+
+
+def calcular_exposicao(estados, saldos):
+    """Valor em USDT das posições abertas em todos os pares do portfólio."""
+    return sum(
+        saldos.get(estado.ativo, 0) * estado.preco_atual
+        for estado in estados
+        if estado.preco_atual is not None
+    )
+
+
+def alocar_compras(candidatos, saldo_usdt, patrimonio, exposicao, percentual_saldo, max_exposicao_percent):
+    """Divide o USDT entre os pares com sinal de compra.
+
+    Os candidatos mais fortes (mais sinais de compra) são atendidos primeiro;
+    cada compra usa `percentual_saldo` do USDT livre e o total aberto nunca
+    ultrapassa `max_exposicao_percent` do patrimônio.
+    """
+    limite_exposicao = patrimonio * max_exposicao_percent / 100
+    ordenados = sorted(candidatos, key=lambda e: e.metricas.get('sinais_compra', 0), reverse=True)
+    alocacoes = []
+    for estado in ordenados:
+        disponivel = min(saldo_usdt * percentual_saldo / 100, limite_exposicao - exposicao)
+        if disponivel < estado.symbol_info['min_notional']:
+            logger.info(f"Limite de exposição atingido, compra de {estado.symbol} ignorada")
+            continue
+        alocacoes.append((estado, disponivel))
+        saldo_usdt -= disponivel
+        exposicao += disponivel
+    return alocacoes
@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger()
+
+# Proteção das posições abertas (stop loss / take profit).
+# Logo após a compra, a saída é colocada na própria Binance como uma OCO de
+# venda (LIMIT_MAKER no take profit + STOP_LOSS_LIMIT no stop). Como fallback,
+# cada tick de preço passa por `ao_preco`, que compara o bid com os limites
+# pré-calculados e dispara a venda a mercado quando não há OCO ativa ou quando
+# o preço atravessou o limite do stop (gap). As proteções ficam em disco para
+# sobreviver a reinícios e a quantidade protegida acompanha fills parciais.
+
+ARQUIVO_PADRAO = 'protecoes.json'
+FOLGA_STOP_LIMITE = 0.5  # % abaixo do stopPrice usado como preço limite do STOP_LOSS_LIMIT
+ESPERA_FALHA_SAIDA = 5.0  # Segundos até o vigia tentar de novo uma saída que falhou (dobra a cada falha)
+ESPERA_FALHA_SAIDA_MAXIMA = 300.0
+
+
+def quantidade_liquida(ordem, ativo_base):
+    """Quantidade de fato recebida em uma compra: fills menos a comissão cobrada no próprio ativo."""
+    fills = ordem.get('fills') or []
+    if not fills:
+        return float(ordem.get('executedQty', 0))
+    quantidade = sum(float(f['qty']) for f in fills)
+    comissao = sum(float(f.get('commission', 0)) for f in fills if f.get('commissionAsset') == ativo_base)
+    return quantidade - comissao
+
+
+def preco_medio(ordem):
+    """Preço médio de execução da ordem (None se não houve execução)."""
+    executado = float(ordem.get('executedQty', 0))
+    if executado > 0 and ordem.get('cummulativeQuoteQty') is not None:
+        return float(ordem['cummulativeQuoteQty']) / executado
+    fills = ordem.get('fills') or []
+    quantidade = sum(float(f['qty']) for f in fills)
+    if quantidade > 0:
+        return sum(float(f['qty']) * float(f['price']) for f in fills) / quantidade
+    return None
+
+
+class Protecao:
+    """Limites de saída de uma posição e o estado da OCO correspondente."""
+
+    def __init__(self, symbol, quantidade, preco_entrada, preco_stop, preco_take, preco_stop_limite,
+                 order_list_id=None):
+        self.symbol = symbol
+        self.quantidade = quantidade  # quantidade ainda protegida
+        self.preco_entrada = preco_entrada
+        self.preco_stop = preco_stop
+        self.preco_take = preco_take
+        self.preco_stop_limite = preco_stop_limite
+        self.order_list_id = order_list_id
+        self.saindo = False  # venda disparada pelo vigia em andamento
+        self.falhas = 0  # saídas do vigia seguidas que não venderam
+        self.proxima_tentativa = 0.0  # monotonic: antes disso o vigia não dispara outra saída
+
+    def para_dict(self):
+        return {
+            'symbol': self.symbol,
+            'quantidade': self.quantidade,
+            'preco_entrada': self.preco_entrada,
+            'preco_stop': self.preco_stop,
+            'preco_take': self.preco_take,
+            'preco_stop_limite': self.preco_stop_limite,
+            'order_list_id': self.order_list_id,
+        }
+
+
+class GerenciadorProtecao:
+    """Coloca e acompanha as OCOs de saída e vigia os limites a cada tick."""
+
+    def __init__(self, client, stop_loss_percent, take_profit_percent, ao_disparar,
+                 caminho=ARQUIVO_PADRAO, usar_oco=True, folga_stop_limite=FOLGA_STOP_LIMITE):
+        self.client = client
+        self.stop_loss_percent = stop_loss_percent
+        self.take_profit_percent = take_profit_percent
+        self.ao_disparar = ao_disparar  # função (symbol, preço, motivo) que executa a venda; verdadeira se vendeu
+        self.caminho = caminho
+        self.usar_oco = usar_oco
+        self.folga_stop_limite = folga_stop_limite
+        self.protecoes = {}
+        self.trava = threading.RLock()
+        self._ler_disco()
+
+    def _ler_disco(self):
+        try:
+            with open(self.caminho) as f:
+                registros = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        self.protecoes = {r['symbol']: Protecao(**r) for r in registros}
+        if self.protecoes:
+            logger.info(f"Proteções restauradas do disco: {', '.join(self.protecoes)}")
+
+    def _gravar(self):
+        temporario = f"{self.caminho}.tmp"
+        with open(temporario, 'w') as f:
+            json.dump([p.para_dict() for p in self.protecoes.values()], f)
+        os.replace(temporario, self.caminho)
+
+    def ativa(self, symbol):
+        return symbol in self.protecoes
+
+    def oco_ativa(self, symbol):
+        """True se a saída da posição está com uma OCO aberta na Binance."""
+        protecao = self.protecoes.get(symbol)
+        return protecao is not None and protecao.order_list_id is not None
+
+    def preco_entrada(self, symbol):
+        protecao = self.protecoes.get(symbol)
+        return protecao.preco_entrada if protecao else None
+
+    def _colocar_oco(self, protecao, filtros):
+        try:
+            resposta = self.client.create_oco_order(
+                symbol=protecao.symbol,
+                side='SELL',
+                quantity=filtros.formatar_quantidade(protecao.quantidade),
+                aboveType='LIMIT_MAKER',
+                abovePrice=filtros.formatar_preco(protecao.preco_take),
+                belowType='STOP_LOSS_LIMIT',
+                belowStopPrice=filtros.formatar_preco(protecao.preco_stop),
+                belowPrice=filtros.formatar_preco(protecao.preco_stop_limite),
+                belowTimeInForce='GTC',
+            )
+            protecao.order_list_id = resposta['orderListId']
+            logger.info(f"OCO de saída colocada para {protecao.symbol}: take {protecao.preco_take:.8g}, "
+                        f"stop {protecao.preco_stop:.8g} (lista {protecao.order_list_id})")
+        except Exception as e:
+            protecao.order_list_id = None
+            logger.error(f"Erro ao colocar OCO para {protecao.symbol}, saída fica com o bot: {e}")
+
+    def proteger(self, symbol, ordem, preco_referencia, filtros, ativo_base):
+        """Registra a posição aberta pela ordem de compra e coloca a OCO de saída."""
+        quantidade = float(filtros.quantizar_quantidade(quantidade_liquida(ordem, ativo_base)))
+        if quantidade < filtros.min_qty:
+            logger.warning(f"Compra de {symbol} sem quantidade suficiente para proteger: {quantidade}")
+            return None
+        entrada = preco_medio(ordem) or preco_referencia
+        preco_stop = entrada * (1 - self.stop_loss_percent / 100)
+        protecao = Protecao(
+            symbol, quantidade, entrada,
+            preco_stop=preco_stop,
+            preco_take=entrada * (1 + self.take_profit_percent / 100),
+            preco_stop_limite=preco_stop * (1 - self.folga_stop_limite / 100),
+        )
+        if ordem.get('status') in ('PARTIALLY_FILLED', 'EXPIRED'):
+            logger.warning(f"Compra de {symbol} executada parcialmente: protegendo {quantidade}")
+        with self.trava:
+            if self.usar_oco:
+                self._colocar_oco(protecao, filtros)
+            self.protecoes[symbol] = protecao
+            self._gravar()
+        return protecao
+
+    def restaurar(self, symbol, filtros, saldo_total):
+        """Reconcilia a proteção salva com o saldo e as OCOs abertas após um reinício."""
+        with self.trava:
+            protecao = self.protecoes.get(symbol)
+            if protecao is None:
+                return None
+            if saldo_total < filtros.min_qty:
+                logger.info(f"Posição em {symbol} foi encerrada enquanto o bot estava parado")
+                del self.protecoes[symbol]
+                self._gravar()
+                return None
+
+            protecao.quantidade = float(filtros.quantizar_quantidade(min(protecao.quantidade, saldo_total)))
+            if protecao.order_list_id is not None:
+                try:
+                    abertas = {lista['orderListId'] for lista in self.client.get_open_oco_orders()}
+                except Exception as e:
+                    logger.error(f"Erro ao consultar OCOs abertas: {e}")
+                    abertas = {protecao.order_list_id}
+                if protecao.order_list_id not in abertas:
+                    protecao.order_list_id = None
+            if protecao.order_list_id is None and self.usar_oco:
+                self._colocar_oco(protecao, filtros)
+            self._gravar()
+            return protecao
+
+    def cancelar(self, symbol):
+        """Cancela a OCO antes de uma venda iniciada pelo bot; retorna a quantidade protegida.
+
+        Retorna None se a OCO não pôde ser cancelada: ela continua acompanhada e o saldo, bloqueado.
+        """
+        with self.trava:
+            protecao = self.protecoes.get(symbol)
+            if protecao is None:
+                return 0.0
+            if protecao.order_list_id is not None:
+                # Desvincula durante o cancelamento: o ALL_DONE dele não é o fim de uma OCO ativa
+                order_list_id = protecao.order_list_id
+                protecao.order_list_id = None
+                try:
+                    self.client.v3_delete_order_list(symbol=symbol, orderListId=order_list_id)
+                except Exception as e:
+                    protecao.order_list_id = order_list_id
+                    logger.warning(f"Erro ao cancelar OCO {order_list_id} de {symbol}: {e}")
+                    return None
+                self._gravar()
+            return protecao.quantidade
+
+    def rearmar(self, symbol, filtros):
+        """Recoloca a OCO cancelada para uma venda que não foi executada."""
+        with self.trava:
+            protecao = self.protecoes.get(symbol)
+            if protecao is None or protecao.order_list_id is not None or not self.usar_oco:
+                return
+            self._colocar_oco(protecao, filtros)
+            self._gravar()
+
+    def encerrar(self, symbol):
+        """Remove a proteção de uma posição vendida."""
+        with self.trava:
+            if self.protecoes.pop(symbol, None) is not None:
+                self._gravar()
+
+    def ao_evento_usuario(self, evento):
+        """Ouvinte do user-data stream: acompanha fills parciais e o fim das OCOs."""
+        tipo = evento.get('e')
+        if tipo not in ('executionReport', 'listStatus'):
+            return
+        with self.trava:
+            protecao = self.protecoes.get(evento.get('s'))
+            if protecao is None or protecao.order_list_id is None or evento.get('g') != protecao.order_list_id:
+                return
+            if tipo == 'executionReport':
+                if evento.get('x') == 'TRADE':
+                    protecao.quantidade = max(protecao.quantidade - float(evento['l']), 0.0)
+                    if evento.get('X') == 'FILLED':
+                        logger.info(f"OCO de {protecao.symbol} executada a {evento.get('L')} ({evento.get('o')})")
+                        del self.protecoes[protecao.symbol]
+                    self._gravar()
+            elif evento.get('L') == 'ALL_DONE' and protecao.quantidade > 0:
+                # Lista encerrada sem vender tudo (perna expirada ou rejeitada)
+                logger.warning(f"OCO de {protecao.symbol} encerrada com {protecao.quantidade} restantes; "
+                               f"saída fica com o bot")
+                protecao.order_list_id = None
+                self._gravar()
+
+    def ao_preco(self, symbol, preco):
+        """Avalia os limites de saída a cada tick (bid); chamado no caminho quente dos streams."""
+        protecao = self.protecoes.get(symbol)
+        if protecao is None or protecao.saindo or time.monotonic() < protecao.proxima_tentativa:
+            return
+        if protecao.order_list_id is not None:
+            # A OCO cuida da saída, exceto se o preço saltou abaixo do limite do stop
+            if preco > protecao.preco_stop_limite:
+                return
+            motivo = "STOP LOSS (preço abaixo do limite da OCO)"
+        elif preco <= protecao.preco_stop:
+            motivo = "STOP LOSS"
+        elif preco >= protecao.preco_take:
+            motivo = "TAKE PROFIT"
+        else:
+            return
+        protecao.saindo = True
+        threading.Thread(target=self._disparar, args=(protecao, preco, motivo), daemon=True).start()
+
+    def _disparar(self, protecao, preco, motivo):
+        inicio = time.perf_counter()
+        vendida = False
+        try:
+            logger.info(f"{motivo} ACIONADO pelo vigia de ticks em {protecao.symbol} a {preco}")
+            vendida = bool(self.ao_disparar(protecao.symbol, preco, motivo))
+        except Exception as e:
+            logger.error(f"Erro na saída disparada pelo vigia de {protecao.symbol}: {e}")
+        finally:
+            if not vendida:
+                # Sem backoff, uma saída que sempre falha (poeira, recusa) seria reenviada a cada tick
+                espera = min(ESPERA_FALHA_SAIDA * 2 ** protecao.falhas, ESPERA_FALHA_SAIDA_MAXIMA)
+                protecao.falhas += 1
+                protecao.proxima_tentativa = time.monotonic() + espera
+                logger.warning(f"Saída de {protecao.symbol} não executada; nova tentativa do vigia em {espera:.0f}s")
+            protecao.saindo = False
+            logger.info(f"Saída de {protecao.symbol} processada em {(time.perf_counter() - inicio) * 1000:.1f}ms")
@@ -0,0 +1,249 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from indicadores_incrementais import MotorIndicadores
+
+logger = logging.getLogger()
+
+# Modo streaming: recebe klines e bookTicker por WebSocket em vez de consultar
+# a API REST em intervalos fixos. O transporte é plugável para que um servidor
+# local de replay possa substituir a Binance em testes.
+
+URL_STREAM_BINANCE = 'wss://stream.binance.com:9443'
+
+MES_MAXIMO_MS = 31 * 24 * 60 * 60_000  # '1M' não tem duração fixa: só há lacuna acima do mês mais longo
+
+
+def intervalo_em_ms(interval):
+    """Duração de um intervalo de klines da Binance em ms (None se desconhecido ou sem duração fixa, como 1M)."""
+    # Importado aqui: o binance.py do projeto tem o mesmo nome do pacote
+    from binance.helpers import interval_to_milliseconds
+    return interval_to_milliseconds(interval)
+
+
+RECONEXAO_ESPERA_INICIAL = 1  # segundos
+RECONEXAO_ESPERA_MAXIMA = 60  # segundos
+
+
+class ConexaoEncerrada(Exception):
+    """O transporte foi encerrado pelo servidor ou pela rede."""
+
+
+class TransporteWebSocket:
+    """Transporte padrão: conexão WebSocket a streams combinados."""
+
+    def __init__(self, url_base=URL_STREAM_BINANCE):
+        self.url_base = url_base.rstrip('/')
+        self.conexao = None
+
+    async def conectar(self, streams):
+        import websockets
+        url = f"{self.url_base}/stream?streams={'/'.join(streams)}"
+        self.conexao = await websockets.connect(url, ping_interval=20)
+
+    async def receber(self):
+        try:
+            return await self.conexao.recv()
+        except Exception as e:
+            raise ConexaoEncerrada(str(e)) from e
+
+    async def fechar(self):
+        if self.conexao is not None:
+            await self.conexao.close()
+            self.conexao = None
+
+
+async def servir_replay(mensagens, host='127.0.0.1', porta=8765, intervalo=0.0):
+    """Servidor WebSocket local que reproduz mensagens gravadas para cada cliente."""
+    import websockets
+
+    async def enviar(conexao, *args):
+        for mensagem in mensagens:
+            await conexao.send(mensagem if isinstance(mensagem, str) else json.dumps(mensagem))
+            if intervalo:
+                await asyncio.sleep(intervalo)
+        await conexao.close()
+
+    return await websockets.serve(enviar, host, porta)
+
+
+def candle_de_kline(kline):
+    """Converte uma linha de get_klines ou um evento 'k' do stream para
+    (timestamp, máxima, mínima, fechamento, volume, volume comprado por agressores)."""
+    if isinstance(kline, dict):
+        return (int(kline['t']), float(kline['h']), float(kline['l']), float(kline['c']),
+                float(kline['v']), float(kline['V']))
+    return (int(kline[0]), float(kline[2]), float(kline[3]), float(kline[4]),
+            float(kline[5]), float(kline[9]))
+
+
+class FluxoMercado:
+    """Mantém o motor de indicadores alimentado pelos streams de kline e bookTicker."""
+
+    def __init__(self, client, symbol, interval, ao_fechar_candle, ao_receber_preco,
+                 transporte=None, limite_historico=100, criar_motor=MotorIndicadores):
+        self.client = client
+        self.symbol = symbol
+        self.interval = interval
+        self.intervalo_ms = intervalo_em_ms(interval) or (MES_MAXIMO_MS if interval == '1M' else None)
+        if self.intervalo_ms is None:
+            raise ValueError(f"Intervalo de klines desconhecido: {interval}")
+        self.ao_fechar_candle = ao_fechar_candle
+        self.ao_receber_preco = ao_receber_preco
+        self.transporte = transporte or TransporteWebSocket()
+        self.limite_historico = limite_historico
+        self.criar_motor = criar_motor
+        self.motor = None
+        self.ativo = False
+        self.ultimo_preco = None
+
+    def streams(self):
+        simbolo = self.symbol.lower()
+        return [f"{simbolo}@kline_{self.interval}", f"{simbolo}@bookTicker"]
+
+    def _candles_fechados(self, klines):
+        agora_ms = int(time.time() * 1000)
+        return [k for k in klines if int(k[6]) < agora_ms]
+
+    def inicializar(self):
+        """Semeia o motor de indicadores com o histórico REST."""
+        klines = self.client.get_klines(symbol=self.symbol, interval=self.interval, limit=self.limite_historico)
+        self.motor = self.criar_motor()
+        for kline in self._candles_fechados(klines):
+            self.motor.atualizar(*candle_de_kline(kline))
+        logger.info(f"Streaming: indicadores inicializados com {len(self.motor)} candles de {self.symbol}")
+
+    def preencher_lacuna(self):
+        """Busca via REST os candles fechados perdidos desde o último candle processado."""
+        if self.motor is None or self.motor.ultimo_timestamp is None:
+            self.inicializar()
+            return 0
+
+        inicio = self.motor.ultimo_timestamp + 1
+        recuperados = 0
+        while True:
+            klines = self.client.get_klines(symbol=self.symbol, interval=self.interval,
+                                            startTime=inicio, limit=1000)
+            fechados = self._candles_fechados(klines)
+            for kline in fechados:
+                if int(kline[0]) > self.motor.ultimo_timestamp:
+                    self.motor.atualizar(*candle_de_kline(kline))
+                    recuperados += 1
+            if len(klines) < 1000 or not fechados:
+                break
+            inicio = self.motor.ultimo_timestamp + 1
+
+        if recuperados:
+            logger.info(f"Streaming: {recuperados} candles recuperados via REST após lacuna")
+        return recuperados
+
+    async def _processar_kline(self, kline):
+        if not kline['x']:
+            return
+        timestamp = int(kline['t'])
+        ultimo = self.motor.ultimo_timestamp
+        if ultimo is not None and timestamp <= ultimo:
+            return  # candle já processado (duplicado após reconexão)
+        if ultimo is not None and timestamp > ultimo + self.intervalo_ms:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.preencher_lacuna)
+            if timestamp <= self.motor.ultimo_timestamp:
+                await self.ao_fechar_candle(self.motor)
+                return
+        self.motor.atualizar(*candle_de_kline(kline))
+        await self.ao_fechar_candle(self.motor)
+
+    async def processar_mensagem(self, mensagem):
+        """Despacha uma mensagem do stream combinado para o handler correspondente."""
+        if isinstance(mensagem, (str, bytes)):
+            mensagem = json.loads(mensagem)
+        dados = mensagem.get('data', mensagem)
+
+        if dados.get('e') == 'kline':
+            await self._processar_kline(dados['k'])
+        elif 'b' in dados and 'a' in dados:
+            # bookTicker: a posição comprada seria vendida no melhor bid
+            self.ultimo_preco = float(dados['b'])
+            await self.ao_receber_preco(self.ultimo_preco)
+
+    async def executar(self):
+        """Loop principal do stream com reconexão automática e preenchimento de lacunas."""
+        loop = asyncio.get_running_loop()
+        if self.motor is None:
+            await loop.run_in_executor(None, self.inicializar)
+
+        self.ativo = True
+        espera = RECONEXAO_ESPERA_INICIAL
+        while self.ativo:
+            try:
+                await self.transporte.conectar(self.streams())
+                logger.info(f"Streaming conectado: {', '.join(self.streams())}")
+                await loop.run_in_executor(None, self.preencher_lacuna)
+                espera = RECONEXAO_ESPERA_INICIAL
+                while self.ativo:
+                    await self.processar_mensagem(await self.transporte.receber())
+            except ConexaoEncerrada as e:
+                logger.warning(f"Conexão do stream encerrada: {e}")
+            except Exception as e:
+                logger.error(f"Erro no stream de mercado: {e}")
+            finally:
+                try:
+                    await self.transporte.fechar()
+                except Exception:
+                    pass
+
+            if self.ativo:
+                logger.info(f"Reconectando ao stream em {espera} segundos...")
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, RECONEXAO_ESPERA_MAXIMA)
+
+    def parar(self):
+        self.ativo = False
+
+
+class VigiaPrecos:
+    """Recebe o bookTicker de vários pares em uma thread própria e repassa o bid a cada tick."""
+
+    def __init__(self, simbolos, ao_preco, transporte=None):
+        self.simbolos = list(simbolos)
+        self.ao_preco = ao_preco  # função (symbol, bid), deve retornar rapidamente
+        self.transporte = transporte or TransporteWebSocket()
+        self.ativo = False
+        self.thread = None
+
+    def iniciar(self):
+        self.ativo = True
+        self.thread = threading.Thread(target=lambda: asyncio.run(self._executar()), name='vigia-precos', daemon=True)
+        self.thread.start()
+
+    def parar(self):
+        self.ativo = False
+
+    async def _executar(self):
+        streams = [f"{symbol.lower()}@bookTicker" for symbol in self.simbolos]
+        espera = RECONEXAO_ESPERA_INICIAL
+        while self.ativo:
+            try:
+                await self.transporte.conectar(streams)
+                logger.info(f"Vigia de preços conectado: {', '.join(streams)}")
+                espera = RECONEXAO_ESPERA_INICIAL
+                while self.ativo:
+                    mensagem = json.loads(await self.transporte.receber())
+                    dados = mensagem.get('data', mensagem)
+                    if 'b' in dados and 's' in dados:
+                        self.ao_preco(dados['s'], float(dados['b']))
+            except ConexaoEncerrada as e:
+                logger.warning(f"Vigia de preços desconectado: {e}")
+            except Exception as e:
+                logger.error(f"Erro no vigia de preços: {e}")
+            finally:
+                try:
+                    await self.transporte.fechar()
+                except Exception:
+                    pass
+            if self.ativo:
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, RECONEXAO_ESPERA_MAXIMA)
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+
+import livro_ofertas
+from livro_ofertas import FluxoLivros, LivroOfertas
+from streaming import ConexaoEncerrada
+
+SYMBOL = 'SOLUSDT'
+
+
+def evento(primeiro, ultimo, bids=(), asks=()):
+    return {'e': 'depthUpdate', 'E': ultimo, 's': SYMBOL, 'U': primeiro, 'u': ultimo,
+            'b': [list(nivel) for nivel in bids], 'a': [list(nivel) for nivel in asks]}
+
+
+def snapshot(ultimo_id, bids=(('100', '1'),), asks=(('101', '1'),)):
+    return {'lastUpdateId': ultimo_id, 'bids': [list(n) for n in bids], 'asks': [list(n) for n in asks]}
+
+
+def test_eventos_anteriores_ao_snapshot_sao_descartados():
+    livro = LivroOfertas(SYMBOL)
+    # u <= lastUpdateId: já contidos no snapshot, não podem sobrescrever o topo
+    livro.receber(evento(95, 98, bids=[('100', '7')]))
+    livro.receber(evento(99, 100, bids=[('100', '8')]))
+    livro.receber(evento(101, 101, asks=[('101', '2')]))
+
+    assert livro.aplicar_snapshot(snapshot(100))
+    assert livro.sincronizado
+    assert livro.ultimo_id == 101
+    assert livro.topo() == (100.0, 1.0, 101.0, 2.0)
+    assert livro.eventos == 1
+
+
+def test_primeiro_evento_aplicado_contem_o_id_seguinte_ao_snapshot():
+    livro = LivroOfertas(SYMBOL)
+    # U <= lastUpdateId + 1 <= u: aplicado inteiro, mesmo começando antes do snapshot
+    livro.receber(evento(98, 103, bids=[('100.5', '3')]))
+
+    assert livro.aplicar_snapshot(snapshot(100))
+    assert livro.ultimo_id == 103
+    assert livro.topo()[:2] == (100.5, 3.0)
+
+
+def test_snapshot_anterior_ao_buffer_e_recusado():
+    livro = LivroOfertas(SYMBOL)
+    # O buffer começa em 105: o snapshot em 100 não cobre 101..104
+    livro.receber(evento(105, 106))
+
+    assert not livro.aplicar_snapshot(snapshot(100))
+    assert not livro.sincronizado
+    assert len(livro.buffer) == 1
+    assert livro.aplicar_snapshot(snapshot(105))
+    assert livro.ultimo_id == 106
+
+
+def test_lacuna_na_sequencia_dessincroniza_o_livro():
+    livro = LivroOfertas(SYMBOL)
+    livro.aplicar_snapshot(snapshot(100))
+    assert livro.receber(evento(101, 102, bids=[('100', '2')]))
+
+    # Esperado 103: o evento é guardado para o próximo snapshot e o livro fica sem features
+    assert not livro.receber(evento(105, 106))
+    assert not livro.sincronizado
+    assert livro.ressincronizacoes == 1
+    assert [e['U'] for e in livro.buffer] == [105]
+    assert livro.estimar_execucao(True, quantidade=1) is None
+    assert all(v != v for v in livro.caracteristicas().values())
+
+    assert livro.aplicar_snapshot(snapshot(104))
+    assert livro.sincronizado
+    assert livro.ultimo_id == 106
+
+
+def test_lacuna_no_buffer_ao_aplicar_o_snapshot():
+    livro = LivroOfertas(SYMBOL)
+    livro.receber(evento(101, 102))
+    livro.receber(evento(104, 105))
+    livro.receber(evento(106, 107))
+
+    # 101..102 aplicado, 103 ausente: os eventos depois da lacuna esperam outro snapshot
+    assert not livro.aplicar_snapshot(snapshot(100))
+    assert not livro.sincronizado
+    assert [e['U'] for e in livro.buffer] == [104, 106]
+
+
+class ClienteFalso:
+    def __init__(self, snapshots):
+        self.snapshots = list(snapshots)
+        self.pedidos = []
+
+    def get_order_book(self, symbol, limit):
+        self.pedidos.append((symbol, limit))
+        return self.snapshots.pop(0)
+
+
+class TransporteFalso:
+    """Entrega as mensagens de cada conexão; encerra a conexão depois que o livro sincroniza."""
+
+    def __init__(self, conexoes, livro, fluxo):
+        self.conexoes = [list(mensagens) for mensagens in conexoes]
+        self.livro = livro
+        self.fluxo = fluxo
+        self.mensagens = None
+        self.conectadas = 0
+        self.estados = []  # (ultimo_id, topo) ao fim de cada conexão
+
+    async def conectar(self, streams):
+        self.mensagens = self.conexoes[self.conectadas]
+        self.conectadas += 1
+
+    async def receber(self):
+        if self.mensagens:
+            return self.mensagens.pop(0)
+        for _ in range(200):
+            if self.livro.sincronizado:
+                break
+            await asyncio.sleep(0.01)
+        self.estados.append((self.livro.ultimo_id, self.livro.topo()))
+        if self.conectadas == len(self.conexoes):
+            self.fluxo.parar()
+        raise ConexaoEncerrada("fim das mensagens")
+
+    async def fechar(self):
+        pass
+
+
+def test_reconexao_baixa_um_snapshot_novo(monkeypatch):
+    monkeypatch.setattr(livro_ofertas, 'RECONEXAO_ESPERA_INICIAL', 0)
+    cliente = ClienteFalso([snapshot(100), snapshot(150, bids=[('99', '4')])])
+    fluxo = FluxoLivros(cliente, [SYMBOL], niveis_snapshot=1000)
+    livro = fluxo.livros[SYMBOL]
+    fluxo.transporte = transporte = TransporteFalso([
+        [{'stream': 'solusdt@depth@100ms', 'data': evento(101, 102, asks=[('101', '5')])}],
+        # Eventos perdidos entre as conexões: 151 só é aplicado sobre o snapshot novo
+        [{'stream': 'solusdt@depth@100ms', 'data': evento(151, 152, bids=[('99.5', '1')])}],
+    ], livro, fluxo)
+    fluxo.ativo = True
+
+    asyncio.run(asyncio.wait_for(fluxo.executar(), timeout=10))
+
+    assert transporte.conectadas == 2
+    assert cliente.pedidos == [(SYMBOL, 1000), (SYMBOL, 1000)]
+    assert transporte.estados == [
+        (102, (100.0, 1.0, 101.0, 5.0)),
+        (152, (99.5, 1.0, 101.0, 1.0)),
+    ]
+    assert livro.ressincronizacoes == 2
+    # A queda da conexão descarta o livro até o próximo snapshot
+    assert not livro.sincronizado
@@ -0,0 +1,55 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+
+from benchmark import gerar_klines
+
+# binance.py tem o nome do pacote python-binance: é carregado com o diretório do
+# projeto no fim do sys.path, em um processo próprio (a configuração é lida na importação)
+CODIGO_BOT = """
+import importlib.util, os, sys
+raiz = sys.argv[1]
+sys.path[:] = [p for p in sys.path if os.path.abspath(p or '.') != raiz] + [raiz]
+spec = importlib.util.spec_from_file_location('bot', os.path.join(raiz, 'binance.py'))
+bot = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bot)
+bot.USAR_METRICAS = False
+try:
+    bot.main()
+finally:
+    from log_assincrono import encerrar_logging
+    encerrar_logging()
+"""
+
+
+def simular(diretorio, candles=3000):
+    """Roda o bot completo na corretora simulada e retorna as mensagens de log, em ordem."""
+    dados = gerar_klines(candles)
+    caminho = os.path.join(diretorio, 'klines.csv')
+    np.savetxt(caminho, np.column_stack([dados[c] for c in ('timestamp', 'open', 'high', 'low', 'close', 'volume')]),
+               delimiter=',', fmt=['%d'] + ['%.8f'] * 5)
+    ambiente = {**os.environ, 'BOT_SIMULACAO': caminho}
+    ambiente.pop('BOT_ESTRATEGIAS', None)
+    ambiente.pop('BOT_TIMEFRAMES', None)
+    subprocess.run([sys.executable, '-c', CODIGO_BOT, RAIZ], cwd=diretorio, env=ambiente, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=600)
+    with open(os.path.join(diretorio, 'solana_bot.log')) as f:
+        return [json.loads(linha)['msg'] for linha in f]
+
+
+def test_reentrada_apos_execucao_da_oco(tmp_path):
+    mensagens = simular(str(tmp_path))
+
+    execucoes_oco = [i for i, m in enumerate(mensagens) if m.startswith('OCO de SOLUSDT executada')]
+    compras = [i for i, m in enumerate(mensagens) if m.startswith('COMPRA EXECUTADA')]
+    assert execucoes_oco, "nenhuma OCO executada na simulação"
+    # A poeira deixada pela OCO não mantém a posição aberta: o bot volta a comprar
+    assert any(i > execucoes_oco[0] for i in compras)
+    # ...e não tenta vendê-la a cada ciclo
+    assert not [m for m in mensagens if 'abaixo do mínimo' in m]